@@ -0,0 +1,166 @@
+import argparse
+import itertools
+import os
+import tempfile
+import time
+import hnswlib
+import numpy as np
+import pandas as pd
+
+from encoders import DEFAULT_MODEL_NAME, ENCODER_BACKENDS, load_encoder, truncate_embeddings
+from exact_index import ExactIndex
+
+
+def synthetic_embeddings(n, dim, n_clusters=None, spread=0.35, seed=0):
+    """
+    Normalised vectors scattered around random cluster centres, a stand-in for ticket embeddings
+    at tenant sizes larger than the available ticket data.
+    """
+    rng = np.random.default_rng(seed)
+    n_clusters = n_clusters or max(1, int(np.sqrt(n)))
+    centres = rng.normal(size=(n_clusters, dim)).astype(np.float32)
+    vectors = centres[rng.integers(n_clusters, size=n)] + spread * rng.normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def exact_neighbors(embeddings, queries, k):
+    """Ground-truth k nearest neighbours of every query by exact search"""
+    index = ExactIndex(space='cosine', dim=embeddings.shape[1])
+    index.init_index(max_elements=len(embeddings))
+    index.add_items(embeddings, np.arange(len(embeddings)))
+    return index.knn_query(queries, k=k)[0]
+
+
+def recall_at_k(found, truth):
+    """Mean fraction of the true k nearest neighbours that were found, over all queries"""
+    return float(np.mean([len(set(f.tolist()) & set(t.tolist())) / len(t) for f, t in zip(found, truth)]))
+
+
+def query_latencies(index, queries, k):
+    """Search the queries one at a time on one thread, as find_similar_tickets does"""
+    latencies = np.empty(len(queries))
+    labels = []
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        query_labels, _ = index.knn_query(query.reshape(1, -1), k=k, num_threads=1)
+        latencies[i] = time.perf_counter() - start
+        labels.append(query_labels[0])
+    return np.asarray(labels), latencies
+
+
+def index_size(index):
+    """Size in bytes of the saved index"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'index.bin')
+        index.save_index(path)
+        return os.path.getsize(path)
+
+
+def _result_row(backend, params, k, recall, latencies, build_seconds, size):
+    return {
+        'backend': backend, **params, 'k': k, 'recall': recall,
+        'p50_ms': float(np.percentile(latencies, 50) * 1000), 'p99_ms': float(np.percentile(latencies, 99) * 1000),
+        'build_s': build_seconds, 'size_mb': size / 2**20,
+    }
+
+
+def run_sweep(embeddings, queries, m_values=(8, 16, 32), ef_construction_values=(100, 200, 400),
+              ef_values=(10, 25, 50, 100, 200), k_values=(3, 10), num_threads=-1):
+    """
+    Benchmark HNSW indexes over a parameter grid against exact search.
+
+    One index is built per (M, ef_construction) pair and searched with every ef. Recall@k is
+    measured against exact search; latencies are per single query on one thread.
+
+    Args:
+        embeddings (np.ndarray): Corpus embeddings.
+        queries (np.ndarray): Query embeddings.
+        m_values, ef_construction_values, ef_values, k_values (iterable): Parameter grid.
+        num_threads (int): Threads used to build the indexes.
+
+    Returns:
+        pd.DataFrame: One row per backend, parameter combination and k.
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    k_values = [k for k in k_values if k <= len(embeddings)]
+    rows = []
+
+    start = time.perf_counter()
+    exact = ExactIndex(space='cosine', dim=embeddings.shape[1])
+    exact.init_index(max_elements=len(embeddings))
+    exact.add_items(embeddings, np.arange(len(embeddings)))
+    exact_build_seconds = time.perf_counter() - start
+    exact_size = index_size(exact)
+    truth = {}
+    for k in k_values:
+        truth[k], latencies = query_latencies(exact, queries, k)
+        rows.append(_result_row('exact', {}, k, 1.0, latencies, exact_build_seconds, exact_size))
+
+    for m, ef_construction in itertools.product(m_values, ef_construction_values):
+        index = hnswlib.Index(space='cosine', dim=embeddings.shape[1])
+        start = time.perf_counter()
+        index.init_index(max_elements=len(embeddings), ef_construction=ef_construction, M=m)
+        index.add_items(embeddings, np.arange(len(embeddings)), num_threads=num_threads)
+        build_seconds = time.perf_counter() - start
+        size = index_size(index)
+        for ef, k in itertools.product(ef_values, k_values):
+            index.set_ef(max(ef, k))  # hnswlib searches with at least k candidates
+            labels, latencies = query_latencies(index, queries, k)
+            params = {'M': m, 'ef_construction': ef_construction, 'ef': max(ef, k)}
+            rows.append(_result_row('hnsw', params, k, recall_at_k(labels, truth[k]), latencies, build_seconds, size))
+            print(f"M={m} ef_construction={ef_construction} ef={max(ef, k)} k={k}: recall={rows[-1]['recall']:.3f} "
+                  f"p50={rows[-1]['p50_ms']:.3f}ms p99={rows[-1]['p99_ms']:.3f}ms")
+    columns = ['backend', 'M', 'ef_construction', 'ef', 'k', 'recall', 'p50_ms', 'p99_ms', 'build_s', 'size_mb']
+    return pd.DataFrame(rows, columns=columns).astype({'M': 'Int64', 'ef_construction': 'Int64', 'ef': 'Int64'})
+
+
+def ticket_embeddings(data_path, model_name=DEFAULT_MODEL_NAME, encoder_backend='torch', onnx_model_dir=None, embedding_dim=None):
+    """Embed the tickets of a data file the way TicketMatchingSystem indexes them"""
+    from ticket_matching_system import build_ticket_strings, read_ticket_data
+
+    model = load_encoder(model_name, encoder_backend, onnx_model_dir)
+    strings = build_ticket_strings(read_ticket_data(data_path))
+    embeddings = truncate_embeddings(model.encode(strings, batch_size=64), embedding_dim or model.get_sentence_embedding_dimension())
+    return np.asarray(embeddings, dtype=np.float32), model
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark HNSW index parameters against exact search")
+    parser.add_argument('data', nargs='?', default='../data/combined_data.csv', help="ticket data to index")
+    parser.add_argument('--queries', help="ticket file to use as queries, e.g. ../data/new_tickets.csv; "
+                                          "defaults to perturbed copies of indexed tickets")
+    parser.add_argument('--n-queries', type=int, default=200)
+    parser.add_argument('--synthetic', type=int, help="benchmark this many synthetic embeddings instead of the ticket data")
+    parser.add_argument('--dim', type=int, default=384, help="dimension of synthetic embeddings")
+    parser.add_argument('--model-name', default=DEFAULT_MODEL_NAME)
+    parser.add_argument('--encoder-backend', default='torch', choices=ENCODER_BACKENDS)
+    parser.add_argument('--onnx-model-dir')
+    parser.add_argument('--embedding-dim', type=int)
+    parser.add_argument('--m', type=int, nargs='+', default=[8, 16, 32])
+    parser.add_argument('--ef-construction', type=int, nargs='+', default=[100, 200, 400])
+    parser.add_argument('--ef', type=int, nargs='+', default=[10, 25, 50, 100, 200])
+    parser.add_argument('--k', type=int, nargs='+', default=[3, 10])
+    parser.add_argument('--output', help="write the results to this CSV file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.synthetic:
+        embeddings = synthetic_embeddings(args.synthetic + args.n_queries, args.dim)
+        embeddings, queries = embeddings[:args.synthetic], embeddings[args.synthetic:]
+    else:
+        embeddings, model = ticket_embeddings(args.data, args.model_name, args.encoder_backend, args.onnx_model_dir, args.embedding_dim)
+        if args.queries:
+            from ticket_matching_system import build_ticket_strings, read_ticket_data
+            queries = truncate_embeddings(model.encode(build_ticket_strings(read_ticket_data(args.queries))), embeddings.shape[1])
+        else:
+            queries = embeddings[rng.integers(len(embeddings), size=args.n_queries)]
+            queries = queries + 0.05 * rng.normal(size=queries.shape).astype(np.float32)
+
+    print(f"Benchmarking {len(embeddings)} embeddings with {len(queries)} queries")
+    results = run_sweep(embeddings, queries, args.m, args.ef_construction, args.ef, args.k)
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        print(results.to_string(index=False, float_format=lambda value: f"{value:.3f}"))
+    if args.output:
+        results.to_csv(args.output, index=False)
+        print(f"Results written to {args.output}")
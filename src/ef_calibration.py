@@ -0,0 +1,100 @@
+import argparse
+import json
+import math
+import numpy as np
+
+from exact_index import ExactIndex
+
+DEFAULT_K_VALUES = (1, 3, 5, 10, 20, 50, 100)
+DEFAULT_EF_VALUES = (10, 16, 25, 40, 64, 100, 160, 250, 400, 640)
+
+
+class EfCalibration:
+    """
+    Measured HNSW recall@k for a grid of k and ef, used to search with the smallest ef that
+    meets a recall target for the k of each query.
+    """
+
+    def __init__(self, recalls):
+        """
+        Args:
+            recalls (dict): k -> {ef: mean recall@k at that ef}.
+        """
+        self.recalls = {int(k): {int(ef): float(recall) for ef, recall in by_ef.items()} for k, by_ef in recalls.items()}
+        if not self.recalls:
+            raise ValueError("Empty ef calibration table")
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls(json.load(f)['recalls'])
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({'recalls': self.recalls}, f, indent=2)
+
+    def ef_for(self, k, recall_target):
+        """
+        Smallest calibrated ef reaching recall_target for k results.
+
+        k between calibrated values uses the next larger calibrated k. Above the largest, its ef
+        is scaled up proportionally. Unreachable targets get the largest calibrated ef.
+        """
+        calibrated_k = min((c for c in self.recalls if c >= k), default=max(self.recalls))
+        by_ef = self.recalls[calibrated_k]
+        ef = next((ef for ef in sorted(by_ef) if by_ef[ef] >= recall_target), max(by_ef))
+        if calibrated_k < k:
+            ef = math.ceil(ef * k / calibrated_k)
+        return max(ef, k)  # hnswlib needs at least k candidates
+
+
+def calibrate_ef(index, queries, k_values=DEFAULT_K_VALUES, ef_values=DEFAULT_EF_VALUES, deleted_labels=()):
+    """
+    Measure the recall@k of an HNSW index against exact search over a grid of k and ef.
+
+    Args:
+        index (hnswlib.Index): Index to calibrate; its ef is restored afterwards.
+        queries (np.ndarray): Query embeddings, ideally from real tickets.
+        k_values, ef_values (iterable): Grid to measure.
+        deleted_labels (iterable): Labels marked deleted in the index, excluded from the ground truth.
+
+    Returns:
+        EfCalibration: The measured recall table.
+    """
+    exact = ExactIndex.from_index(index, deleted_labels)
+    n_live = index.get_current_count() - len(list(deleted_labels))
+    k_values = [k for k in k_values if k <= n_live]
+    original_ef = index.ef
+    recalls = {}
+    try:
+        for k in k_values:
+            truth = exact.knn_query(queries, k=k)[0]
+            recalls[k] = {}
+            for ef in ef_values:
+                if ef < k:
+                    continue
+                index.set_ef(ef)
+                found = index.knn_query(queries, k=k)[0]
+                recalls[k][ef] = float(np.mean([len(set(f.tolist()) & set(t.tolist())) / k for f, t in zip(found, truth)]))
+            print(f"k={k}: " + ", ".join(f"ef={ef} recall={recall:.3f}" for ef, recall in recalls[k].items()))
+    finally:
+        index.set_ef(original_ef)
+    return EfCalibration(recalls)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibrate per-query ef of an index bundle against exact search")
+    parser.add_argument('index_path', help="index bundle directory")
+    parser.add_argument('data', help="ticket data the bundle was built from")
+    parser.add_argument('--output', default='ef_calibration.json')
+    parser.add_argument('--queries', help="ticket file to calibrate with, e.g. ../data/new_tickets.csv; "
+                                          "defaults to perturbed copies of indexed tickets")
+    parser.add_argument('--n-queries', type=int, default=500)
+    parser.add_argument('--model-name', default='sentence-transformers/all-MiniLM-L6-v2')
+    args = parser.parse_args()
+
+    from ticket_matching_system import TicketMatchingSystem, build_ticket_strings, read_ticket_data
+
+    system = TicketMatchingSystem(args.data, model_name=args.model_name, index_path=args.index_path, index_backend='hnsw')
+    query_strings = build_ticket_strings(read_ticket_data(args.queries)) if args.queries else None
+    system.calibrate_ef(query_strings, n_queries=args.n_queries, save_path=args.output)
@@ -0,0 +1,211 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+KEY_SIZE = 16  # bytes of blake2b digest per cached string
+KEY_DTYPE = f'S{KEY_SIZE}'
+
+
+class EmbeddingCache:
+    """
+    Persistent cache of ticket embeddings keyed by hash(encoder, ticket string).
+
+    Vectors are appended to a raw float32 file that is read through a memory map, and the
+    keys of the rows are appended to a second file. Keys are written after their vectors, so
+    an interrupted write leaves at most unused vector rows behind, which the next write drops.
+    """
+
+    def __init__(self, cache_dir, encoder, dim):
+        """
+        Args:
+            cache_dir (str): Directory holding the cache files; created if missing.
+            encoder (str): Encoder the embeddings come from (model name and backend, see
+                encoders.encoder_signature), part of every key, so one cache never mixes the
+                vectors of different backends.
+            dim (int): Embedding dimension.
+        """
+        self.cache_dir = cache_dir
+        self.encoder = encoder
+        self.dim = dim
+        self.vectors_path = os.path.join(cache_dir, 'vectors.f32')
+        self.keys_path = os.path.join(cache_dir, 'keys.bin')
+        os.makedirs(cache_dir, exist_ok=True)
+
+        meta_path = os.path.join(cache_dir, 'meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta['dim'] != dim:
+                raise ValueError(f"Embedding cache at {cache_dir} has dimension {meta['dim']}, expected {dim}")
+        else:
+            with open(meta_path, 'w') as f:
+                json.dump({'dim': dim}, f)
+        self._load()
+
+    def _load(self):
+        """Read the key file and map the vector file"""
+        keys = np.fromfile(self.keys_path, dtype=KEY_DTYPE) if os.path.exists(self.keys_path) else np.empty(0, dtype=KEY_DTYPE)
+        n_vectors = os.path.getsize(self.vectors_path) // (4 * self.dim) if os.path.exists(self.vectors_path) else 0
+        keys = keys[:n_vectors]
+        self._order = np.argsort(keys, kind='stable')
+        self._sorted_keys = keys[self._order]
+        self._map_vectors()
+
+    def _map_vectors(self):
+        """Map the vector rows that have a key"""
+        n_rows = len(self._sorted_keys)
+        self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(n_rows, self.dim)) if n_rows else None
+
+    def __len__(self):
+        return len(self._sorted_keys)
+
+    def keys_for(self, strings):
+        """Cache keys of ticket strings"""
+        prefix = self.encoder.encode('utf-8') + b'\0'
+        return np.array(
+            [hashlib.blake2b(prefix + string.encode('utf-8'), digest_size=KEY_SIZE).digest() for string in strings],
+            dtype=KEY_DTYPE,
+        )
+
+    def lookup(self, keys):
+        """Return the cache row of every key, -1 where it is not cached"""
+        if not len(self._sorted_keys):
+            return np.full(len(keys), -1, dtype=np.int64)
+        positions = np.searchsorted(self._sorted_keys, keys)
+        positions = np.minimum(positions, len(self._sorted_keys) - 1)
+        found = self._sorted_keys[positions] == keys
+        return np.where(found, self._order[positions], -1)
+
+    def add(self, keys, embeddings):
+        """Append embeddings for keys that are not cached yet"""
+        keys = np.asarray(keys, dtype=KEY_DTYPE)
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        n_rows = len(self._sorted_keys)
+        # Drop rows left behind by an interrupted write, so the new rows line up with their keys
+        with open(self.vectors_path, 'ab') as f:
+            f.truncate(n_rows * self.dim * 4)
+            embeddings.tofile(f)
+        with open(self.keys_path, 'ab') as f:
+            f.truncate(n_rows * KEY_SIZE)
+            keys.tofile(f)
+
+        # Merge the new keys into the sorted lookup instead of re-reading and re-sorting all of them
+        order = np.argsort(keys, kind='stable')
+        positions = np.searchsorted(self._sorted_keys, keys[order], side='right')
+        self._sorted_keys = np.insert(self._sorted_keys, positions, keys[order])
+        self._order = np.insert(self._order, positions, n_rows + order)
+        self._map_vectors()
+
+    def encode(self, strings, encode_fn):
+        """
+        Embed ticket strings, only calling encode_fn for strings that are not cached.
+
+        Args:
+            strings (list): Ticket strings.
+            encode_fn (callable): Maps a list of strings to an embedding matrix.
+
+        Returns:
+            np.ndarray: One embedding per string, in input order.
+        """
+        keys = self.keys_for(strings)
+        rows = self.lookup(keys)
+        missing = np.flatnonzero(rows < 0)
+        print(f"Embedding cache: {len(strings) - len(missing)} hits, {len(missing)} misses")
+
+        embeddings = np.empty((len(strings), self.dim), dtype=np.float32)
+        hits = np.flatnonzero(rows >= 0)
+        if len(hits):
+            embeddings[hits] = self._vectors[rows[hits]]
+        if len(missing):
+            # Encode every distinct missing string once
+            unique_keys, first, inverse = np.unique(keys[missing], return_index=True, return_inverse=True)
+            new_embeddings = np.asarray(encode_fn([strings[i] for i in missing[first]]), dtype=np.float32)
+            embeddings[missing] = new_embeddings[inverse]
+            self.add(unique_keys, new_embeddings)
+        return embeddings
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded in-process LRU cache of query embeddings keyed by normalised ticket string.
+
+    Strings have whitespace collapsed before lookup, and for uncased models such as
+    all-MiniLM-L6-v2 are also lowercased, which does not change their embedding, so
+    resubmitted or trivially edited tickets skip the transformer forward pass.
+    """
+
+    def __init__(self, max_size=1024, ttl_seconds=None, lowercase=False):
+        """
+        Args:
+            max_size (int): Maximum number of cached embeddings; least recently used ones are evicted.
+            ttl_seconds (float, optional): Age after which a cached embedding is recomputed.
+            lowercase (bool): Ignore case in keys; only correct for uncased models.
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.lowercase = lowercase
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (embedding, time added)
+        self._lock = threading.Lock()
+
+    def normalize(self, string):
+        """Cache key of a ticket string"""
+        key = re.sub(r'\s+', ' ', string).strip()
+        return key.lower() if self.lowercase else key
+
+    def get(self, string):
+        """Return the cached embedding of a string, or None"""
+        key = self.normalize(string)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl_seconds is not None and time.monotonic() - entry[1] > self.ttl_seconds:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, string, embedding):
+        """Cache the embedding of a string, evicting the least recently used entries when full"""
+        key = self.normalize(string)
+        with self._lock:
+            # A copy, so the cache does not keep (or see changes to) the caller's whole batch
+            self._entries[key] = (np.array(embedding, copy=True), time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def encode(self, strings, encode_fn):
+        """
+        Embed query strings, only calling encode_fn (once, batched) for strings that are not cached.
+
+        Returns:
+            np.ndarray: One embedding per string, in input order.
+        """
+        embeddings = [self.get(string) for string in strings]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            new_embeddings = encode_fn([strings[i] for i in missing])
+            for i, embedding in zip(missing, new_embeddings):
+                embeddings[i] = embedding
+                self.put(strings[i], embedding)
+        return np.stack(embeddings)
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'max_size': self.max_size}
+
+    def clear(self):
+        """Drop all cached embeddings, e.g. after switching models"""
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,393 @@
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import sys
+import time
+import numpy as np
+
+from index_bundle import text_checksum
+
+DEFAULT_MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+ONNX_CONFIG_FILE = 'encoder_config.json'
+
+# Encoder backends understood by load_encoder
+ENCODER_BACKENDS = ('torch', 'onnx')
+
+
+class OnnxEncoder:
+    """
+    ONNX Runtime backend for a sentence transformer exported with export_onnx_model.
+
+    Runs the (optionally int8-quantized) transformer with onnxruntime, then applies the same
+    pooling and normalisation as the sentence-transformers pipeline. Only needs onnxruntime,
+    tokenizers and numpy at query time, not torch. Mirrors the parts of the SentenceTransformer
+    interface that TicketMatchingSystem uses.
+    """
+
+    def __init__(self, model_dir, num_threads=None):
+        """
+        Args:
+            model_dir (str): Directory written by export_onnx_model.
+            num_threads (int, optional): onnxruntime intra-op threads, defaults to all cores.
+        """
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(model_dir, ONNX_CONFIG_FILE)) as f:
+            self.config = json.load(f)
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, 'tokenizer.json'))
+        self.tokenizer.enable_truncation(max_length=self.config['max_seq_length'])
+        self.tokenizer.enable_padding(pad_id=self.config['pad_token_id'])
+        # Separate unpadded tokenizer for measuring lengths
+        self.length_tokenizer = Tokenizer.from_file(os.path.join(model_dir, 'tokenizer.json'))
+        self.length_tokenizer.enable_truncation(max_length=self.config['max_seq_length'])
+        self.length_tokenizer.no_padding()
+
+        options = onnxruntime.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, self.config['model_file']), options, providers=['CPUExecutionProvider']
+        )
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+
+    def get_sentence_embedding_dimension(self):
+        return self.config['dim']
+
+    def token_lengths(self, texts):
+        """Number of tokens (after truncation) of every text"""
+        return np.array([len(encoding.ids) for encoding in self.length_tokenizer.encode_batch(list(texts))])
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        """Embed a list of texts, returning a float32 matrix with one row per text"""
+        embeddings = np.empty((len(texts), self.config['dim']), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            batch = self.tokenizer.encode_batch(list(texts[start:start + batch_size]))
+            inputs = {
+                'input_ids': np.array([encoding.ids for encoding in batch], dtype=np.int64),
+                'attention_mask': np.array([encoding.attention_mask for encoding in batch], dtype=np.int64),
+                'token_type_ids': np.array([encoding.type_ids for encoding in batch], dtype=np.int64),
+            }
+            token_embeddings = self.session.run(None, {name: inputs[name] for name in self.input_names})[0]
+
+            if self.config['pooling'] == 'cls':
+                pooled = token_embeddings[:, 0]
+            else:
+                mask = inputs['attention_mask'][:, :, None].astype(np.float32)
+                pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if self.config['normalize']:
+                pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            embeddings[start:start + len(batch)] = pooled
+        return embeddings
+
+
+def load_encoder(model_name=DEFAULT_MODEL_NAME, backend='torch', onnx_model_dir=None, num_threads=None):
+    """
+    Load the embedding model for a backend.
+
+    Args:
+        model_name (str): Name of the sentence transformer model.
+        backend (str): 'torch' for sentence-transformers on PyTorch, 'onnx' for an exported ONNX Runtime model.
+        onnx_model_dir (str, optional): Directory written by export_onnx_model, required for the onnx backend.
+        num_threads (int, optional): Intra-op threads to encode with: the onnx session's, or torch's
+            (process-wide), see set_encoder_threads. Defaults to all cores.
+
+    Returns:
+        An object with encode(texts) and get_sentence_embedding_dimension().
+    """
+    if backend == 'torch':
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(model_name)
+        set_encoder_threads(num_threads)  # torch is only imported once the torch backend is loaded
+        return model
+    if backend == 'onnx':
+        if not onnx_model_dir:
+            raise ValueError("The onnx encoder backend needs onnx_model_dir")
+        encoder = OnnxEncoder(onnx_model_dir, num_threads=num_threads)
+        if encoder.config['model_name'] != model_name:
+            raise ValueError(f"ONNX model in {onnx_model_dir} was exported from {encoder.config['model_name']}, not {model_name}")
+        return encoder
+    raise ValueError(f"Unknown encoder backend {backend}, expected one of {ENCODER_BACKENDS}")
+
+
+def encoder_signature(model_name, backend='torch', onnx_model_dir=None):
+    """
+    Identity of the embeddings an encoder produces, e.g. to key caches and checkpoints with.
+
+    The same model gives slightly different vectors on each backend, and an int8-quantized
+    ONNX export differs from the full-precision one, so all of them are part of it.
+    """
+    signature = f"{model_name}|{backend}"
+    if backend == 'onnx' and onnx_model_dir:
+        with open(os.path.join(onnx_model_dir, ONNX_CONFIG_FILE)) as f:
+            signature += f"|{json.load(f)['model_file']}"
+    return signature
+
+
+def truncate_embeddings(embeddings, dim):
+    """
+    Cut embeddings down to their first dim dimensions and re-normalise them.
+
+    Keeping the leading dimensions is how Matryoshka-trained models are meant to be shrunk;
+    other models lose more recall when truncated.
+    """
+    if embeddings.shape[-1] == dim:
+        return embeddings
+    if embeddings.shape[-1] < dim:
+        raise ValueError(f"Model produces {embeddings.shape[-1]}-dimensional embeddings, the index needs {dim}")
+    embeddings = np.asarray(embeddings[..., :dim], dtype=np.float32)
+    return embeddings / np.clip(np.linalg.norm(embeddings, axis=-1, keepdims=True), 1e-12, None)
+
+
+def token_lengths(model, texts):
+    """
+    Number of tokens the model sees for every text, used to bucket texts of similar length.
+
+    Falls back to a character-based estimate for models without a known tokenizer.
+    """
+    if hasattr(model, 'token_lengths'):
+        return model.token_lengths(texts)
+    tokenizer = getattr(model, 'tokenizer', None)
+    if callable(tokenizer):
+        max_length = getattr(model, 'max_seq_length', None)
+        encoded = tokenizer(list(texts), truncation=max_length is not None, max_length=max_length)
+        return np.array([len(ids) for ids in encoded['input_ids']])
+    return np.array([len(text) // 4 + 2 for text in texts])
+
+
+def set_encoder_threads(num_threads):
+    """Set the number of torch intra-op threads used for encoding (the onnx backend sets its own per session)"""
+    if num_threads and 'torch' in sys.modules:
+        sys.modules['torch'].set_num_threads(num_threads)
+
+
+def plan_batches(sorted_lengths, max_batch_tokens, max_batch_size):
+    """
+    Split texts sorted by decreasing length into (start, end) batches of at most max_batch_tokens
+    padded tokens, so short texts are encoded in large batches and long ones in small batches.
+    """
+    batches = []
+    start = 0
+    while start < len(sorted_lengths):
+        size = min(max_batch_size, max(1, max_batch_tokens // max(int(sorted_lengths[start]), 1)))
+        end = min(start + size, len(sorted_lengths))
+        batches.append((start, end))
+        start = end
+    return batches
+
+
+def encode_in_length_buckets(encode_fn, texts, dim, lengths=None, max_batch_tokens=16384, max_batch_size=256,
+                             checkpoint_dir=None, report_every=10.0, encoder=None):
+    """
+    Encode a large list of texts in batches of similar length, with progress and resume support.
+
+    Sorting by length keeps padding (wasted transformer work) to a minimum. With a checkpoint_dir,
+    embeddings are written to a memory-mapped file as they are produced, and a rerun over the same
+    texts continues after the last completed batch.
+
+    Args:
+        encode_fn (callable): encode_fn(texts, batch_size=...) -> embedding matrix.
+        texts (list): Strings to encode.
+        dim (int): Embedding dimension.
+        lengths (array, optional): Token length of every text (see token_lengths), defaults to character length.
+        max_batch_tokens (int): Padded tokens per batch.
+        max_batch_size (int): Texts per batch.
+        checkpoint_dir (str, optional): Directory for the resumable checkpoint.
+        report_every (float): Seconds between progress reports.
+        encoder (str, optional): encoder_signature of encode_fn; a checkpoint written by another
+            encoder is not resumed.
+
+    Returns:
+        np.ndarray: One embedding per text, in input order.
+    """
+    n_texts = len(texts)
+    if not n_texts:
+        return np.empty((0, dim), dtype=np.float32)
+    lengths = np.asarray(lengths if lengths is not None else [len(text) for text in texts])
+    # Longest first, so the most memory-hungry batch runs (and fails) early
+    order = np.argsort(-lengths, kind='stable')
+    batches = plan_batches(lengths[order], max_batch_tokens, max_batch_size)
+
+    done = 0
+    if checkpoint_dir:
+        embeddings, done, save_progress = _open_checkpoint(checkpoint_dir, texts, order, dim, encoder)
+        if done:
+            print(f"Resuming encoding after {done}/{n_texts} tickets")
+    else:
+        embeddings = np.empty((n_texts, dim), dtype=np.float32)
+
+    start_time = last_report = last_flush = time.monotonic()
+    resumed_from = done
+    for start, end in batches:
+        if end <= done:
+            continue
+        positions = order[start:end]
+        embeddings[positions] = encode_fn([texts[i] for i in positions], batch_size=end - start)
+        done = end
+
+        now = time.monotonic()
+        if checkpoint_dir and (now - last_flush >= report_every or done == n_texts):
+            embeddings.flush()
+            save_progress(done)
+            last_flush = now
+        if now - last_report >= report_every:
+            rate = (done - resumed_from) / (now - start_time)
+            print(f"Encoded {done}/{n_texts} tickets ({rate:.1f} tickets/sec)")
+            last_report = now
+
+    elapsed = time.monotonic() - start_time
+    encoded = done - resumed_from
+    print(f"Encoded {encoded} tickets in {elapsed:.1f}s ({encoded / max(elapsed, 1e-9):.1f} tickets/sec, {len(batches)} batches)")
+    return np.array(embeddings) if checkpoint_dir else embeddings
+
+
+def _open_checkpoint(checkpoint_dir, texts, order, dim, encoder=None):
+    """Open (or start) an encoding checkpoint; returns (memmap, texts already encoded, save_progress)"""
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    embeddings_path = os.path.join(checkpoint_dir, 'embeddings.f32')
+    progress_path = os.path.join(checkpoint_dir, 'progress.json')
+    run = {
+        'encoder': encoder,
+        'count': len(texts),
+        'dim': dim,
+        'text_checksum': text_checksum(texts),
+        'order_checksum': hashlib.sha256(order.tobytes()).hexdigest(),
+    }
+
+    done = 0
+    if os.path.exists(progress_path) and os.path.exists(embeddings_path):
+        with open(progress_path) as f:
+            progress = json.load(f)
+        if {key: progress.get(key) for key in run} == run:
+            done = progress['done']
+        else:
+            print(f"Checkpoint in {checkpoint_dir} belongs to different input, starting over")
+    mode = 'r+' if done else 'w+'
+    embeddings = np.memmap(embeddings_path, dtype=np.float32, mode=mode, shape=(len(texts), dim))
+
+    def save_progress(done):
+        tmp_path = progress_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(dict(run, done=done), f)
+        os.replace(tmp_path, progress_path)
+
+    return embeddings, done, save_progress
+
+
+def export_onnx_model(model_name, output_dir, quantize=True, opset_version=17):
+    """
+    Export a sentence transformer to ONNX for the onnx encoder backend.
+
+    Writes the transformer as model.onnx (plus a dynamically int8-quantized model_int8.onnx),
+    the tokenizer and an encoder_config.json with the pooling settings.
+
+    Args:
+        model_name (str): Name of the sentence transformer model.
+        output_dir (str): Directory to write the exported model to.
+        quantize (bool): Also write and use the int8-quantized model.
+        opset_version (int): ONNX opset to export with.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device='cpu')
+    transformer = model[0].auto_model.eval()
+    tokenizer = model.tokenizer
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer.save_pretrained(output_dir)
+
+    sample = tokenizer(['export sample ticket'], return_tensors='pt')
+    input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in sample]
+
+    class TokenEmbeddings(torch.nn.Module):
+        """Positional-argument wrapper returning the token embeddings"""
+
+        def __init__(self, transformer):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, *inputs):
+            return self.transformer(**dict(zip(input_names, inputs))).last_hidden_state
+
+    model_path = os.path.join(output_dir, 'model.onnx')
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names + ['token_embeddings']}
+    export_options = {}
+    if 'dynamo' in inspect.signature(torch.onnx.export).parameters:
+        # dynamic_axes is only supported by the TorchScript exporter
+        export_options['dynamo'] = False
+    with torch.no_grad():
+        torch.onnx.export(
+            TokenEmbeddings(transformer), tuple(sample[name] for name in input_names), model_path,
+            input_names=input_names, output_names=['token_embeddings'], dynamic_axes=dynamic_axes,
+            opset_version=opset_version, **export_options,
+        )
+
+    model_file = 'model.onnx'
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(model_path, os.path.join(output_dir, 'model_int8.onnx'), weight_type=QuantType.QInt8)
+        model_file = 'model_int8.onnx'
+
+    pooling = next((module for module in model if type(module).__name__ == 'Pooling'), None)
+    config = {
+        'model_name': model_name,
+        'model_file': model_file,
+        'dim': model.get_sentence_embedding_dimension(),
+        'max_seq_length': model.max_seq_length,
+        'pad_token_id': tokenizer.pad_token_id,
+        'pooling': 'cls' if getattr(pooling, 'pooling_mode_cls_token', False) else 'mean',
+        'normalize': any(type(module).__name__ == 'Normalize' for module in model),
+    }
+    with open(os.path.join(output_dir, ONNX_CONFIG_FILE), 'w') as f:
+        json.dump(config, f, indent=2)
+    print(f"ONNX model exported to {output_dir}")
+
+
+def check_encoder_compatibility(reference, candidate, texts, tolerance=0.02):
+    """
+    Check that a candidate encoder produces embeddings usable with an index built by the reference.
+
+    Args:
+        reference: Encoder the index was built with (e.g. the torch backend).
+        candidate: Encoder to validate (e.g. the quantized onnx backend).
+        texts (list): Sample ticket strings.
+        tolerance (float): Largest allowed cosine distance between the two embeddings of a text.
+
+    Returns:
+        dict: Minimum and mean cosine similarity between the two backends.
+    """
+    expected = np.asarray(reference.encode(texts), dtype=np.float32)
+    actual = np.asarray(candidate.encode(texts), dtype=np.float32)
+    if expected.shape != actual.shape:
+        raise ValueError(f"Encoders disagree on embedding shape: {expected.shape} vs {actual.shape}")
+
+    expected /= np.linalg.norm(expected, axis=1, keepdims=True)
+    actual /= np.linalg.norm(actual, axis=1, keepdims=True)
+    similarities = (expected * actual).sum(axis=1)
+    stats = {'min_similarity': float(similarities.min()), 'mean_similarity': float(similarities.mean())}
+    if stats['min_similarity'] < 1 - tolerance:
+        raise ValueError(f"Candidate encoder deviates from the reference beyond tolerance {tolerance}: {stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a sentence transformer to ONNX and check it against the torch backend")
+    parser.add_argument('output_dir', help="Directory to write the ONNX model to")
+    parser.add_argument('--model-name', default=DEFAULT_MODEL_NAME)
+    parser.add_argument('--no-quantize', action='store_true', help="Keep the float32 model instead of int8")
+    parser.add_argument('--data', default='data/combined_data.csv', help="Tickets used for the compatibility check")
+    parser.add_argument('--tolerance', type=float, default=0.02)
+    args = parser.parse_args()
+
+    import pandas as pd
+    from ticket_matching_system import build_ticket_strings
+
+    export_onnx_model(args.model_name, args.output_dir, quantize=not args.no_quantize)
+    texts = build_ticket_strings(pd.read_csv(args.data))
+    stats = check_encoder_compatibility(
+        load_encoder(args.model_name, 'torch'), load_encoder(args.model_name, 'onnx', args.output_dir), texts, args.tolerance
+    )
+    print(f"ONNX encoder matches the torch backend: {stats}")
@@ -0,0 +1,175 @@
+import numpy as np
+
+# Queries scored against the whole corpus at once, bounding the size of the score matrix
+QUERY_BATCH_SIZE = 256
+
+
+def exact_knn(queries, vectors, k, searchable=None):
+    """
+    Exact k nearest neighbours of queries among normalised vectors, by cosine similarity.
+
+    Args:
+        queries (np.ndarray): Query embeddings, normalised here.
+        vectors (np.ndarray): Normalised candidate vectors.
+        k (int): Neighbours per query, at most the number of searchable vectors.
+        searchable (np.ndarray, optional): Boolean mask of the vectors that may be returned.
+
+    Returns:
+        tuple: (row positions in vectors, cosine distances), both of shape (n_queries, k), nearest first.
+    """
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+    norms = np.linalg.norm(queries, axis=1, keepdims=True)
+    queries = queries / np.where(norms > 0, norms, 1)
+    positions = np.empty((len(queries), k), dtype=np.int64)
+    distances = np.empty((len(queries), k), dtype=np.float32)
+    if k == 0:
+        return positions, distances
+    for start in range(0, len(queries), QUERY_BATCH_SIZE):
+        scores = queries[start:start + QUERY_BATCH_SIZE] @ vectors.T
+        if searchable is not None:
+            scores[:, ~searchable] = -np.inf
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        positions[start:start + len(scores)] = np.take_along_axis(top, order, axis=1)
+        distances[start:start + len(scores)] = 1 - np.take_along_axis(top_scores, order, axis=1)
+    return positions, distances
+
+
+class ExactIndex:
+    """
+    Exact cosine nearest-neighbour search by brute force, with the parts of the hnswlib.Index
+    interface the ticket matching system uses.
+
+    Vectors are kept normalised in one float32 matrix, so a batch of queries is scored with a
+    single matrix product and the top k are selected with argpartition. For small corpora this
+    is as fast as HNSW, builds instantly and has no approximation error, which also makes it the
+    ground truth to measure HNSW recall against.
+    """
+
+    backend = 'exact'
+
+    def __init__(self, space='cosine', dim=384):
+        if space != 'cosine':
+            raise ValueError(f"ExactIndex only supports the cosine space, not {space}")
+        self.space = space
+        self.dim = dim
+        self.M = 16  # HNSW parameters are kept for the bundle manifest but have no effect
+        self.ef_construction = 200
+        self.ef = 10
+        self._vectors = np.empty((0, dim), dtype=np.float32)
+        self._present = np.empty(0, dtype=bool)
+        self._deleted = np.empty(0, dtype=bool)
+
+    @classmethod
+    def from_index(cls, index, deleted_labels=()):
+        """Exact copy of an hnswlib index, e.g. as ground truth for its recall"""
+        exact = cls(space=index.space, dim=index.dim)
+        labels = np.asarray(index.get_ids_list(), dtype=np.int64)
+        exact.init_index(max_elements=max(index.get_max_elements(), 1), ef_construction=index.ef_construction, M=index.M)
+        if len(labels):
+            exact.add_items(index.get_items(labels, return_type='numpy'), labels)
+        for label in deleted_labels:
+            exact.mark_deleted(label)
+        exact.set_ef(index.ef)
+        return exact
+
+    def init_index(self, max_elements, ef_construction=200, M=16, **kwargs):
+        self.ef_construction = ef_construction
+        self.M = M
+        self._vectors = np.zeros((max_elements, self.dim), dtype=np.float32)
+        self._present = np.zeros(max_elements, dtype=bool)
+        self._deleted = np.zeros(max_elements, dtype=bool)
+
+    def set_ef(self, ef):
+        self.ef = ef
+
+    def set_num_threads(self, num_threads):
+        pass  # matrix products use the BLAS thread pool
+
+    def get_max_elements(self):
+        return len(self._vectors)
+
+    def get_current_count(self):
+        return int(self._present.sum())
+
+    def get_ids_list(self):
+        return np.flatnonzero(self._present).tolist()
+
+    def resize_index(self, new_size):
+        if new_size < self._present.nonzero()[0].max(initial=-1) + 1:
+            raise RuntimeError("Cannot resize, max element is less than the current number of elements")
+        grow = new_size - len(self._vectors)
+        if grow > 0:
+            self._vectors = np.concatenate([self._vectors, np.zeros((grow, self.dim), dtype=np.float32)])
+            self._present = np.concatenate([self._present, np.zeros(grow, dtype=bool)])
+            self._deleted = np.concatenate([self._deleted, np.zeros(grow, dtype=bool)])
+        else:
+            self._vectors = self._vectors[:new_size].copy()
+            self._present = self._present[:new_size].copy()
+            self._deleted = self._deleted[:new_size].copy()
+
+    def add_items(self, data, ids=None, num_threads=-1, replace_deleted=False):
+        data = np.atleast_2d(np.asarray(data, dtype=np.float32))
+        if data.shape[1] != self.dim:
+            raise RuntimeError(f"Wrong dimensionality of the vectors: {data.shape[1]}, expected {self.dim}")
+        ids = np.arange(self.get_current_count(), self.get_current_count() + len(data)) if ids is None else np.atleast_1d(np.asarray(ids, dtype=np.int64))
+        if len(ids) and ids.max() >= len(self._vectors):
+            raise RuntimeError("The number of elements exceeds the specified limit")
+        norms = np.linalg.norm(data, axis=1, keepdims=True)
+        self._vectors[ids] = data / np.where(norms > 0, norms, 1)
+        self._present[ids] = True
+        self._deleted[ids] = False
+
+    def get_items(self, ids, return_type='numpy'):
+        ids = np.asarray(ids, dtype=np.int64)
+        if not self._present[ids].all():
+            raise RuntimeError("Label not found")
+        items = self._vectors[ids].copy()
+        return items if return_type == 'numpy' else items.tolist()
+
+    def mark_deleted(self, label):
+        if label >= len(self._present) or not self._present[label] or self._deleted[label]:
+            raise RuntimeError("Label not found")
+        self._deleted[label] = True
+
+    def unmark_deleted(self, label):
+        if label >= len(self._present) or not self._present[label] or not self._deleted[label]:
+            raise RuntimeError("Label not found")
+        self._deleted[label] = False
+
+    def knn_query(self, data, k=1, num_threads=-1, filter=None):
+        """
+        Exact k nearest neighbours of every query.
+
+        Returns:
+            tuple: (labels, cosine distances), both of shape (n_queries, k), nearest first.
+        """
+        data = np.atleast_2d(np.asarray(data, dtype=np.float32))
+        searchable = self._present & ~self._deleted
+        if filter is not None:
+            candidates = np.flatnonzero(searchable)
+            searchable[candidates] = np.fromiter((filter(label) for label in candidates), dtype=bool, count=len(candidates))
+        n_searchable = int(searchable.sum())
+        if k > n_searchable:
+            raise RuntimeError("Cannot return the results in a contiguous 2D array. Probably ef or M is too small")
+
+        labels, distances = exact_knn(data, self._vectors, k, None if n_searchable == len(searchable) else searchable)
+        return labels.astype(np.uint64), distances
+
+    def save_index(self, path):
+        with open(path, 'wb') as f:
+            np.savez(
+                f, vectors=self._vectors, present=self._present, deleted=self._deleted,
+                params=np.array([self.M, self.ef_construction, self.ef]),
+            )
+
+    def load_index(self, path, max_elements=0, allow_replace_deleted=False):
+        with np.load(path) as saved:
+            vectors, present, deleted = saved['vectors'], saved['present'], saved['deleted']
+            self.M, self.ef_construction, self.ef = (int(value) for value in saved['params'])
+        if vectors.shape[1] != self.dim:
+            raise RuntimeError(f"Index has dimension {vectors.shape[1]}, expected {self.dim}")
+        self._vectors, self._present, self._deleted = vectors, present, deleted
+        if max_elements > len(vectors):
+            self.resize_index(max_elements)
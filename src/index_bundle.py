@@ -0,0 +1,415 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import hnswlib
+import numpy as np
+
+from exact_index import ExactIndex
+from lexical_index import BM25Index
+
+# Layout of an index bundle directory: each checkpoint writes a new version directory holding the
+# files below, and CURRENT names the current version
+BUNDLE_FORMAT_VERSION = 2
+SUPPORTED_FORMAT_VERSIONS = (1, 2)  # version 1 bundles have a ticket text checksum instead of per-label hashes
+CURRENT_FILE = 'CURRENT'
+INDEX_FILE = 'index.bin'
+LABELS_FILE = 'ticket_ids.json'
+MANIFEST_FILE = 'manifest.json'
+LEXICAL_FILE = 'lexical.npz'  # optional BM25 index for hybrid search
+TEXT_HASHES_FILE = 'text_hashes.npy'  # text_hashes of the ticket strings, in label order
+BUNDLE_FILES = (INDEX_FILE, LABELS_FILE, MANIFEST_FILE, LEXICAL_FILE, TEXT_HASHES_FILE)
+# Updates saved since the checkpoint, appended to its version directory: one JSON line per save,
+# pointing at the embeddings it appended to the vector log
+UPDATE_LOG_FILE = 'updates.jsonl'
+UPDATE_VECTORS_FILE = 'updates.f32'
+
+# Ticket data files written by compaction sit in the bundle directory, shared by the versions naming them
+TICKET_DATA_PREFIX = 'tickets-'
+
+# Versions kept on disk, so a process that read the previous version can still load its index
+KEEP_VERSIONS = 2
+
+
+def file_checksum(path):
+    """SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def text_checksum(strings):
+    """SHA-256 over a sequence of strings, used to detect ticket text that changed since a build"""
+    digest = hashlib.sha256()
+    for string in strings:
+        digest.update(string.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def text_hashes(strings):
+    """64-bit hash of every string, to detect ticket text that changed since it was embedded, per label"""
+    return np.array([
+        int.from_bytes(hashlib.blake2b(string.encode('utf-8'), digest_size=8).digest(), 'little') for string in strings
+    ], dtype=np.uint64)
+
+
+def save_bundle(path, index, ticket_ids, model_name, ticket_text_hashes, lexical_index=None, ef=None, ticket_data=None):
+    """
+    Write a new version of an index bundle, a checkpoint of the vector index, the label -> Ticket ID
+    map and a manifest. Later changes can be appended to it with append_bundle_updates.
+
+    The version is written to its own directory and then made current by atomically replacing
+    the CURRENT pointer, so the bundle path always resolves to a complete version, and a reader
+    holding a manifest keeps loading the version it names.
+
+    Args:
+        path (str): Bundle directory.
+        index (hnswlib.Index or ExactIndex): Index to save.
+        ticket_ids (list): Ticket ID of every label, in label order.
+        model_name (str): Sentence transformer model the embeddings come from.
+        ticket_text_hashes (np.ndarray): text_hashes of the ticket strings, in label order.
+        lexical_index (BM25Index, optional): BM25 index of the same tickets, saved alongside.
+        ef (int, optional): Search ef to load the index with; defaults to the index's current ef,
+            which per-query ef selection may have changed.
+        ticket_data (str, optional): Name of a TICKET_DATA_PREFIX data file in the bundle directory that
+            holds the tickets of this version instead of the caller's data file.
+
+    Returns:
+        dict: The manifest of the new version.
+    """
+    version = f"v{time.time_ns():020d}-{os.getpid()}"
+    tmp_path = os.path.join(path, f"{version}.tmp")
+    os.makedirs(tmp_path)
+
+    index.save_index(os.path.join(tmp_path, INDEX_FILE))
+    with open(os.path.join(tmp_path, LABELS_FILE), 'w') as f:
+        json.dump(list(ticket_ids), f)
+    np.save(os.path.join(tmp_path, TEXT_HASHES_FILE), np.asarray(ticket_text_hashes, dtype=np.uint64))
+    if lexical_index is not None:
+        lexical_index.save(os.path.join(tmp_path, LEXICAL_FILE))
+
+    manifest = {
+        'format_version': BUNDLE_FORMAT_VERSION,
+        'version': version,
+        'model_name': model_name,
+        'backend': getattr(index, 'backend', 'hnsw'),
+        'space': index.space,
+        'dim': index.dim,
+        'M': index.M,
+        'ef_construction': index.ef_construction,
+        'ef': ef if ef is not None else index.ef,
+        'max_elements': index.get_max_elements(),
+        'row_count': len(ticket_ids),
+        'checksums': {
+            INDEX_FILE: file_checksum(os.path.join(tmp_path, INDEX_FILE)),
+            LABELS_FILE: file_checksum(os.path.join(tmp_path, LABELS_FILE)),
+            TEXT_HASHES_FILE: file_checksum(os.path.join(tmp_path, TEXT_HASHES_FILE)),
+        },
+    }
+    if lexical_index is not None:
+        manifest['checksums'][LEXICAL_FILE] = file_checksum(os.path.join(tmp_path, LEXICAL_FILE))
+    if ticket_data is not None:
+        manifest['ticket_data'] = ticket_data
+    with open(os.path.join(tmp_path, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.rename(tmp_path, os.path.join(path, version))
+
+    # Point the bundle at the new version
+    pointer_path = os.path.join(path, f"{CURRENT_FILE}.tmp-{os.getpid()}")
+    with open(pointer_path, 'w') as f:
+        f.write(version)
+    os.replace(pointer_path, os.path.join(path, CURRENT_FILE))
+
+    # Files of a bundle written before versioning, and versions no reader should still need
+    for name in BUNDLE_FILES:
+        if os.path.exists(os.path.join(path, name)):
+            os.remove(os.path.join(path, name))
+    versions = sorted(name for name in os.listdir(path) if name.startswith('v') and not name.endswith('.tmp'))
+    for name in versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+
+    # Ticket data files (and their journals) of no remaining version
+    referenced = set()
+    for name in versions[-KEEP_VERSIONS:]:
+        try:
+            with open(os.path.join(path, name, MANIFEST_FILE)) as f:
+                ticket_data = json.load(f).get('ticket_data')
+        except FileNotFoundError:
+            continue
+        if ticket_data is not None:
+            referenced.add(ticket_data.split('.')[0])
+    for name in os.listdir(path):
+        if name.startswith(TICKET_DATA_PREFIX) and name.split('.')[0] not in referenced:
+            os.remove(os.path.join(path, name))
+    return manifest
+
+
+def append_bundle_updates(path, manifest, labels, ticket_ids, embeddings, ticket_text_hashes, deleted=(), revived=()):
+    """
+    Append the changes saved since the last checkpoint to a bundle version, instead of writing a new version.
+
+    The embeddings go to the vector log first; the JSON line pointing at them is the commit point,
+    so a save interrupted before its line is complete is ignored by readers.
+
+    Args:
+        path (str): Bundle directory.
+        manifest (dict): Manifest of the version to append to, e.g. the one save_bundle returned.
+        labels (list): Labels that were added or re-embedded.
+        ticket_ids (list): Ticket ID of every label.
+        embeddings (np.ndarray): Embedding of every label.
+        ticket_text_hashes (np.ndarray): text_hashes of the embedded ticket strings.
+        deleted (list): Labels to mark deleted once the embeddings are added.
+        revived (list): Labels to unmark once the embeddings are added.
+    """
+    version_path = bundle_version_path(path, manifest)
+    if not os.path.isdir(version_path):
+        raise FileNotFoundError(f"Index bundle {path} no longer has the version {manifest.get('version')} to append updates to")
+    data = np.ascontiguousarray(embeddings, dtype=np.float32).reshape(len(labels), manifest['dim']).tobytes()
+    with open(os.path.join(version_path, UPDATE_VECTORS_FILE), 'ab') as f:
+        offset = f.seek(0, os.SEEK_END)
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+    entry = {
+        'labels': [int(label) for label in labels],
+        'ticket_ids': list(ticket_ids),
+        'text_hashes': [int(text_hash) for text_hash in ticket_text_hashes],
+        'offset': offset,
+        'checksum': hashlib.sha256(data).hexdigest(),
+        'deleted': [int(label) for label in deleted],
+        'revived': [int(label) for label in revived],
+    }
+    log_path = os.path.join(version_path, UPDATE_LOG_FILE)
+    if os.path.exists(log_path):
+        # Drop the incomplete line of an interrupted save, which would corrupt the next one
+        _, complete_size = _read_update_log(version_path)
+        if complete_size != os.path.getsize(log_path):
+            os.truncate(log_path, complete_size)
+    with open(log_path, 'a') as f:
+        f.write(json.dumps(entry) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _read_update_log(version_path, size=None):
+    """
+    Read the complete lines of the update log of a bundle version.
+
+    Returns:
+        tuple: (list of update entries, size in bytes of the complete lines)
+    """
+    log_path = os.path.join(version_path, UPDATE_LOG_FILE)
+    if not os.path.exists(log_path):
+        return [], 0
+    with open(log_path, 'rb') as f:
+        data = f.read() if size is None else f.read(size)
+    complete_size = data.rfind(b'\n') + 1
+    return [json.loads(line) for line in data[:complete_size].splitlines()], complete_size
+
+
+def read_bundle_updates(path, manifest):
+    """
+    Update entries appended to a bundle version since its checkpoint, as far as read_bundle_labels read them.
+
+    Returns:
+        list: One dict per save, see append_bundle_updates.
+    """
+    return _read_update_log(bundle_version_path(path, manifest), manifest.get('update_log_size', 0))[0]
+
+
+def read_bundle_text_hashes(path, manifest):
+    """
+    text_hashes of the ticket strings of a bundle, in label order, with its updates applied.
+
+    Returns:
+        np.ndarray: One hash per label, or None for version 1 bundles, which have a checksum of all
+            ticket text in manifest['checksums']['ticket_text'] instead.
+    """
+    if TEXT_HASHES_FILE not in manifest['checksums']:
+        return None
+    hashes_path = os.path.join(bundle_version_path(path, manifest), TEXT_HASHES_FILE)
+    if not os.path.exists(hashes_path):
+        raise FileNotFoundError(f"Index bundle {path} no longer has the version {manifest.get('version')} its labels were read from; load it again")
+    if file_checksum(hashes_path) != manifest['checksums'][TEXT_HASHES_FILE]:
+        raise ValueError(f"Checksum mismatch for {TEXT_HASHES_FILE} in index bundle {path}")
+    hashes = np.load(hashes_path)
+    for entry in read_bundle_updates(path, manifest):
+        labels = np.asarray(entry['labels'], dtype=np.int64)
+        if len(labels) and labels.max() >= len(hashes):
+            hashes = np.concatenate([hashes, np.zeros(labels.max() + 1 - len(hashes), dtype=np.uint64)])
+        hashes[labels] = np.array(entry['text_hashes'], dtype=np.uint64)
+    return hashes
+
+
+def bundle_ticket_data_path(path, manifest):
+    """
+    Ticket data file of a bundle version, written by compaction.
+
+    Returns:
+        str: Path of the data file, or None if the version uses the caller's data file.
+    """
+    if manifest.get('ticket_data') is None:
+        return None
+    return os.path.join(path, manifest['ticket_data'])
+
+
+def bundle_version_path(path, manifest=None):
+    """
+    Directory holding the files of a bundle version.
+
+    Args:
+        path (str): Bundle directory.
+        manifest (dict, optional): Manifest from read_bundle_labels, to resolve the version it was
+            read from; the current version otherwise.
+
+    Returns:
+        str: The version directory, or the bundle directory itself for bundles written before versioning.
+    """
+    if manifest is not None:
+        return os.path.join(path, manifest['version']) if 'version' in manifest else path
+    pointer_path = os.path.join(path, CURRENT_FILE)
+    if not os.path.exists(pointer_path):
+        return path
+    with open(pointer_path) as f:
+        return os.path.join(path, f.read().strip())
+
+
+def read_bundle_labels(path, model_name, dim):
+    """
+    Read and verify the manifest and label map of an index bundle, without loading the index.
+
+    Labels added by updates appended since the checkpoint are included. The manifest returned
+    records how much of the update log was read (update_log_size), so the index and text hashes
+    loaded with it later replay the same updates, even while more are appended.
+
+    Args:
+        path (str): Bundle directory.
+        model_name (str): Model the caller embeds queries with; must match the bundle's.
+        dim (int, optional): Embedding dimension of the caller; must match the bundle's if given.
+
+    Returns:
+        tuple: (list of Ticket IDs in label order, manifest dict)
+    """
+    while True:
+        version_path = bundle_version_path(path)
+        try:
+            manifest, labels_data = _read_version(version_path)
+            break
+        except FileNotFoundError:
+            # Later saves removed the version between reading CURRENT and its files
+            if bundle_version_path(path) == version_path:
+                raise
+
+    if manifest.get('format_version') not in SUPPORTED_FORMAT_VERSIONS:
+        raise ValueError(f"Unsupported index bundle format {manifest.get('format_version')} in {path}")
+    if manifest['model_name'] != model_name:
+        raise ValueError(f"Index bundle was built with {manifest['model_name']}, not {model_name}")
+    if dim is not None and manifest['dim'] != dim:
+        raise ValueError(f"Index bundle has dimension {manifest['dim']}, expected {dim}")
+    if hashlib.sha256(labels_data).hexdigest() != manifest['checksums'][LABELS_FILE]:
+        raise ValueError(f"Checksum mismatch for {LABELS_FILE} in index bundle {path}")
+
+    ticket_ids = json.loads(labels_data)
+    if manifest['row_count'] != len(ticket_ids):
+        raise ValueError(f"Index bundle {path} is inconsistent: manifest has {manifest['row_count']} rows, label map {len(ticket_ids)}")
+
+    updates, manifest['update_log_size'] = _read_update_log(bundle_version_path(path, manifest))
+    for entry in updates:
+        for label, ticket_id in zip(entry['labels'], entry['ticket_ids']):
+            if label == len(ticket_ids):
+                ticket_ids.append(ticket_id)
+            elif label > len(ticket_ids) or ticket_ids[label] != ticket_id:
+                raise ValueError(f"Index bundle {path} is inconsistent: update of label {label} does not match the label map")
+    return ticket_ids, manifest
+
+
+def _read_version(version_path):
+    """Read the manifest and the raw label map of a bundle version"""
+    manifest_path = os.path.join(version_path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        raise FileNotFoundError(f"Index bundle manifest not found at {manifest_path}")
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    with open(os.path.join(version_path, LABELS_FILE), 'rb') as f:
+        return manifest, f.read()
+
+
+def load_bundle_index(path, manifest):
+    """
+    Load the index of a bundle (hnswlib or exact) and verify it against a manifest from read_bundle_labels.
+
+    The index is loaded from the version the manifest was read from, with the updates read with
+    the label map replayed, so it matches the label map even if the bundle has been saved again since.
+
+    Returns:
+        hnswlib.Index: The loaded index.
+    """
+    index_path = os.path.join(bundle_version_path(path, manifest), INDEX_FILE)
+    if not os.path.exists(index_path):
+        raise FileNotFoundError(f"Index bundle {path} no longer has the version {manifest.get('version')} its labels were read from; load it again")
+    if file_checksum(index_path) != manifest['checksums'][INDEX_FILE]:
+        raise ValueError(f"Checksum mismatch for {INDEX_FILE} in index bundle {path}")
+    # Bundles written before exact search existed have no backend entry
+    index_class = ExactIndex if manifest.get('backend', 'hnsw') == 'exact' else hnswlib.Index
+    index = index_class(space=manifest['space'], dim=manifest['dim'])
+    index.load_index(index_path, max_elements=manifest['max_elements'])
+    index.set_ef(manifest['ef'])
+    if index.get_current_count() != manifest['row_count']:
+        raise ValueError(f"Index bundle {path} is inconsistent: manifest has {manifest['row_count']} rows, index {index.get_current_count()}")
+
+    updates = read_bundle_updates(path, manifest)
+    if updates:
+        with open(os.path.join(bundle_version_path(path, manifest), UPDATE_VECTORS_FILE), 'rb') as f:
+            for entry in updates:
+                labels = np.asarray(entry['labels'], dtype=np.int64)
+                f.seek(entry['offset'])
+                data = f.read(len(labels) * manifest['dim'] * 4)
+                if hashlib.sha256(data).hexdigest() != entry['checksum']:
+                    raise ValueError(f"Checksum mismatch for {UPDATE_VECTORS_FILE} in index bundle {path}")
+                if len(labels):
+                    if labels.max() >= index.get_max_elements():
+                        index.resize_index(max(int(labels.max()) + 1, 2 * index.get_max_elements()))
+                    index.add_items(np.frombuffer(data, dtype=np.float32).reshape(len(labels), manifest['dim']), labels)
+                for label in entry['deleted']:
+                    index.mark_deleted(label)
+                for label in entry['revived']:
+                    index.unmark_deleted(label)
+    return index
+
+
+def load_bundle_lexical(path, manifest):
+    """
+    Load the BM25 index of a bundle, verified against a manifest from read_bundle_labels.
+
+    Returns:
+        BM25Index: The loaded index, or None if the bundle was saved without one.
+    """
+    if LEXICAL_FILE not in manifest['checksums']:
+        return None
+    lexical_path = os.path.join(bundle_version_path(path, manifest), LEXICAL_FILE)
+    if not os.path.exists(lexical_path):
+        raise FileNotFoundError(f"Index bundle {path} no longer has the version {manifest.get('version')} its labels were read from; load it again")
+    if file_checksum(lexical_path) != manifest['checksums'][LEXICAL_FILE]:
+        raise ValueError(f"Checksum mismatch for {LEXICAL_FILE} in index bundle {path}")
+    return BM25Index.load(lexical_path)
+
+
+def load_bundle(path, model_name, dim):
+    """
+    Read and verify an index bundle.
+
+    Args:
+        path (str): Bundle directory.
+        model_name (str): Model the caller embeds queries with; must match the bundle's.
+        dim (int, optional): Embedding dimension of the caller; must match the bundle's if given.
+
+    Returns:
+        tuple: (hnswlib.Index or ExactIndex, list of Ticket IDs in label order, manifest dict)
+    """
+    ticket_ids, manifest = read_bundle_labels(path, model_name, dim)
+    return load_bundle_index(path, manifest), ticket_ids, manifest
@@ -0,0 +1,184 @@
+import argparse
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+
+# Ticket dump formats that can be ingested
+TICKET_FILE_EXTENSIONS = ('.csv', '.xlsx', '.json', '.parquet')
+
+# Canonical Ticket ID format; dumps also contain IDs like TKT1000 or tckt 1000
+TICKET_ID_PREFIX = 'TCKT-'
+TICKET_ID_PATTERN = re.compile(r'^\s*T(?:C)?KT[-_ ]?(\d+)\s*$', re.IGNORECASE)
+
+RESOLVED_VALUES = {'true': True, 'yes': True, 'y': True, '1': True, 'resolved': True,
+                   'false': False, 'no': False, 'n': False, '0': False, 'unresolved': False}
+
+
+def read_ticket_file(file_path):
+    """
+    Reads a ticket dump (CSV, XLSX, JSON or Parquet) into a pandas DataFrame.
+
+    Args:
+        file_path (str): Path to the file.
+
+    Returns:
+        pd.DataFrame: DataFrame containing the data from the file.
+    """
+    file_extension = os.path.splitext(file_path)[1].lower()
+    if file_extension == '.csv':
+        return pd.read_csv(file_path)
+    elif file_extension == '.xlsx':
+        return pd.read_excel(file_path)
+    elif file_extension == '.json':
+        return pd.read_json(file_path)
+    elif file_extension == '.parquet':
+        return pd.read_parquet(file_path)
+    else:
+        raise ValueError(f"Unsupported file format: {file_extension}")
+
+
+def iter_ticket_table(path, chunksize=None):
+    """
+    Read a ticket table (CSV or Parquet) in chunks of rows.
+
+    Args:
+        path (str): CSV or Parquet file.
+        chunksize (int, optional): Rows per chunk; by default the whole table is one chunk.
+
+    Returns:
+        iterable: DataFrames of consecutive rows.
+    """
+    if os.path.splitext(path)[1].lower() != '.parquet':
+        return [pd.read_csv(path)] if chunksize is None else pd.read_csv(path, chunksize=chunksize)
+    if chunksize is None:
+        return [pd.read_parquet(path)]
+    import pyarrow.parquet as pq
+    return (batch.to_pandas() for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize))
+
+
+def write_ticket_table(df, path):
+    """
+    Atomically write a ticket table as CSV, or as Parquet for .parquet paths.
+
+    Parquet needs consistent column types, so Resolved and Date are normalised first.
+    """
+    tmp_path = path + '.tmp'
+    if os.path.splitext(path)[1].lower() == '.parquet':
+        normalize_ticket_columns(df).to_parquet(tmp_path, index=False)
+    else:
+        df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def normalize_ticket_id(ticket_id):
+    """Map Ticket IDs like TKT1000 or tckt 1000 to the canonical TCKT-1000, leaving other IDs unchanged"""
+    if pd.isna(ticket_id):
+        return ticket_id
+    ticket_id = str(ticket_id).strip()
+    match = TICKET_ID_PATTERN.match(ticket_id)
+    return f"{TICKET_ID_PREFIX}{match.group(1)}" if match else ticket_id
+
+
+def normalize_resolved(values):
+    """Parse a Resolved column of booleans, numbers or strings like 'yes' into a nullable boolean column"""
+    if pd.api.types.is_bool_dtype(values):
+        return values.astype('boolean')
+    parsed = values.map(lambda value: value if isinstance(value, bool) or pd.isna(value) else RESOLVED_VALUES.get(str(value).strip().lower()))
+    return parsed.astype('boolean')
+
+
+def normalize_ticket_columns(df):
+    """
+    Give the ticket columns consistent types: nullable boolean Resolved, datetime Date and
+    string text columns, whatever format the tickets were read from.
+    """
+    df = df.copy()
+    for column in df.columns:
+        if column == 'Resolved':
+            df[column] = normalize_resolved(df[column])
+        elif column == 'Date':
+            df[column] = pd.to_datetime(df[column], format='mixed', errors='coerce')
+        elif column == 'Deleted':
+            df[column] = df[column].fillna(False).astype(bool)
+        elif df[column].dtype == object or pd.api.types.is_string_dtype(df[column]):
+            df[column] = df[column].astype('string')
+    return df
+
+
+def normalize_tickets(df):
+    """Normalise the schema of a ticket dump: stripped column names, canonical Ticket IDs and column types"""
+    df = df.rename(columns=lambda column: str(column).strip())
+    if 'Ticket ID' not in df.columns:
+        raise ValueError(f"Ticket dump has no 'Ticket ID' column, found {list(df.columns)}")
+    df['Ticket ID'] = df['Ticket ID'].map(normalize_ticket_id)
+    return normalize_ticket_columns(df)
+
+
+def _read_normalized(file_path):
+    """Read and normalise one ticket dump, in a worker process"""
+    df = normalize_tickets(read_ticket_file(file_path))
+    print(f"Read {len(df)} tickets from {file_path}")
+    return df
+
+
+def find_ticket_files(paths):
+    """Expand directories into the ticket dumps they contain, in sorted order"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(
+                os.path.join(path, name) for name in sorted(os.listdir(path))
+                if os.path.splitext(name)[1].lower() in TICKET_FILE_EXTENSIONS
+            )
+        else:
+            files.append(path)
+    return files
+
+
+def ingest_ticket_files(paths, output_path=None, num_workers=None):
+    """
+    Merge ticket dumps of any supported format into one normalised ticket table.
+
+    Files are parsed in parallel processes (XLSX parsing in particular is CPU bound). Tickets
+    that appear in several dumps are kept once, in the version of the last file listing them.
+
+    Args:
+        paths (list): Ticket dump files, or directories of them.
+        output_path (str, optional): Write the merged tickets here, as Parquet for .parquet paths
+            (loadable directly by TicketMatchingSystem) or CSV otherwise.
+        num_workers (int, optional): Number of processes, defaults to one per file up to the core count.
+
+    Returns:
+        pd.DataFrame: The merged tickets.
+    """
+    files = find_ticket_files(paths)
+    if not files:
+        raise FileNotFoundError(f"No ticket files found in {paths}")
+    num_workers = num_workers or min(len(files), os.cpu_count() or 1)
+    if num_workers > 1:
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(num_workers, mp_context=context) as executor:
+            frames = list(executor.map(_read_normalized, files))
+    else:
+        frames = [_read_normalized(file_path) for file_path in files]
+
+    tickets = pd.concat(frames, ignore_index=True)
+    n_read = len(tickets)
+    tickets = tickets.drop_duplicates('Ticket ID', keep='last').reset_index(drop=True)
+    print(f"Merged {n_read} tickets from {len(files)} files into {len(tickets)} distinct tickets")
+
+    if output_path:
+        write_ticket_table(tickets, output_path)
+        print(f"Tickets written to {output_path}")
+    return tickets
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge CSV/XLSX/JSON ticket dumps into one normalised ticket table")
+    parser.add_argument('paths', nargs='+', help="ticket dump files or directories")
+    parser.add_argument('--output', default='../data/combined_data.parquet', help="output .parquet (or .csv) file")
+    parser.add_argument('--workers', type=int, default=None, help="number of parsing processes")
+    args = parser.parse_args()
+    ingest_ticket_files(args.paths, args.output, args.workers)
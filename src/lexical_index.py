@@ -0,0 +1,365 @@
+import re
+import threading
+from collections import Counter
+import numpy as np
+
+# Words, numbers and compound tokens like error codes, hostnames and product codes (srv-db01.corp, XJ-200)
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[._:/@-][a-z0-9]+)*")
+TOKEN_SEPARATORS = re.compile(r"[._:/@-]")
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Term frequencies are stored in one byte; ticket texts are far too short to need more
+MAX_TERM_FREQUENCY = 255
+
+# Postings added since the last merge are kept in a small delta segment until they exceed this
+# fraction of the main segment
+MERGE_FRACTION = 0.1
+
+
+def tokenize(text):
+    """
+    Lowercase tokens of a text for BM25. Compound tokens are kept whole and also split into
+    their parts, so 'srv-db01.corp' matches both itself and 'db01'.
+    """
+    tokens = []
+    for token in TOKEN_PATTERN.findall(str(text).lower()):
+        tokens.append(token)
+        parts = TOKEN_SEPARATORS.split(token)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+class PostingsSegment:
+    """
+    Immutable postings of many documents in CSR layout: the postings of term t are
+    doc_ids[offsets[t]:offsets[t + 1]], sorted by document, with their term frequencies.
+
+    A posting takes 5 bytes (uint32 label, uint8 term frequency). max_norms holds the largest
+    BM25 term-frequency component of every term, which bounds its score contribution.
+    """
+
+    def __init__(self, offsets, doc_ids, term_freqs, max_norms):
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.max_norms = max_norms
+
+    @classmethod
+    def from_postings(cls, term_ids, doc_ids, term_freqs, n_terms, norm):
+        """
+        Build a segment from unordered (term, document, term frequency) triples.
+
+        Args:
+            norm (callable): BM25 term-frequency component of (term_freqs, doc_ids).
+        """
+        order = np.lexsort((doc_ids, term_ids))
+        term_ids, doc_ids, term_freqs = term_ids[order], doc_ids[order], term_freqs[order]
+        offsets = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=n_terms), out=offsets[1:])
+        max_norms = np.zeros(n_terms, dtype=np.float32)
+        present = np.flatnonzero(np.diff(offsets))
+        if len(present):
+            max_norms[present] = np.maximum.reduceat(norm(term_freqs, doc_ids), offsets[present])
+        return cls(offsets, doc_ids, term_freqs, max_norms)
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.uint8), np.empty(0, dtype=np.float32))
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def postings(self, term_id):
+        """Documents containing a term, sorted, and the term's frequency in each"""
+        if term_id >= len(self.max_norms):
+            return self.doc_ids[:0], self.term_freqs[:0]
+        start, end = self.offsets[term_id], self.offsets[term_id + 1]
+        return self.doc_ids[start:end], self.term_freqs[start:end]
+
+    def document_frequency(self, term_ids):
+        term_ids = np.asarray(term_ids)
+        known = term_ids < len(self.max_norms)
+        frequencies = np.zeros(len(term_ids), dtype=np.int64)
+        frequencies[known] = self.offsets[term_ids[known] + 1] - self.offsets[term_ids[known]]
+        return frequencies
+
+    def max_norm(self, term_ids):
+        term_ids = np.asarray(term_ids)
+        known = term_ids < len(self.max_norms)
+        norms = np.zeros(len(term_ids), dtype=np.float32)
+        norms[known] = self.max_norms[term_ids[known]]
+        return norms
+
+    def triples(self):
+        """The (term, document, term frequency) triples of all postings"""
+        term_ids = np.repeat(np.arange(len(self.max_norms), dtype=np.int32), np.diff(self.offsets))
+        return term_ids, self.doc_ids, self.term_freqs
+
+    def nbytes(self):
+        return self.offsets.nbytes + self.doc_ids.nbytes + self.term_freqs.nbytes + self.max_norms.nbytes
+
+
+class BM25Index:
+    """
+    In-process inverted index scoring ticket strings with BM25, keyed by the same labels as the
+    vector index.
+
+    Postings live in a main segment plus a small delta segment holding documents added or
+    replaced since the last merge, so updates don't rewrite the main postings. Replaced and
+    deleted documents are masked until they are merged away (or renumbered by compaction).
+
+    Searches are term-at-a-time with MaxScore early termination: terms are processed from the
+    highest score bound down, and once the k-th best score so far exceeds what the remaining
+    terms could add, those (frequent, low-idf) terms only rescore existing candidates by
+    binary search instead of walking their long postings.
+    """
+
+    def __init__(self, k1=BM25_K1, b=BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.vocabulary = {}
+        self._doc_lengths = np.zeros(0, dtype=np.int32)
+        self._length_norms = np.zeros(0, dtype=np.float32)  # BM25 length normalisation of every label
+        self._has_doc = np.zeros(0, dtype=bool)
+        self._deleted = np.zeros(0, dtype=bool)
+        self._stale = np.zeros(0, dtype=bool)  # labels whose main segment postings were replaced
+        self._avgdl = 1.0
+        self._main = PostingsSegment.empty()
+        self._delta = PostingsSegment.empty()
+        self._pending = []  # (term_ids, doc_ids, term_freqs) added since the last merge
+        self._pending_dirty = False
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return int(self._has_doc.sum())
+
+    def add(self, labels, strings):
+        """Index ticket strings under labels, replacing the documents of labels already indexed"""
+        labels = np.asarray(labels, dtype=np.int64)
+        if not len(labels):
+            return
+        term_ids, doc_ids, term_freqs = [], [], []
+        lengths = np.empty(len(labels), dtype=np.int32)
+        for i, (label, string) in enumerate(zip(labels.tolist(), strings)):
+            counts = Counter(tokenize(string))
+            lengths[i] = sum(counts.values())
+            for term, count in counts.items():
+                term_ids.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+                doc_ids.append(label)
+                term_freqs.append(min(count, MAX_TERM_FREQUENCY))
+
+        with self._lock:
+            self._grow(labels.max() + 1)
+            replaced = labels[self._has_doc[labels]]
+            if len(replaced):
+                self._stale[replaced] = True
+                self._pending = [
+                    (t[keep], d[keep], f[keep]) for t, d, f in self._pending
+                    for keep in [~np.isin(d, replaced)]
+                ]
+            self._pending.append((
+                np.asarray(term_ids, dtype=np.int32), np.asarray(doc_ids, dtype=np.uint32), np.asarray(term_freqs, dtype=np.uint8),
+            ))
+            self._doc_lengths[labels] = lengths
+            self._length_norms[labels] = self._length_norm(lengths)
+            self._has_doc[labels] = True
+            self._pending_dirty = True
+
+    def mark_deleted(self, label):
+        self._grow(label + 1)
+        self._deleted[label] = True
+
+    def unmark_deleted(self, label):
+        self._grow(label + 1)
+        self._deleted[label] = False
+
+    def _grow(self, n_labels):
+        grow = n_labels - len(self._has_doc)
+        if grow > 0:
+            self._doc_lengths = np.concatenate([self._doc_lengths, np.zeros(grow, dtype=np.int32)])
+            self._length_norms = np.concatenate([self._length_norms, np.zeros(grow, dtype=np.float32)])
+            self._has_doc = np.concatenate([self._has_doc, np.zeros(grow, dtype=bool)])
+            self._deleted = np.concatenate([self._deleted, np.zeros(grow, dtype=bool)])
+            self._stale = np.concatenate([self._stale, np.zeros(grow, dtype=bool)])
+
+    def _length_norm(self, lengths):
+        return (self.k1 * (1 - self.b + self.b * lengths / self._avgdl)).astype(np.float32)
+
+    def _norm(self, term_freqs, doc_ids):
+        """BM25 term-frequency component, with length normalisation by the average document length"""
+        term_freqs = term_freqs.astype(np.float32)
+        return term_freqs * np.float32(self.k1 + 1) / (term_freqs + self._length_norms[doc_ids])
+
+    def _pending_postings(self):
+        if not self._pending:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.uint8)
+        return tuple(np.concatenate(parts) for parts in zip(*self._pending))
+
+    def _segments(self):
+        """Main and delta segment for a search, merging or rebuilding the delta first if documents were added"""
+        with self._lock:
+            if self._pending_dirty:
+                pending = self._pending_postings()
+                if len(pending[0]) > MERGE_FRACTION * len(self._main):
+                    self._merge(pending)
+                else:
+                    self._delta = PostingsSegment.from_postings(*pending, len(self.vocabulary), self._norm)
+                self._pending_dirty = False
+            return self._main, self._delta
+
+    def _merge(self, pending=None):
+        """Fold the pending postings into the main segment, dropping replaced postings"""
+        term_ids, doc_ids, term_freqs = self._main.triples()
+        current = ~self._stale[doc_ids]
+        pending = self._pending_postings() if pending is None else pending
+        term_ids = np.concatenate([term_ids[current], pending[0]])
+        doc_ids = np.concatenate([doc_ids[current], pending[1]])
+        term_freqs = np.concatenate([term_freqs[current], pending[2]])
+        self._avgdl = float(self._doc_lengths[self._has_doc].mean()) if self._has_doc.any() else 1.0
+        self._avgdl = max(self._avgdl, 1.0)
+        self._length_norms = self._length_norm(self._doc_lengths)
+        self._main = PostingsSegment.from_postings(term_ids, doc_ids, term_freqs, len(self.vocabulary), self._norm)
+        self._delta = PostingsSegment.empty()
+        self._pending = []
+        self._pending_dirty = False
+        self._stale[:] = False
+
+    def search(self, query, k, labels=None):
+        """
+        The k best documents for a query string by BM25.
+
+        Args:
+            query (str): Query ticket string.
+            k (int): Number of documents to return.
+            labels (np.ndarray, optional): Only return documents with these labels.
+
+        Returns:
+            tuple: (labels, BM25 scores), best first; fewer than k if fewer documents match.
+        """
+        main, delta = self._segments()
+        term_ids = np.array(sorted({self.vocabulary[token] for token in tokenize(query) if token in self.vocabulary}), dtype=np.int64)
+        if not len(term_ids) or k <= 0:
+            return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.float32)
+
+        n_docs = max(len(self), 1)
+        document_frequency = main.document_frequency(term_ids) + delta.document_frequency(term_ids)
+        idf = np.log(1 + (n_docs - document_frequency + 0.5) / (document_frequency + 0.5)).astype(np.float32)
+        bounds = idf * np.maximum(main.max_norm(term_ids), delta.max_norm(term_ids))
+        order = np.argsort(-bounds, kind='stable')
+        remaining = np.cumsum(bounds[order][::-1])[::-1]  # most the terms from position i on can add
+
+        n_labels = len(self._has_doc)
+        allowed = None
+        if labels is not None:
+            allowed = np.zeros(n_labels, dtype=bool)
+            allowed[labels] = True
+        # Masks are only applied when they exclude anything
+        deleted = self._deleted if self._deleted.any() else None
+        stale = self._stale if self._stale.any() else None
+        scores = np.zeros(n_labels, dtype=np.float32)
+        is_candidate = np.zeros(n_labels, dtype=bool)
+        candidates = np.empty(0, dtype=np.uint32)
+        # Scores only grow, so the top k after a term are the best of the previous top k and the documents it scored
+        top = np.empty(0, dtype=np.uint32)
+        is_top = np.zeros(n_labels, dtype=bool)
+        kth_score = 0.0
+        pruning = False
+        for i, position in enumerate(order):
+            if len(top) == k and (pruning or kth_score > remaining[i]):
+                # No unseen document can reach the top k any more, nor can candidates the remaining terms can't lift to it
+                pruning = True
+                survive = scores[candidates] + remaining[i] >= kth_score
+                is_candidate[candidates[~survive]] = False
+                candidates = candidates[survive]
+            for segment, excluded in ((main, stale), (delta, None)):
+                docs, term_freqs = segment.postings(term_ids[position])
+                if not len(docs):
+                    continue
+                if pruning and len(candidates) * 16 < len(docs):
+                    # Few candidates: binary search them in the postings
+                    found = np.minimum(np.searchsorted(docs, candidates), len(docs) - 1)
+                    hit = docs[found] == candidates
+                    docs, term_freqs = candidates[hit], term_freqs[found[hit]]
+                elif pruning:
+                    keep = is_candidate[docs]
+                    docs, term_freqs = docs[keep], term_freqs[keep]
+                if deleted is not None or excluded is not None or allowed is not None:
+                    keep = np.ones(len(docs), dtype=bool)
+                    for mask in (deleted, excluded):
+                        if mask is not None:
+                            keep &= ~mask[docs]
+                    if allowed is not None:
+                        keep &= allowed[docs]
+                    docs, term_freqs = docs[keep], term_freqs[keep]
+                scores[docs] += idf[position] * self._norm(term_freqs, docs)
+                if not pruning:
+                    new = docs[~is_candidate[docs]]
+                    is_candidate[new] = True
+                    candidates = np.concatenate([candidates, new])
+                contenders = np.concatenate([top, docs[~is_top[docs]]])
+                if len(contenders) > k:
+                    contenders = contenders[np.argpartition(-scores[contenders], k - 1)[:k]]
+                is_top[top] = False
+                is_top[contenders] = True
+                top = contenders
+                if len(top) == k:
+                    kth_score = scores[top].min()
+
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return top.astype(np.uint64), scores[top]
+
+    def renumbered(self, labels):
+        """Copy of the index with only the given labels, renumbered to their positions, e.g. after compaction"""
+        with self._lock:
+            self._merge()
+            mapping = np.full(len(self._has_doc), -1, dtype=np.int64)
+            mapping[labels] = np.arange(len(labels))
+            term_ids, doc_ids, term_freqs = self._main.triples()
+            keep = mapping[doc_ids] >= 0
+            renumbered = BM25Index(self.k1, self.b)
+            renumbered.vocabulary = dict(self.vocabulary)
+            renumbered._grow(len(labels))
+            renumbered._doc_lengths[:] = self._doc_lengths[labels]
+            renumbered._has_doc[:] = self._has_doc[labels]
+            renumbered._deleted[:] = self._deleted[labels]
+        renumbered._pending = [(term_ids[keep], mapping[doc_ids[keep]].astype(np.uint32), term_freqs[keep])]
+        renumbered._merge()
+        return renumbered
+
+    def save(self, path):
+        """Write the index to an .npz file, merging pending postings first"""
+        with self._lock:
+            self._merge()
+            terms = np.frombuffer('\n'.join(self.vocabulary).encode('utf-8'), dtype=np.uint8)
+            with open(path, 'wb') as f:
+                np.savez(
+                    f, terms=terms, offsets=self._main.offsets, doc_ids=self._main.doc_ids,
+                    term_freqs=self._main.term_freqs, max_norms=self._main.max_norms,
+                    doc_lengths=self._doc_lengths, has_doc=self._has_doc,
+                    params=np.array([self.k1, self.b, self._avgdl]),
+                )
+
+    @classmethod
+    def load(cls, path):
+        """Read an index written by save; deleted labels are not saved and must be marked again"""
+        with np.load(path) as saved:
+            k1, b, avgdl = (float(value) for value in saved['params'])
+            index = cls(k1, b)
+            terms = saved['terms'].tobytes().decode('utf-8')
+            index.vocabulary = {term: term_id for term_id, term in enumerate(terms.split('\n'))} if terms else {}
+            index._main = PostingsSegment(saved['offsets'], saved['doc_ids'], saved['term_freqs'], saved['max_norms'])
+            index._grow(len(saved['has_doc']))
+            index._doc_lengths[:] = saved['doc_lengths']
+            index._has_doc[:] = saved['has_doc']
+            index._avgdl = avgdl
+            index._length_norms = index._length_norm(index._doc_lengths)
+        return index
+
+    def nbytes(self):
+        """Approximate memory held by the postings and per-label arrays, not counting the vocabulary"""
+        return self._main.nbytes() + self._delta.nbytes() + sum(
+            array.nbytes for array in (self._doc_lengths, self._has_doc, self._deleted, self._stale)
+        )
@@ -0,0 +1,138 @@
+import math
+import multiprocessing
+import os
+import time
+from contextlib import contextmanager
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+
+from encoders import encode_in_length_buckets, encoder_signature, load_encoder, token_lengths, truncate_embeddings
+
+# Shards per worker process, so a worker that finishes early picks up more work
+SHARDS_PER_WORKER = 4
+
+# State of a worker process, set up once by _init_worker
+_worker = {}
+
+
+def _init_worker(model_name, encoder_backend, onnx_model_dir, dim, num_threads, max_batch_tokens):
+    """Load the encoder in a worker process"""
+    model = load_encoder(model_name, encoder_backend, onnx_model_dir, num_threads=num_threads)
+    _worker.update(
+        model=model, encoder=encoder_signature(model_name, encoder_backend, onnx_model_dir), dim=dim,
+        max_batch_tokens=max_batch_tokens, shm=None,
+    )
+
+
+def _attach_output(shm_name, n_texts):
+    """The shared embedding matrix of the current encode call, attached once per call"""
+    shm = _worker['shm']
+    if shm is None or shm.name != shm_name:
+        if shm is not None:
+            # The parent has unlinked the previous matrix; closing it here frees the memory
+            _worker.pop('embeddings')
+            shm.close()
+        shm = _worker['shm'] = SharedMemory(name=shm_name)
+        _worker['embeddings'] = np.ndarray((n_texts, _worker['dim']), dtype=np.float32, buffer=shm.buf)
+    return _worker['embeddings']
+
+
+def _encode_shard(shard):
+    """Encode one shard of texts straight into the shared embedding matrix"""
+    shm_name, n_texts, start, texts, checkpoint_dir = shard
+    model, dim = _worker['model'], _worker['dim']
+
+    def encode(batch, batch_size):
+        return truncate_embeddings(model.encode(batch, batch_size=batch_size), dim)
+
+    embeddings = encode_in_length_buckets(
+        encode, texts, dim, lengths=token_lengths(model, texts), max_batch_tokens=_worker['max_batch_tokens'],
+        checkpoint_dir=checkpoint_dir, report_every=60.0, encoder=_worker['encoder'],
+    )
+    _attach_output(shm_name, n_texts)[start:start + len(texts)] = embeddings
+    return len(texts)
+
+
+class ProcessEncoder:
+    """
+    Pool of processes, each holding its own model, to encode large lists of texts.
+
+    Workers write their embeddings into one shared-memory matrix per encode call, so only the
+    texts are sent to them and nothing but a count is pickled back. The matrix is handed to the
+    caller as is, without copying it out of shared memory.
+    """
+
+    def __init__(self, model_name, dim, num_workers, encoder_backend='torch', onnx_model_dir=None,
+                 threads_per_worker=None, max_batch_tokens=16384):
+        """
+        Args:
+            model_name (str): Name of the sentence transformer model.
+            dim (int): Embedding dimension of the index (embeddings are truncated to it).
+            num_workers (int): Number of worker processes.
+            encoder_backend (str): Encoder backend of the workers, see encoders.load_encoder.
+            onnx_model_dir (str, optional): Exported model for the onnx backend.
+            threads_per_worker (int, optional): Encoder (torch or onnx) threads per worker, defaults to an even split of the cores.
+            max_batch_tokens (int): Padded tokens per batch within a worker.
+        """
+        self.dim = dim
+        self.num_workers = num_workers
+        threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // num_workers)
+        # spawn rather than fork: forking a process that already initialised torch threads can deadlock
+        context = multiprocessing.get_context('spawn')
+        initargs = (model_name, encoder_backend, onnx_model_dir, dim, threads_per_worker, max_batch_tokens)
+        self._pool = context.Pool(num_workers, initializer=_init_worker, initargs=initargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self._pool.terminate()  # don't wait for the shards of a failed encode
+        self.close()
+
+    def close(self):
+        """Stop the worker processes"""
+        self._pool.close()
+        self._pool.join()
+
+    @contextmanager
+    def encode(self, texts, checkpoint_dir=None):
+        """
+        Encode texts across the workers.
+
+        Args:
+            texts (list): Strings to encode.
+            checkpoint_dir (str, optional): Directory for per-shard encoding checkpoints, to resume interrupted builds.
+
+        Yields:
+            np.ndarray: One embedding per text, in input order, in shared memory that is released
+                when the with block exits; copy what must outlive it.
+        """
+        n_texts = len(texts)
+        if not n_texts:
+            yield np.empty((0, self.dim), dtype=np.float32)
+            return
+        shard_size = math.ceil(n_texts / (self.num_workers * SHARDS_PER_WORKER))
+
+        shm = SharedMemory(create=True, size=n_texts * self.dim * 4)
+        shards = [
+            (shm.name, n_texts, start, texts[start:start + shard_size],
+             os.path.join(checkpoint_dir, f'shard-{start}') if checkpoint_dir else None)
+            for start in range(0, n_texts, shard_size)
+        ]
+        embeddings = None
+        try:
+            start_time = time.monotonic()
+            done = 0
+            for count in self._pool.imap_unordered(_encode_shard, shards):
+                done += count
+                rate = done / (time.monotonic() - start_time)
+                print(f"Encoded {done}/{n_texts} tickets with {self.num_workers} processes ({rate:.1f} tickets/sec)")
+            embeddings = np.ndarray((n_texts, self.dim), dtype=np.float32, buffer=shm.buf)
+            yield embeddings
+        finally:
+            # The view must be gone before the shared memory can be closed
+            del embeddings
+            shm.close()
+            shm.unlink()
+
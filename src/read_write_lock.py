@@ -0,0 +1,99 @@
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    """
+    Lock held shared by any number of readers or exclusively by one writer.
+
+    Waiting writers keep new readers out, so a steady stream of searches cannot starve an
+    update. Neither side is reentrant: a thread must not take the lock again while holding it.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        """Hold the lock shared for the duration of a with block"""
+        with self._condition:
+            while self._writing or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        """Hold the lock exclusively for the duration of a with block"""
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writing or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+
+class GroupLock:
+    """
+    Lock held shared by any number of threads of the same group, and by one group at a time.
+
+    Threads are admitted in arrival order: a thread of the current group queues behind a waiting
+    thread of another group, so no group can starve the others. Like ReadWriteLock, it is not
+    reentrant.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._group = None
+        self._holders = 0
+        self._queue = deque()
+
+    @contextmanager
+    def hold(self, group, switch=None):
+        """
+        Hold the lock for a group for the duration of a with block.
+
+        Args:
+            group (hashable): Group to hold the lock for.
+            switch (callable, optional): Called with the group, without other holders, whenever the
+                lock passes to the group from another group or from no holder, e.g. to apply a
+                setting the group shares.
+        """
+        with self._condition:
+            ticket = object()
+            self._queue.append(ticket)
+            while self._queue[0] is not ticket or (self._holders and self._group != group):
+                self._condition.wait()
+            self._queue.popleft()
+            # The next queued thread may belong to the same group
+            self._condition.notify_all()
+            if self._group != group:
+                if switch is not None:
+                    switch(group)
+                self._group = group
+            self._holders += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._holders -= 1
+                if not self._holders:
+                    # Don't keep the group (and what it refers to) alive; the next holder switches again
+                    self._group = None
+                    self._condition.notify_all()
@@ -1,17 +1,72 @@
 import streamlit as st
 import os
+from sentence_transformers import SentenceTransformer
+from index_bundle import CURRENT_FILE, MANIFEST_FILE, UPDATE_LOG_FILE, bundle_version_path
 from ticket_matching_system import TicketMatchingSystem
 from ticket_resolution_system import TicketResolutionSystem
 
 # Paths to pre-built index and data
-INDEX_PATH = "ticket_index.bin"  # Ensure this file exists
+INDEX_PATH = "ticket_index"  # Index bundle directory, built from BASE_DF_PATH on first run if missing
 BASE_DF_PATH = "../data/combined_data.csv"  # Ensure this file exists
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def file_signature(path):
+    """Return the (mtime, size) of a file, used to invalidate cached resources when it changes (None if missing)"""
+    if not os.path.exists(path):
+        return None
+    if os.path.isdir(path):
+        # Every checkpoint of an index bundle atomically replaces its CURRENT pointer, and saves in
+        # between append to the update log of the current version; bundles written before
+        # versioning have their manifest at the top
+        pointer_path = os.path.join(path, CURRENT_FILE)
+        if not os.path.exists(pointer_path):
+            return file_signature(os.path.join(path, MANIFEST_FILE))
+        log_path = os.path.join(bundle_version_path(path), UPDATE_LOG_FILE)
+        return file_signature(pointer_path), file_signature(log_path)
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+# st.cache_resource objects live for the whole server process and are shared by all sessions,
+# so the model, index and ticket data are loaded once instead of on every rerun.
+@st.cache_resource(show_spinner="Loading embedding model...")
+def load_embedding_model(model_name):
+    """Load the sentence transformer once per process"""
+    return SentenceTransformer(model_name)
+
+
+@st.cache_resource(max_entries=1, show_spinner="Loading ticket index...")
+def load_matching_system(index_path, data_path, index_signature, data_signature):
+    """
+    Load the Ticket Matching System once per process.
+
+    The file signatures are part of the cache key only: when the index or data file changes
+    the cached system is replaced, otherwise every session reuses the same instance.
+    """
+    system = TicketMatchingSystem(
+        # Without a bundle, the index is built from the ticket data and saved as one
+        index_path=index_path if os.path.isdir(index_path) else None,
+        resolved_tickets_data_path=data_path,
+        model_name=MODEL_NAME,
+        model=load_embedding_model(MODEL_NAME),
+    )
+    # Load the index now rather than on the first search
+    system.warmup()
+    return system
+
+
+@st.cache_resource
+def load_resolution_system():
+    """Load the Ticket Resolution System once per process"""
+    return TicketResolutionSystem()
+
 
 # Load the Ticket Matching System with pre-built index
-matching_system = TicketMatchingSystem(index_path=INDEX_PATH, resolved_tickets_data_path=BASE_DF_PATH)
+matching_system = load_matching_system(INDEX_PATH, BASE_DF_PATH, file_signature(INDEX_PATH), file_signature(BASE_DF_PATH))
 
 # Load the Ticket Resolution System
-resolution_system = TicketResolutionSystem()
+resolution_system = load_resolution_system()
 
 # Streamlit UI
 st.title("Helpdesk Ticket Resolution Assistant 🛠️")
@@ -20,15 +75,29 @@ st.title("Helpdesk Ticket Resolution Assistant 🛠️")
 issue = st.text_input("Issue", placeholder="Enter the issue (e.g., Printer not working)")
 category = st.text_input("Category", placeholder="Enter the category (e.g., Hardware, Software)")
 description = st.text_area("Description", placeholder="Enter detailed issue description")
+same_category_only = st.checkbox("Only show tickets from these categories")
+filter_categories = []
+if same_category_only:
+    # The filter matches categories exactly, so it offers the indexed ones, starting with the entered one
+    indexed_categories = matching_system.ticket_store.categories()
+    filter_categories = st.multiselect(
+        "Categories to search", indexed_categories,
+        default=[category] if category in indexed_categories else [],
+    )
 
 if st.button("Find Resolution"):
-    if issue and category and description:
+    if same_category_only and not filter_categories:
+        st.warning("Please select the categories to search.")
+    elif issue and category and description:
         # Create a new ticket
         new_ticket = {"Issue": issue, "Category": category, "Description": description}
         
         # Find similar tickets
         with st.spinner("🔍 Searching for similar tickets..."):
-            similar_tickets = matching_system.find_similar_tickets(issue, category, description, k=3)
+            similar_tickets = matching_system.find_similar_tickets(
+                issue, category, description, k=3, category_filter=filter_categories if same_category_only else None,
+                resolved_first=True,
+            )
         
         # Display similar tickets
         st.subheader("Similar Tickets From Past :")
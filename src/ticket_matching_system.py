@@ -1,30 +1,283 @@
 import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
 import hnswlib
 import numpy as np
 import pandas as pd
-from sentence_transformers import SentenceTransformer
+
+from ef_calibration import DEFAULT_EF_VALUES, DEFAULT_K_VALUES, EfCalibration, calibrate_ef
+from exact_index import ExactIndex, exact_knn
+from embedding_cache import EmbeddingCache, QueryEmbeddingCache
+from encoders import encode_in_length_buckets, encoder_signature, load_encoder, set_encoder_threads, token_lengths, truncate_embeddings
+from ingestion import iter_ticket_table, normalize_ticket_id, write_ticket_table
+from index_bundle import (
+    TEXT_HASHES_FILE, TICKET_DATA_PREFIX, append_bundle_updates, bundle_ticket_data_path, bundle_version_path, load_bundle,
+    load_bundle_index, load_bundle_lexical, read_bundle_labels, read_bundle_text_hashes, read_bundle_updates, save_bundle,
+    text_checksum, text_hashes,
+)
+from lexical_index import BM25Index
+from parallel_build import ProcessEncoder
+from read_write_lock import GroupLock, ReadWriteLock
+from ticket_store import SqliteTicketStore, TicketStore
+
+# Index backends; 'auto' picks exact search for corpora up to EXACT_SEARCH_MAX_TICKETS tickets
+INDEX_BACKENDS = ('auto', 'hnsw', 'exact')
+EXACT_SEARCH_MAX_TICKETS = 20000
+
+# Filtered searches among at most this many tickets scan them exactly instead of filtering the graph walk
+FILTER_EXACT_MAX_CANDIDATES = 2048
+
+# Range searches start with this many neighbours per query and double it while all of them clear the threshold
+RANGE_SEARCH_INITIAL_K = 16
+RANGE_SEARCH_MAX_RESULTS = 1000
+
+# Saves append changed embeddings to the update log of the current bundle version until it holds
+# this fraction of the index, then write a new full checkpoint
+CHECKPOINT_FRACTION = 0.1
+
+# Hybrid search fuses this many dense and BM25 candidates per query by reciprocal rank fusion
+HYBRID_CANDIDATES = 50
+RRF_K = 60
+
+# Models whose tokenizer lowercases its input, so the query cache can ignore case
+UNCASED_MODELS = ('sentence-transformers/all-MiniLM-L6-v2', 'all-MiniLM-L6-v2')
+
+# Ticket fields combined into the text that gets embedded, in order
+TICKET_TEXT_COLUMNS = ['Issue', 'Category', 'Description']
+
+
+def ticket_field_text(value):
+    """Text of one ticket field as it is embedded: missing values become empty strings"""
+    return '' if value is None or (np.ndim(value) == 0 and pd.isna(value)) else str(value)
+
+
+def join_ticket_fields(fields):
+    """
+    Join the text of the ticket fields with spaces.
+
+    Works on plain strings and on whole columns alike (strings and Series both support +),
+    so single queries and the column-wise index build share the exact same combination.
+    """
+    combined = None
+    for values in fields:
+        combined = values if combined is None else combined + ' ' + values
+    return combined
+
+
+def build_ticket_strings(df):
+    """
+    Combine the text fields of every ticket in a DataFrame into a single string per ticket.
+
+    Column-wise equivalent of ticket_string on every row; used for the index build so it
+    cannot drift apart from the strings of queries.
+
+    Args:
+        df (pd.DataFrame): Tickets with (any of) the Issue, Category and Description columns.
+
+    Returns:
+        list: One ticket string per row.
+    """
+    columns = [
+        df[column].fillna('').astype(str) if column in df.columns else pd.Series('', index=df.index)
+        for column in TICKET_TEXT_COLUMNS
+    ]
+    return join_ticket_fields(columns).str.strip().tolist()
+
+
+def ticket_string(issue, category, description):
+    """Ticket string of a single ticket, without the overhead of building a DataFrame"""
+    return join_ticket_fields(ticket_field_text(value) for value in (issue, category, description)).strip()
+
+
+def ticket_journal_path(csv_path):
+    """Path of the journal holding tickets added or updated since csv_path was written"""
+    return os.path.splitext(csv_path)[0] + '.delta.csv'
+
+
+def read_ticket_data(csv_path):
+    """
+    Read a ticket CSV together with its journal of incremental changes.
+
+    Journal rows hold the fields given to an update, empty fields keeping the previous value.
+    Journaled tickets whose ID is already in the CSV have those fields replaced in place, new
+    tickets are appended in the order they were first added, so row positions keep matching the
+    labels of legacy indexes that have no label map.
+    Deleted tickets stay in place with their Deleted column set until the index is compacted.
+
+    Args:
+        csv_path (str): Path to CSV (or Parquet) file containing ticket data.
+
+    Returns:
+        pd.DataFrame: Ticket data with the journal applied.
+    """
+    return pd.concat(list(iter_ticket_data(csv_path)), ignore_index=True)
+
+
+def iter_ticket_data(csv_path, chunksize=None):
+    """
+    Read a ticket CSV and its journal in chunks of rows, in the row order of read_ticket_data.
+
+    Only the journal is held in memory as a whole, so large ticket histories can be processed
+    with memory bounded by the chunk size.
+
+    Args:
+        csv_path (str): Path to CSV (or Parquet) file containing ticket data.
+        chunksize (int, optional): Rows per chunk; by default the whole CSV is one chunk.
+
+    Yields:
+        pd.DataFrame: Consecutive chunks of ticket data with the journal applied.
+    """
+    journal_path = ticket_journal_path(csv_path)
+    latest = None
+    if os.path.exists(journal_path):
+        journal = pd.read_csv(journal_path)
+        # Latest value of every journaled field of every ticket, in order of first appearance
+        latest = journal.groupby('Ticket ID', sort=False).last()
+
+    chunks = iter_ticket_table(csv_path, chunksize)
+    applied = set()  # journaled tickets already found in the CSV; only their first row is updated
+    for chunk in chunks:
+        if latest is not None:
+            chunk = _apply_journal_updates(chunk, latest, applied)
+        yield chunk
+
+    if latest is not None:
+        new_tickets = latest[~latest.index.isin(list(applied))].reset_index()
+        step = chunksize or max(len(new_tickets), 1)
+        for start in range(0, len(new_tickets), step):
+            yield new_tickets.iloc[start:start + step].reset_index(drop=True)
+
+
+def _apply_journal_updates(chunk, latest, applied):
+    """Overwrite rows of a CSV chunk with their journaled fields, recording the applied Ticket IDs"""
+    ticket_ids = chunk['Ticket ID']
+    first_rows = ~ticket_ids.duplicated() & ticket_ids.isin(latest.index) & ~ticket_ids.isin(list(applied))
+    rows = np.flatnonzero(first_rows.to_numpy())
+    if not len(rows):
+        return chunk
+    updates = latest.loc[ticket_ids.iloc[rows]].reset_index().astype(object)
+    chunk = chunk.reindex(columns=chunk.columns.union(updates.columns, sort=False)).astype(object)
+    current = chunk.iloc[rows].reset_index(drop=True)[updates.columns]
+    chunk.loc[chunk.index[rows], updates.columns] = updates.where(updates.notna(), current).to_numpy()
+    applied.update(updates['Ticket ID'])
+    return chunk
+
+
+def _set_index_ef(group):
+    """Switch the (index, ef) group of GroupLock to: set the index's ef"""
+    index, ef = group
+    index.set_ef(ef)
+
 
 class TicketMatchingSystem:
-    def __init__(self, resolved_tickets_data_path='data/combined_data.csv', model_name='sentence-transformers/all-MiniLM-L6-v2', index_path=None):
+    def __init__(self, resolved_tickets_data_path='data/combined_data.csv', model_name='sentence-transformers/all-MiniLM-L6-v2',
+                 index_path=None, model=None, tombstone_threshold=0.2,
+                 embedding_cache_dir=None, query_cache_size=1024, query_cache_ttl=None,
+                 encoder_backend='torch', onnx_model_dir=None, embedding_dim=None, encode_threads=None, max_batch_tokens=16384,
+                 build_chunksize=None, metadata_db_path=None,
+                 index_backend='auto', exact_search_max_tickets=EXACT_SEARCH_MAX_TICKETS,
+                 hnsw_m=16, hnsw_ef_construction=200, hnsw_ef=50, recall_target=None, ef_calibration=None,
+                 hybrid_search=False, save_delay=5.0):
         """
         Initialize the TicketMatchingSystem.
         
         Args:
-            resolved_tickets_data_path (str): Path to CSV file containing resolved ticket data. Required parameter.
+            resolved_tickets_data_path (str): Path to CSV file (or Parquet store written by ingestion.py) containing
+                resolved ticket data. Required parameter.
             model_name (str): Name of the sentence transformer model.
-            index_path (str, optional): Path to a pre-built index. If provided, the index will be loaded from disk.
+            index_path (str, optional): Path to a pre-built index bundle directory (or a legacy bare .bin index).
+                If provided, the ticket data is loaded now and the index from disk on first use (or by warmup()).
+            model (SentenceTransformer, optional): Already loaded model to share between systems; otherwise model_name
+                is loaded on first use.
+            tombstone_threshold (float): Fraction of deleted entries in the index above which it is compacted in the background.
+            embedding_cache_dir (str, optional): Directory of a persistent embedding cache, so index builds only encode
+                tickets whose text changed.
+            query_cache_size (int): Number of query embeddings kept in the in-process LRU cache, 0 disables it.
+                Cache keys ignore case only for the uncased models in UNCASED_MODELS.
+            query_cache_ttl (float, optional): Seconds after which a cached query embedding is recomputed.
+            encoder_backend (str): 'torch' (sentence-transformers) or 'onnx' (ONNX Runtime, e.g. int8-quantized) to embed with.
+            onnx_model_dir (str, optional): Model exported by encoders.export_onnx_model, for the onnx backend.
+            embedding_dim (int, optional): Truncate embeddings to their first embedding_dim dimensions (Matryoshka-style)
+                for a smaller, faster index. Defaults to the loaded index's dimension, or the model's own.
+            encode_threads (int, optional): Intra-op threads of the encoder, torch's or the onnx session's (per worker
+                process when building with num_workers).
+            max_batch_tokens (int): Padded tokens per batch when encoding tickets for the index; batches are formed
+                from tickets of similar token length.
+            build_chunksize (int, optional): When building the index, stream the CSV in chunks of this many rows
+                (see build_index_from_csv).
+            metadata_db_path (str, optional): Keep the ticket fields returned by searches in this SQLite database
+                instead of in memory. Processes serving the same index bundle share it and skip reading the data file
+                while it is in sync with the bundle.
+            index_backend (str): 'hnsw' (approximate, hnswlib), 'exact' (brute-force NumPy search) or 'auto', which
+                uses exact search up to exact_search_max_tickets tickets and HNSW above (and for legacy .bin indexes).
+            exact_search_max_tickets (int): Corpus size up to which 'auto' picks exact search.
+            hnsw_m (int): HNSW graph degree of built indexes (see benchmark_index.py to choose it).
+            hnsw_ef_construction (int): HNSW candidate list size while building.
+            hnsw_ef (int): HNSW candidate list size while searching built or legacy indexes; a loaded bundle replaces it
+                with the ef saved in its manifest.
+            recall_target (float, optional): With ef_calibration, search every query with the smallest ef that
+                reached this recall@k for its k, instead of a fixed ef.
+            ef_calibration (str or EfCalibration, optional): Recall table from calibrate_ef (or its JSON file).
+            hybrid_search (bool): Also rank tickets by BM25 over their text, which catches exact error strings,
+                hostnames and product codes, and fuse both rankings by reciprocal rank fusion in find_similar_tickets.
+                The BM25 index is saved in the index bundle; similarity_threshold still applies to the dense similarity,
+                and results keep the fused order (resolved tickets first) rather than being sorted by similarity_score.
+            save_delay (float): Seconds after an update with save=True before the index is saved and the journal
+                written, so a burst of updates is saved once. Updates of the last save_delay seconds are lost if the
+                process is killed; flush() saves them right away. 0 saves on every update.
         """
+        if index_backend not in INDEX_BACKENDS:
+            raise ValueError(f"Unknown index backend {index_backend}, expected one of {INDEX_BACKENDS}")
         if not resolved_tickets_data_path:
             print("Need a data file to initialize the system")
             return None
 
-        self.model = SentenceTransformer(model_name)
-        self.index = None
-        self.ticket_ids = []
-        self.resolved_tickets_data = None
-        self.dim = 384  # default dimension for all-MiniLM-L6-v2
+        self._model = model
+        self.model_name = model_name
+        self.encoder_backend = encoder_backend
+        self.onnx_model_dir = onnx_model_dir
+        self._index = None
+        self._deferred_index_path = None  # index_path until the index is loaded on first use
+        self._load_lock = threading.Lock()  # guards the deferred index load
+        self._model_lock = threading.Lock()  # guards the model load, which the index load may need for dim
+        self.index_manifest = None  # manifest of the loaded index bundle, None for legacy indexes
+        self._bundle_path = None  # directory of the loaded index bundle
+        self._ticket_data_source = None  # data file (and journal) read_ticket_data_in_label_order reads
+        self.ticket_store = None
+        self._dim = embedding_dim  # resolved from the index bundle or the model when not configured
         self.index_path = index_path
         self.resolved_tickets_data_path = resolved_tickets_data_path
+        self.deleted_labels = set()
+        self.tombstone_threshold = tombstone_threshold
+        self._lock = threading.RLock()  # serialises index and ticket data updates
+        self._search_lock = ReadWriteLock()  # held shared by searches, exclusively while the index or ticket store change
+        self._ef_lock = GroupLock()  # held by searches per (index, ef), as ef is index-wide in hnswlib
+        self._version = 0  # bumped on every update, invalidates cached search partitions
+        self._compaction_thread = None
+        self._compaction_changes = None  # label -> new embedding (None if not re-encoded) of tickets changed while compacting
+        self._partitions = {}  # search filter -> (version, live labels, label set), see _partition
+        self.embedding_cache_dir = embedding_cache_dir
+        self.encode_threads = encode_threads
+        self.max_batch_tokens = max_batch_tokens
+        self.metadata_db_path = metadata_db_path
+        self.index_backend = index_backend
+        self.exact_search_max_tickets = exact_search_max_tickets
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construction = hnsw_ef_construction
+        self.hnsw_ef = hnsw_ef
+        self.recall_target = recall_target
+        self.ef_calibration = EfCalibration.load(ef_calibration) if isinstance(ef_calibration, str) else ef_calibration
+        self.hybrid_search = hybrid_search
+        self._lexical_index = None
+        self._embedding_cache = None
+        self.save_delay = save_delay
+        self._unsaved_rows = []  # journal rows of updates not saved yet
+        self._unsaved_embeddings = {}  # label -> embedding added or re-encoded since the last save
+        self._unsaved_deletions = {}  # label -> whether it was deleted at the last save, for labels (un)deleted since
+        self._logged_updates = 0  # embeddings appended to the update log since the last checkpoint
+        self._save_timer = None
+        self.query_cache = QueryEmbeddingCache(query_cache_size, query_cache_ttl, lowercase=model_name in UNCASED_MODELS) if query_cache_size else None
 
         # Check if data file exists
         if not os.path.exists(resolved_tickets_data_path):
@@ -34,90 +287,833 @@ class TicketMatchingSystem:
         if index_path:
             if not os.path.exists(index_path):
                 raise FileNotFoundError(f"Index file not found at {index_path}")
-            self.load_index(index_path)
-            self.load_resolved_tickets_data(resolved_tickets_data_path)
+            if os.path.isdir(index_path):
+                # The label map is needed to line up the ticket data; the index itself is loaded lazily
+                ticket_ids, self.index_manifest = read_bundle_labels(index_path, model_name, self._dim)
+                self._dim = self.index_manifest['dim']
+                self.hnsw_ef = self.index_manifest['ef']
+                self._bundle_path = index_path
+                self._logged_updates = self._count_logged_updates()
+                # A compacted bundle has its own copy of the ticket data
+                data_path = bundle_ticket_data_path(index_path, self.index_manifest) or resolved_tickets_data_path
+                self.load_resolved_tickets_data(data_path, ticket_ids)
+            else:
+                self.load_resolved_tickets_data(resolved_tickets_data_path)
+            self._deferred_index_path = index_path
         else:
             # Build index from CSV
-            self.build_index_from_csv(resolved_tickets_data_path)
+            self.build_index_from_csv(resolved_tickets_data_path, chunksize=build_chunksize)
+    
+    @property
+    def model(self):
+        """The embedding model of the configured backend, imported and loaded on first use"""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = load_encoder(self.model_name, self.encoder_backend, self.onnx_model_dir, num_threads=self.encode_threads)
+        return self._model
+    
+    @property
+    def dim(self):
+        """Dimension of the indexed embeddings: embedding_dim, else the index bundle's, else the model's"""
+        if self._dim is None:
+            self._dim = self.model.get_sentence_embedding_dimension()
+        return self._dim
+    
+    @property
+    def embedding_cache(self):
+        """The persistent embedding cache, opened once the embedding dimension is known"""
+        if self._embedding_cache is None and self.embedding_cache_dir:
+            encoder = encoder_signature(self.model_name, self.encoder_backend, self.onnx_model_dir)
+            self._embedding_cache = EmbeddingCache(self.embedding_cache_dir, encoder, self.dim)
+        return self._embedding_cache
+    
+    @property
+    def ticket_ids(self):
+        """Ticket ID of every label, read from the ticket store on every access"""
+        return [] if self.ticket_store is None else self.ticket_store.ticket_ids.tolist()
+    
+    @property
+    def index(self):
+        """The vector index (hnswlib, or ExactIndex for exact search), loaded from index_path on first use"""
+        if self._index is None and self._deferred_index_path is not None:
+            with self._load_lock:
+                if self._index is None and self._deferred_index_path is not None:
+                    self._load_deferred_index()
+        return self._index
+    
+    @index.setter
+    def index(self, index):
+        self._index = index
+        self._deferred_index_path = None
+    
+    @property
+    def lexical_index(self):
+        """The BM25 index of hybrid search, loaded from the index bundle or built from the ticket text on first use"""
+        if self._lexical_index is None and self.hybrid_search and self.ticket_store is not None:
+            # The ticket data lock, not the load lock: the BM25 index is built from the ticket store
+            with self._lock:
+                if self._lexical_index is None:
+                    self._lexical_index = self._load_lexical_index()
+        return self._lexical_index
+    
+    def _load_lexical_index(self):
+        """Load the BM25 index saved with the index bundle, or build it from the ticket data"""
+        lexical_index = None
+        if self.index_manifest is not None:
+            lexical_index = load_bundle_lexical(self._bundle_path, self.index_manifest)
+        if lexical_index is not None:
+            # Tickets embedded since the bundle's checkpoint; adding embeddings undeletes a label
+            updates = read_bundle_updates(self._bundle_path, self.index_manifest)
+            embedded = sorted({label for entry in updates for label in entry['labels']})
+            if embedded:
+                lexical_index.add(embedded, build_ticket_strings(self.ticket_store.to_dataframe(embedded)))
+            for label in set(embedded).union(*(entry['revived'] for entry in updates)) - self.deleted_labels:
+                lexical_index.unmark_deleted(label)
+        else:
+            lexical_index = BM25Index()
+            lexical_index.add(np.arange(len(self.ticket_store)), build_ticket_strings(self.ticket_store.to_dataframe()))
+            print(f"Built BM25 index of {len(self.ticket_store)} tickets")
+        for label in self.deleted_labels:
+            lexical_index.mark_deleted(label)
+        return lexical_index
+    
+    def _load_deferred_index(self):
+        """Load the index given to the constructor, checking it still matches the loaded ticket data"""
+        path = self._deferred_index_path
+        if self.index_manifest is not None:
+            self._index = load_bundle_index(path, self.index_manifest)
+        else:
+            self._index = self._load_bare_index(path)
+            if self._index.get_current_count() != len(self.ticket_store):
+                raise ValueError(f"Index at {path} has {self._index.get_current_count()} tickets but the ticket data has {len(self.ticket_store)}")
+        self._deferred_index_path = None
+        print(f"Index loaded from {path}")
+    
+    def warmup(self):
+        """Load the model and index now instead of on the first query, e.g. before a server takes traffic"""
+        self.generate_embeddings("warmup")
+        if self.index is None:
+            raise ValueError("Index has not been built yet")
     
     def create_ticket_string(self, issue, category, description):
         """Combine ticket fields into a single string representation"""
-        if pd.isna(issue):
-            issue = ""
-        if pd.isna(category):
-            category = ""
-        if pd.isna(description):
-            description = ""
-        
-        return f"{issue} {category} {description}".strip()
+        return ticket_string(issue, category, description)
     
-    def generate_embeddings(self, texts):
+    def generate_embeddings(self, texts, batch_size=32):
         """Generate embeddings for text(s)"""
         # Handle both single text and list of texts
         if isinstance(texts, str):
-            return self.model.encode([texts])[0]
+            return self.generate_embeddings([texts])[0]
+        return truncate_embeddings(self.model.encode(texts, batch_size=batch_size), self.dim)
+    
+    def encode_tickets(self, ticket_strings, checkpoint_dir=None, num_workers=None, process_encoder=None):
+        """
+        Generate embeddings for ticket strings to be indexed.
+        
+        Tickets are encoded in batches of similar token length (through the embedding cache if
+        configured), with throughput reporting and, given a checkpoint_dir, resume support.
+        With num_workers > 1 the tickets are sharded across a pool of processes started for the
+        call, or across the pool of an existing process_encoder (see _process_encoder).
+        """
+        if process_encoder is None and num_workers and num_workers > 1:
+            with self._process_encoder(num_workers) as encoder:
+                return self.encode_tickets(ticket_strings, checkpoint_dir, process_encoder=encoder)
+        
+        def encode(strings):
+            if process_encoder is not None:
+                with process_encoder.encode(strings, checkpoint_dir) as embeddings:
+                    return embeddings.copy()
+            # Load the model first: it imports torch, whose thread count can only be set once imported
+            model = self.model
+            set_encoder_threads(self.encode_threads)
+            return encode_in_length_buckets(
+                self.generate_embeddings, strings, self.dim, lengths=token_lengths(model, strings),
+                max_batch_tokens=self.max_batch_tokens, checkpoint_dir=checkpoint_dir,
+                encoder=encoder_signature(self.model_name, self.encoder_backend, self.onnx_model_dir),
+            )
+        
+        if self.embedding_cache is None:
+            return encode(ticket_strings)
+        return self.embedding_cache.encode(ticket_strings, encode)
+    
+    @contextmanager
+    def _encoded_tickets(self, ticket_strings, checkpoint_dir=None, process_encoder=None):
+        """
+        Embeddings of ticket strings to insert, valid only inside the with block.
+
+        Encoded in processes without the embedding cache, they are used straight from the workers'
+        shared memory instead of being copied out of it, which would double peak memory.
+        """
+        if process_encoder is not None and self.embedding_cache is None:
+            with process_encoder.encode(ticket_strings, checkpoint_dir) as embeddings:
+                yield embeddings
         else:
-            return self.model.encode(texts)
+            yield self.encode_tickets(ticket_strings, checkpoint_dir, process_encoder=process_encoder)
+    
+    def _process_encoder(self, num_workers):
+        """Pool of num_workers processes encoding with this system's model and settings"""
+        return ProcessEncoder(
+            self.model_name, self.dim, num_workers, encoder_backend=self.encoder_backend,
+            onnx_model_dir=self.onnx_model_dir, threads_per_worker=self.encode_threads,
+            max_batch_tokens=self.max_batch_tokens,
+        )
     
-    def build_index_from_csv(self, csv_path, save_path="ticket_index.bin"):
+    def encode_queries(self, query_strings):
+        """Generate embeddings for query strings, through the query LRU cache if enabled"""
+        if self.query_cache is None:
+            return self.generate_embeddings(query_strings)
+        return self.query_cache.encode(query_strings, self.generate_embeddings)
+    
+    def build_index_from_csv(self, csv_path, save_path="ticket_index", checkpoint_dir=None, num_workers=None, chunksize=None):
         """
         Build search index from CSV file of tickets and optionally save it to disk.
         
         Args:
-            csv_path (str): Path to CSV file containing ticket data.
-            save_path (str, optional): Path to save the index.
-        """
-        # Load CSV into DataFrame
-        df = pd.read_csv(csv_path)
-        self.resolved_tickets_data = df.copy()
-        
-        # Create ticket strings
-        ticket_strings = []
-        for _, row in df.iterrows():
-            ticket_string = self.create_ticket_string(
-                row.get('Issue', ''), 
-                row.get('Category', ''), 
-                row.get('Description', '')
-            )
-            ticket_strings.append(ticket_string)
+            csv_path (str): Path to CSV (or Parquet) file containing ticket data.
+            save_path (str, optional): Path to save the index bundle.
+            checkpoint_dir (str, optional): Directory to checkpoint the encoding to, so an interrupted
+                build resumes where it stopped.
+            num_workers (int, optional): Encode with this many processes, each loading its own model, for very
+                large ticket histories.
+            chunksize (int, optional): Stream the CSV in chunks of this many rows, encoding and inserting
+                each chunk before reading the next, so peak memory is bounded by the chunk size.
+        """
+        n_elements = 0
+        index = None
+        lexical_index = BM25Index() if self.hybrid_search else None
+        ticket_store = None
+        hash_chunks = []
         
-        # Store ticket IDs
-        self.ticket_ids = df['Ticket ID'].tolist()
+        # One pool for the whole build, so each worker loads the model once rather than once per chunk
+        with self._process_encoder(num_workers) if num_workers and num_workers > 1 else nullcontext() as process_encoder:
+            # Load CSV (and any journaled changes) chunk by chunk
+            for chunk_number, chunk in enumerate(iter_ticket_data(csv_path, chunksize)):
+                chunk = chunk.reset_index(drop=True)
+                labels = np.arange(n_elements, n_elements + len(chunk))
+                
+                # Create ticket strings and generate embeddings
+                ticket_strings = build_ticket_strings(chunk)
+                hash_chunks.append(text_hashes(ticket_strings))
+                chunk_checkpoint_dir = os.path.join(checkpoint_dir, f'chunk-{chunk_number}') if checkpoint_dir else None
+                
+                # Insert into the index, growing it geometrically as chunks arrive
+                if index is None:
+                    index = self._create_index(len(chunk), save_path=save_path)
+                else:
+                    index = self._grow_index(index, n_elements + len(chunk))
+                with self._encoded_tickets(ticket_strings, chunk_checkpoint_dir, process_encoder) as embeddings:
+                    index.add_items(embeddings, labels, num_threads=-1)  # insert with all cores
+                if lexical_index is not None:
+                    lexical_index.add(labels, ticket_strings)
+                n_elements += len(chunk)
+                
+                if ticket_store is not None:
+                    ticket_store.append(chunk)
+                elif self.metadata_db_path is None:
+                    ticket_store = TicketStore.from_dataframe(chunk)
+                else:
+                    ticket_store = SqliteTicketStore.from_dataframe(self.metadata_db_path, chunk)
+                if chunksize is not None:
+                    print(f"Indexed {n_elements} tickets")
         
-        # Generate embeddings
-        embeddings = self.generate_embeddings(ticket_strings)
+        if index is None:
+            raise ValueError(f"No tickets found in {csv_path}")
+        index.set_ef(self.hnsw_ef)  # ef influences search accuracy
+        deleted_labels = ticket_store.deleted_labels()
+        for label in deleted_labels:
+            index.mark_deleted(label)
+            if lexical_index is not None:
+                lexical_index.mark_deleted(label)
         
-        # Build index
-        n_elements = len(embeddings)
-        self.index = hnswlib.Index(space='cosine', dim=self.dim)
-        self.index.init_index(max_elements=n_elements, ef_construction=200, M=16)
-        self.index.add_items(embeddings, np.arange(n_elements))
-        self.index.set_ef(50)  # ef influences search accuracy
+        self._set_ticket_store(ticket_store, deleted_labels)
+        self._ticket_data_source = csv_path
+        self.index = index
+        self._lexical_index = lexical_index
 
         # Save index for re-use
-        self.save_index(save_path)
+        self.save_index(save_path, ticket_text_hashes=np.concatenate(hash_chunks))
+        self.index_path = save_path
     
-    def save_index(self, save_path):
-        """Save the index to disk"""
+    def _create_index(self, n_elements, ef_construction=None, M=None, save_path=None):
+        """
+        Create an empty index for n_elements tickets with the configured (or size-selected) backend.
+        'auto' picks HNSW when the index is saved to (save_path, else index_path) a legacy .bin file,
+        which can only hold an hnswlib index.
+        """
+        backend = self.index_backend
+        if backend == 'auto':
+            legacy = (save_path or self.index_path or '').endswith('.bin')
+            backend = 'exact' if n_elements <= self.exact_search_max_tickets and not legacy else 'hnsw'
+        index = ExactIndex(space='cosine', dim=self.dim) if backend == 'exact' else hnswlib.Index(space='cosine', dim=self.dim)
+        index.init_index(
+            max_elements=max(n_elements, 1),
+            ef_construction=ef_construction or self.hnsw_ef_construction,
+            M=M or self.hnsw_m,
+        )
+        return index
+    
+    def _grow_index(self, index, needed, deleted_labels=()):
+        """
+        Make room for labels up to needed, growing geometrically so repeated small additions don't
+        resize every time. With the 'auto' backend an exact index that outgrows
+        exact_search_max_tickets is converted to HNSW, keeping deleted_labels marked.
+        """
+        if self.index_backend == 'auto' and isinstance(index, ExactIndex) and needed > self.exact_search_max_tickets:
+            labels = np.asarray(index.get_ids_list(), dtype=np.int64)
+            hnsw_index = hnswlib.Index(space='cosine', dim=self.dim)
+            hnsw_index.init_index(max_elements=max(needed, 2 * index.get_max_elements()), ef_construction=index.ef_construction, M=index.M)
+            if len(labels):
+                hnsw_index.add_items(index.get_items(labels, return_type='numpy'), labels, num_threads=-1)
+            for label in deleted_labels:
+                hnsw_index.mark_deleted(label)
+            hnsw_index.set_ef(self.hnsw_ef)
+            print(f"Switched to an HNSW index at {needed} tickets")
+            return hnsw_index
+        if needed > index.get_max_elements():
+            index.resize_index(max(needed, 2 * index.get_max_elements()))
+        return index
+    
+    def save_index(self, save_path, ticket_text_hashes=None):
+        """
+        Save the whole index to disk, as a checkpoint that later updates are appended to.
+        
+        Writes an index bundle (index, label -> Ticket ID map, ticket text hashes and manifest
+        with the model, hnsw parameters and checksums). Paths ending in .bin get a legacy bare
+        index, whose labels are implied by the row order of the ticket data.
+        ticket_text_hashes computed while building save re-reading the ticket data.
+        """
         if self.index is None:
             raise ValueError("Index has not been built yet")
-        self.index.save_index(save_path)
+        if save_path.endswith('.bin'):
+            if isinstance(self.index, ExactIndex):
+                raise ValueError("Exact search indexes can only be saved as index bundles")
+            self.index.save_index(save_path)
+        else:
+            if ticket_text_hashes is None:
+                ticket_text_hashes = text_hashes(build_ticket_strings(self.ticket_store.to_dataframe()))
+            lexical_index = self.lexical_index if self.hybrid_search else None
+            # Data written by compaction into the bundle directory is named in the manifest
+            ticket_data = None
+            if self._ticket_data_source and os.path.dirname(os.path.abspath(self._ticket_data_source)) == os.path.abspath(save_path):
+                ticket_data = os.path.basename(self._ticket_data_source)
+            manifest = save_bundle(save_path, self.index, self.ticket_ids, self.model_name, ticket_text_hashes, lexical_index,
+                                   ef=self.hnsw_ef, ticket_data=ticket_data)
+            if isinstance(self.ticket_store, SqliteTicketStore):
+                # Lets processes loading this version use the database instead of re-reading the data file
+                self.ticket_store.record_version(manifest['version'])
+            # Later saves append to this version
+            self.index_manifest = manifest
+            self._bundle_path = save_path
+        self._unsaved_embeddings = {}
+        self._unsaved_deletions = {}
+        self._logged_updates = 0
         print(f"Index saved to {save_path}")
     
+    def _save_index_updates(self, save_path):
+        """
+        Save the index changes made since the last save: append the changed embeddings and deletions
+        to the update log of the bundle version saved or loaded last, or write a new checkpoint when
+        there is none to append to, or when the log has grown to CHECKPOINT_FRACTION of the index.
+        """
+        manifest = self.index_manifest
+        can_append = (
+            manifest is not None and 'version' in manifest and TEXT_HASHES_FILE in manifest['checksums']
+            and self._bundle_path is not None and os.path.abspath(self._bundle_path) == os.path.abspath(save_path)
+            # Another process may have saved a version since
+            and bundle_version_path(save_path) == bundle_version_path(save_path, manifest)
+            and manifest['backend'] == getattr(self.index, 'backend', 'hnsw') and manifest['ef'] == self.hnsw_ef
+            and self._logged_updates + len(self._unsaved_embeddings) <= CHECKPOINT_FRACTION * self.index.get_current_count()
+        )
+        if not can_append:
+            self.save_index(save_path)
+            return
+        if not self._unsaved_embeddings and not self._unsaved_deletions:
+            return
+        
+        labels = sorted(self._unsaved_embeddings)
+        tickets = self.ticket_store.to_dataframe(labels)
+        embeddings = np.array([self._unsaved_embeddings[label] for label in labels], dtype=np.float32).reshape(len(labels), self.dim)
+        # Adding an embedding undeletes its label, so only the state after that is logged
+        was_deleted = {label: deleted and label not in self._unsaved_embeddings for label, deleted in self._unsaved_deletions.items()}
+        deleted = sorted(label for label, before in was_deleted.items() if not before and label in self.deleted_labels)
+        revived = sorted(label for label, before in was_deleted.items() if before and label not in self.deleted_labels)
+        append_bundle_updates(save_path, manifest, labels, tickets['Ticket ID'].tolist(), embeddings,
+                              text_hashes(build_ticket_strings(tickets)), deleted, revived)
+        self._logged_updates += len(labels)
+        self._unsaved_embeddings = {}
+        self._unsaved_deletions = {}
+        print(f"Index updates saved to {save_path}")
+    
     def load_index(self, load_path):
-        """Load the index from disk"""
-        self.index = hnswlib.Index(space='cosine', dim=self.dim)
-        self.index.load_index(load_path)
-        self.index.set_ef(50)  # Set ef for search
+        """Load the index from disk, either an index bundle directory or a legacy bare index"""
+        if os.path.isdir(load_path):
+            # The bundle is verified before anything is replaced
+            index, ticket_ids, manifest = load_bundle(load_path, self.model_name, self._dim)
+            self.index_manifest = manifest
+            self._bundle_path = load_path
+            # The ticket store follows the label map of the new index
+            data_path = bundle_ticket_data_path(load_path, manifest) or self._ticket_data_source or self.resolved_tickets_data_path
+            self.load_resolved_tickets_data(data_path, ticket_ids)
+            self.index = index
+            self._dim = manifest['dim']
+            self.hnsw_ef = manifest['ef']
+        else:
+            self.index = self._load_bare_index(load_path)
+            self.index_manifest = None
+        self._lexical_index = None  # loaded again for the new index on first use
+        self._unsaved_embeddings = {}
+        self._unsaved_deletions = {}
+        self._logged_updates = self._count_logged_updates()
         print(f"Index loaded from {load_path}")
     
-    def load_resolved_tickets_data(self, resolved_tickets_data_path):
-        """Load the resolved tickets DataFrame from disk"""
-        self.resolved_tickets_data = pd.read_csv(resolved_tickets_data_path)
-        self.ticket_ids = self.resolved_tickets_data['Ticket ID'].tolist()
+    def _count_logged_updates(self):
+        """Number of embeddings in the update log of the loaded bundle version"""
+        if self.index_manifest is None:
+            return 0
+        return sum(len(entry['labels']) for entry in read_bundle_updates(self._bundle_path, self.index_manifest))
+    
+    def _load_bare_index(self, load_path):
+        """Load a legacy bare hnswlib index file"""
+        index = hnswlib.Index(space='cosine', dim=self.dim)
+        index.load_index(load_path)
+        index.set_ef(self.hnsw_ef)  # Set ef for search
+        return index
+    
+    def load_resolved_tickets_data(self, resolved_tickets_data_path, ticket_ids=None):
+        """
+        Load the resolved tickets from disk into the compact ticket store.
+        
+        With the label map (ticket_ids) of an index bundle, rows are matched to labels through it
+        (so the CSV row order does not matter) and the ticket text is checked against the text
+        the index entries were embedded from. With a metadata database that has the generation the bundle
+        version was saved with, that generation is used and the data file is not read.
+        """
+        if self.metadata_db_path and self.index_manifest is not None:
+            ticket_store = SqliteTicketStore.open_version(self.metadata_db_path, self.index_manifest['version'], len(ticket_ids)) \
+                if 'version' in self.index_manifest else None
+            if ticket_store is not None:
+                self._set_ticket_store(ticket_store, ticket_store.deleted_labels())
+                self._ticket_data_source = resolved_tickets_data_path
+                print(f"Resolved tickets data loaded from {self.metadata_db_path}")
+                return
+        
+        df = read_ticket_data(resolved_tickets_data_path)
+        if ticket_ids is not None:
+            df = self._ticket_data_in_label_order(df, ticket_ids, resolved_tickets_data_path)
+            if not self._ticket_text_matches(df):
+                raise ValueError(f"Ticket text in {resolved_tickets_data_path} changed since the index was built, rebuild the index")
+        self._set_ticket_data(df)
+        if self.metadata_db_path and self.index_manifest is not None and 'version' in self.index_manifest:
+            self.ticket_store.record_version(self.index_manifest['version'])
+        self._ticket_data_source = resolved_tickets_data_path
         print(f"Resolved tickets data loaded from {resolved_tickets_data_path}")
     
-    def find_similar_tickets(self, issue, category, description, k=3, similarity_threshold=0.5):
+    def _ticket_data_in_label_order(self, df, ticket_ids, source):
+        """Reorder ticket data read from source to the label order of ticket_ids"""
+        if df['Ticket ID'].tolist() == ticket_ids:
+            return df.reset_index(drop=True)
+        df = df.drop_duplicates('Ticket ID')
+        positions = pd.Index(df['Ticket ID']).get_indexer(ticket_ids)
+        if (positions < 0).any():
+            missing = [ticket_id for ticket_id, position in zip(ticket_ids, positions) if position < 0]
+            raise ValueError(f"{len(missing)} indexed tickets are missing from {source}, e.g. {missing[:5]}")
+        return df.iloc[positions].reset_index(drop=True)
+    
+    def read_ticket_data_in_label_order(self):
+        """
+        Read the full ticket rows, all columns, from the data file and its journal, in label order.
+        
+        Searches and updates only use the compact ticket_store; this reads the whole data file
+        on every call, e.g. for compaction to write the remaining tickets back.
+        
+        Returns:
+            pd.DataFrame: One row per index label, or None before any ticket data was loaded.
+        """
+        if self._ticket_data_source is None:
+            return None
+        return self._ticket_data_in_label_order(read_ticket_data(self._ticket_data_source), self.ticket_ids, self._ticket_data_source)
+    
+    def _ticket_text_matches(self, df):
+        """Whether ticket data in label order has the text the loaded bundle's entries were embedded from"""
+        hashes = read_bundle_text_hashes(self._bundle_path, self.index_manifest)
+        strings = build_ticket_strings(df)
+        if hashes is None:
+            # Bundles of format version 1 checksum all ticket text at once
+            return text_checksum(strings) == self.index_manifest['checksums']['ticket_text']
+        return np.array_equal(text_hashes(strings), hashes)
+    
+    def _set_ticket_data(self, df):
+        """Replace the ticket store by one built from ticket data in label order, and the label lookups derived from it"""
+        df = df.reset_index(drop=True)
+        if self.metadata_db_path:
+            ticket_store = SqliteTicketStore.from_dataframe(self.metadata_db_path, df)
+        else:
+            ticket_store = TicketStore.from_dataframe(df)
+        self._set_ticket_store(ticket_store, ticket_store.deleted_labels())
+    
+    def _set_ticket_store(self, ticket_store, deleted_labels):
+        """Replace the ticket store and the label lookups derived from it"""
+        self.ticket_store = ticket_store
+        self.deleted_labels = set(deleted_labels)
+        self._partitions = {}
+    
+    def add_tickets(self, tickets, save=True):
+        """
+        Add new tickets to the index without rebuilding it.
+        
+        Only the given tickets are encoded. Tickets whose ID is already indexed replace the
+        existing entry, and are only re-encoded when their Issue, Category or Description changed.
+        
+        Args:
+            tickets (pd.DataFrame or list): Tickets with the same columns as the ticket data CSV,
+                either as a DataFrame or a list of dicts.
+            save (bool): Persist the index and append the tickets to the data journal (after save_delay).
+        
+        Returns:
+            list: The index label of every distinct given ticket, in input order.
+        """
+        if self.index is None:
+            raise ValueError("Index has not been built yet")
+        
+        new_data = tickets if isinstance(tickets, pd.DataFrame) else pd.DataFrame(list(tickets))
+        if new_data.empty:
+            return []
+        if 'Ticket ID' not in new_data.columns:
+            raise ValueError("Tickets need a 'Ticket ID' column")
+        # IDs like TKT1000 refer to the same ticket as the canonical TCKT-1000 written by ingestion
+        new_data = new_data.assign(**{'Ticket ID': new_data['Ticket ID'].map(normalize_ticket_id)})
+        # A ticket given twice is added once, with its last version
+        new_data = new_data.drop_duplicates('Ticket ID', keep='last').reset_index(drop=True)
+        
+        with self._lock:
+            store = self.ticket_store
+            n_labels = len(store)
+            found = store.labels_for(new_data['Ticket ID'])
+            labels = np.array([found.get(ticket_id, -1) for ticket_id in new_data['Ticket ID']], dtype=np.int64)
+            updated = np.flatnonzero(labels >= 0)
+            added = np.flatnonzero(labels < 0)
+            labels[added] = np.arange(n_labels, n_labels + len(added))
+            
+            # Fields missing from an update keep their current value
+            current = store.to_dataframe(labels[updated])
+            changes = new_data.iloc[updated].reset_index(drop=True)
+            merged = current.copy()
+            for column in changes.columns:
+                values = changes[column]
+                merged[column] = values.where(values.notna(), merged[column]) if column in merged.columns else values
+            # Re-adding a deleted ticket revives its label
+            revived = [label for label in labels[updated].tolist() if label in self.deleted_labels]
+            if revived:
+                new_data.loc[np.isin(labels, revived), 'Deleted'] = False
+                merged.loc[np.isin(labels[updated], revived), 'Deleted'] = False
+            
+            # Only new tickets and tickets whose text changed are encoded
+            encode_labels = labels[added].tolist()
+            encode_strings = build_ticket_strings(new_data.iloc[added]) if len(added) else []
+            if len(updated):
+                old_text = build_ticket_strings(current)
+                new_text = build_ticket_strings(merged)
+                changed = [i for i in range(len(updated)) if old_text[i] != new_text[i]]
+                encode_labels += labels[updated[changed]].tolist()
+                encode_strings += [new_text[i] for i in changed]
+            embeddings = self.encode_tickets(encode_strings) if encode_labels else None
+            lexical_index = self.lexical_index
+            
+            # Searches never see labels the ticket store does not hold yet
+            with self._search_lock.write():
+                if len(updated):
+                    store.set_many(labels[updated], merged)
+                if len(added):
+                    store.append(new_data.iloc[added])
+                if encode_labels:
+                    self.index = self._grow_index(self.index, len(store), self.deleted_labels)
+                for label in revived:
+                    self.index.unmark_deleted(label)
+                    if lexical_index is not None:
+                        lexical_index.unmark_deleted(label)
+                    self.deleted_labels.discard(label)
+                if encode_labels:
+                    self.index.add_items(embeddings, np.asarray(encode_labels))
+                    if lexical_index is not None:
+                        lexical_index.add(encode_labels, encode_strings)
+                self._version += 1
+                if self._compaction_changes is not None:
+                    for label in labels.tolist():
+                        self._compaction_changes.setdefault(label, None)
+                    self._compaction_changes.update(zip(encode_labels, embeddings if encode_labels else []))
+            
+            if save:
+                self._unsaved_embeddings.update(zip(encode_labels, embeddings if encode_labels else []))
+                for label in revived:
+                    self._unsaved_deletions.setdefault(label, True)
+            
+            if save:
+                self._persist_changes(new_data)
+        
+        print(f"Indexed {len(added)} new and {len(updated)} updated tickets")
+        return labels.tolist()
+    
+    def update_ticket(self, ticket_id, changes, save=True):
+        """
+        Update fields of an indexed ticket, e.g. once it has been resolved.
+        
+        The ticket is only re-encoded when its Issue, Category or Description changed.
+        
+        Args:
+            ticket_id (str): ID of the ticket to update, in any format normalize_ticket_id accepts.
+            changes (dict): Column name -> new value, e.g. {'Resolved': True, 'Resolution': '...'}.
+            save (bool): Persist the index and append the change to the data journal.
+        
+        Returns:
+            int: The index label of the ticket.
+        """
+        ticket_id = normalize_ticket_id(ticket_id)
+        label = self.ticket_store.labels_for([ticket_id]).get(ticket_id)
+        if label is None or label in self.deleted_labels:
+            raise KeyError(f"Ticket {ticket_id} is not in the index")
+        ticket = dict(changes)
+        ticket['Ticket ID'] = ticket_id
+        return self.add_tickets([ticket], save=save)[0]
+    
+    def delete_tickets(self, ticket_ids, save=True):
+        """
+        Remove tickets from search results, e.g. when they were deleted or merged.
+        
+        The tickets are only marked deleted in the index, which keeps returning k live results.
+        Once deleted entries exceed tombstone_threshold of the index, a background compaction
+        rebuilds it without them.
+        
+        Args:
+            ticket_ids (list): IDs of the tickets to delete, in any format normalize_ticket_id accepts. Unknown IDs are ignored.
+            save (bool): Persist the index and append the deletions to the data journal.
+        
+        Returns:
+            int: Number of tickets deleted.
+        """
+        if self.index is None:
+            raise ValueError("Index has not been built yet")
+        
+        with self._lock:
+            lexical_index = self.lexical_index
+            found = self.ticket_store.labels_for(normalize_ticket_id(ticket_id) for ticket_id in ticket_ids)
+            deleted = {ticket_id: label for ticket_id, label in found.items() if label not in self.deleted_labels}
+            if not deleted:
+                return 0
+            labels = list(deleted.values())
+            with self._search_lock.write():
+                for label in labels:
+                    self.index.mark_deleted(label)
+                    if lexical_index is not None:
+                        lexical_index.mark_deleted(label)
+                    self.deleted_labels.add(label)
+                self.ticket_store.set_deleted(labels)
+                self._version += 1
+                if self._compaction_changes is not None:
+                    for label in labels:
+                        self._compaction_changes.setdefault(label, None)
+            
+            if save:
+                for label in labels:
+                    self._unsaved_deletions.setdefault(label, False)
+                self._persist_changes(pd.DataFrame({'Ticket ID': list(deleted), 'Deleted': True}))
+        
+        print(f"Deleted {len(labels)} tickets")
+        if len(self.deleted_labels) > self.tombstone_threshold * self.index.get_current_count():
+            self.compact(wait=False, save=save)
+        return len(labels)
+    
+    def compact(self, wait=True, save=True):
+        """
+        Rebuild the index without deleted tickets and renumber the remaining labels.
+        
+        Args:
+            wait (bool): Compact on the calling thread; otherwise start a background thread and return.
+            save (bool): Persist the compacted index, with the remaining tickets in a data file of the index bundle.
+        """
+        if wait:
+            # A background compaction would make this one return without compacting
+            thread = self._compaction_thread
+            if thread is not None and thread is not threading.current_thread():
+                thread.join()
+            self._compact(save)
+            return
+        with self._lock:
+            if self._compaction_thread is not None and self._compaction_thread.is_alive():
+                return
+            self._compaction_thread = threading.Thread(target=self._compact, args=(save,), daemon=True)
+            self._compaction_thread.start()
+    
+    def _compact(self, save):
+        """Build the compacted index off the lock, then replay the changes made meanwhile and swap it in"""
+        with self._lock:
+            if not self.deleted_labels or self._compaction_changes is not None:
+                return
+            self._compaction_changes = {}
+            old_store = self.ticket_store
+            old_index = self.index
+            live_labels = np.setdiff1d(np.arange(len(self.ticket_store)), list(self.deleted_labels))
+            embeddings = old_index.get_items(live_labels, return_type='numpy') if len(live_labels) else None
+            lexical_index = self.lexical_index.renumbered(live_labels) if self.lexical_index is not None else None
+            # A new store (or SQLite generation); other processes keep using the old one
+            ticket_store = self.ticket_store.take(live_labels)
+        
+        try:
+            # Searches keep using the old index while the new graph is built
+            index = self._create_index(len(live_labels), ef_construction=old_index.ef_construction, M=old_index.M)
+            if embeddings is not None:
+                index.add_items(embeddings, np.arange(len(live_labels)))
+            index.set_ef(self.hnsw_ef)
+        except BaseException:
+            with self._lock:
+                self._compaction_changes = None
+            raise
+        
+        with self._lock:
+            changes, self._compaction_changes = self._compaction_changes, None
+            if self.ticket_store is not old_store:
+                print("Ticket data was reloaded during compaction, discarding the compacted index")
+                return
+            index, deleted_labels = self._replay_compaction_changes(changes, live_labels, index, ticket_store, lexical_index)
+            removed = len(self.ticket_store) - len(ticket_store)
+            # Searches see either the old index and ticket store or the new ones, never a mix
+            with self._search_lock.write():
+                self.index = index
+                self._set_ticket_store(ticket_store, deleted_labels)
+                self._lexical_index = lexical_index
+                self._version += 1
+            # Labels were renumbered, so the next save has to be a checkpoint
+            self.index_manifest = None
+            self._unsaved_embeddings = {}
+            self._unsaved_deletions = {}
+            if save:
+                self._persist_compaction()
+        print(f"Compacted index, removed {removed} deleted tickets")
+    
+    def _replay_compaction_changes(self, changes, live_labels, index, ticket_store, lexical_index):
+        """
+        Apply the ticket changes made while compacting (changes: old label -> new embedding or None)
+        to the compacted index, ticket store and BM25 index built from live_labels.
+        
+        Tickets live at the snapshot keep their new label, tickets added or revived since are
+        appended, and tickets deleted since stay marked deleted until the next compaction.
+        
+        Returns:
+            tuple: (index, possibly grown, new labels of deleted tickets)
+        """
+        if not changes:
+            return index, []
+        new_labels = dict(zip(live_labels.tolist(), range(len(live_labels))))
+        changed = sorted(changes)
+        appended = [label for label in changed if label not in new_labels and label not in self.deleted_labels]
+        new_labels.update(zip(appended, range(len(live_labels), len(live_labels) + len(appended))))
+        kept = [label for label in changed if label in new_labels]
+        replaced = [label for label in kept if new_labels[label] < len(live_labels)]
+        
+        # Current rows; to_dataframe has no Deleted column, so they are stored as live
+        if replaced:
+            ticket_store.set_many([new_labels[label] for label in replaced], self.ticket_store.to_dataframe(replaced))
+        if appended:
+            ticket_store.append(self.ticket_store.to_dataframe(appended))
+        deleted_labels = [new_labels[label] for label in kept if label in self.deleted_labels]
+        if deleted_labels:
+            ticket_store.set_deleted(deleted_labels)
+        
+        # Vectors of re-encoded tickets, and of revived ones, which are live in the old index
+        vector_labels = [label for label in kept if changes[label] is not None or new_labels[label] >= len(live_labels)]
+        if vector_labels:
+            index = self._grow_index(index, len(ticket_store), deleted_labels)
+            from_old = [label for label in vector_labels if changes[label] is None]
+            vectors = dict(zip(from_old, self.index.get_items(from_old, return_type='numpy'))) if from_old else {}
+            index.add_items(np.stack([changes[label] if changes[label] is not None else vectors[label] for label in vector_labels]),
+                            np.asarray([new_labels[label] for label in vector_labels]))
+        for label in deleted_labels:
+            index.mark_deleted(label)
+        if lexical_index is not None:
+            lexical_index.add([new_labels[label] for label in kept], build_ticket_strings(self.ticket_store.to_dataframe(kept)))
+            for label in deleted_labels:
+                lexical_index.mark_deleted(label)
+        return index, deleted_labels
+    
+    def _persist_changes(self, rows):
+        """
+        Queue the given ticket rows (the changed fields of each ticket) for the journal, to be saved
+        together with the index by flush() once save_delay has passed.
+        """
+        self._unsaved_rows.append(rows)
+        if not self.save_delay:
+            self.flush()
+        elif self._save_timer is None:
+            # Not a daemon, so pending updates are still saved when the interpreter exits
+            self._save_timer = threading.Timer(self.save_delay, self.flush)
+            self._save_timer.start()
+    
+    def flush(self):
+        """Save the index and journal the updates made since the last save now instead of after save_delay"""
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            if self._unsaved_rows:
+                self._save_index_updates(self.index_path or "ticket_index")
+                self._write_journal()
+    
+    def _write_journal(self):
+        """Append the queued ticket rows to the journal next to the data file the tickets were loaded from"""
+        rows = pd.concat(self._unsaved_rows, ignore_index=True)
+        self._unsaved_rows = []
+        journal_path = ticket_journal_path(self._ticket_data_source or self.resolved_tickets_data_path)
+        if not os.path.exists(journal_path):
+            rows.to_csv(journal_path, index=False)
+            return
+        journal_columns = pd.read_csv(journal_path, nrows=0).columns
+        if rows.columns.difference(journal_columns).empty:
+            # Keep the journal's column order so appended rows line up
+            rows.reindex(columns=journal_columns).to_csv(journal_path, mode='a', header=False, index=False)
+        else:
+            # A new column (e.g. Deleted) needs the header rewritten; atomically, so readers never see a partial journal
+            write_ticket_table(pd.concat([pd.read_csv(journal_path), rows], ignore_index=True), journal_path)
+    
+    def _persist_compaction(self):
+        """
+        Write the remaining tickets to a data file of the index bundle and save the compacted index with it.
+        
+        The data file given to the constructor is left as it is; bundle versions saved from now
+        on name the new file in their manifest, and loading them reads it instead.
+        """
+        # The compacted index saved here includes the queued updates, so only their journal rows are still needed
+        if self._save_timer is not None:
+            self._save_timer.cancel()
+            self._save_timer = None
+        if self._unsaved_rows:
+            self._write_journal()
+        
+        # The full rows of the remaining tickets, from the data file and journal in the new label order
+        data = self.read_ticket_data_in_label_order().drop(columns='Deleted', errors='ignore')
+        if self.deleted_labels:
+            # Tickets deleted while compacting stay in the data until the next compaction
+            data['Deleted'] = np.isin(np.arange(len(data)), list(self.deleted_labels))
+        save_path = self.index_path or "ticket_index"
+        extension = '.parquet' if self._ticket_data_source.lower().endswith('.parquet') else '.csv'
+        if save_path.endswith('.bin'):
+            # A bare index has no bundle directory, nor a manifest to name its data file
+            data_path = os.path.splitext(save_path)[0] + '.tickets' + extension
+            print(f"Compacted ticket data written to {data_path}, load {save_path} with it")
+        else:
+            os.makedirs(save_path, exist_ok=True)
+            data_path = os.path.join(save_path, f"{TICKET_DATA_PREFIX}{time.time_ns()}{extension}")
+        write_ticket_table(data, data_path)
+        journal_path = ticket_journal_path(data_path)
+        if os.path.exists(journal_path):
+            os.remove(journal_path)
+        self._ticket_data_source = data_path
+        self.save_index(save_path)
+    
+    def _live_count(self):
+        """Number of searchable (not deleted) tickets in the index"""
+        return self.index.get_current_count() - len(self.deleted_labels)
+    
+    def find_similar_tickets(self, issue, category, description, k=3, similarity_threshold=0.5, category_filter=None, resolved_first=False):
         """
         Find similar tickets to a query ticket
         
@@ -127,50 +1123,372 @@ class TicketMatchingSystem:
             description (str): Ticket description
             k (int): Number of nearest neighbors to retrieve
             similarity_threshold (float): Minimum similarity score threshold (default: 0.5)
+            category_filter (str or list, optional): Only return tickets of this category (or these categories)
+            resolved_first (bool): Search resolved tickets first and only fill the remaining places with unresolved
+                ones, so k is not used up by unresolved duplicates
         """
         if self.index is None:
             raise ValueError("Index has not been built yet")
-        if self.resolved_tickets_data is None:
+        if self.ticket_store is None:
             raise ValueError("Resolved tickets data has not been loaded yet")
         
         # Create ticket string and generate embedding
         query_string = self.create_ticket_string(issue, category, description)
-        query_embedding = self.generate_embeddings(query_string)
+        query_embedding = self.encode_queries([query_string])[0]
         
-        # Search for similar tickets
-        labels, distances = self.index.knn_query(query_embedding.reshape(1, -1), k=k)
+        with self._reading():
+            if resolved_first:
+                return self._search_resolved_first(
+                    query_embedding.reshape(1, -1), k, similarity_threshold, category_filter=category_filter, query_strings=[query_string],
+                )[0]
+            
+            # Search for similar tickets, never asking for more than the live tickets
+            labels, distances = self._search(
+                query_embedding.reshape(1, -1), k, category_filter=category_filter, query_strings=[query_string],
+                similarity_threshold=similarity_threshold,
+            )
+            
+            return self._prepare_results(labels[0], distances[0], similarity_threshold, fused=self.hybrid_search)
+    
+    def find_similar_tickets_batch(self, tickets, k=3, similarity_threshold=0.5, num_threads=-1, category_filter=None, resolved_first=False):
+        """
+        Find similar tickets for many query tickets at once
         
-        # Prepare results
-        results = []
-        for idx, dist in zip(labels[0], distances[0]):
-            similarity_score = 1 - dist
+        All queries are encoded in one batched call and searched with a single multi-threaded
+        knn_query over the whole embedding matrix.
+        
+        Args:
+            tickets (pd.DataFrame or list): Query tickets with Issue, Category and Description fields,
+                either as a DataFrame (e.g. data/new_tickets.csv) or a list of dicts.
+            k (int): Number of nearest neighbors to retrieve per ticket
+            similarity_threshold (float): Minimum similarity score threshold (default: 0.5)
+            num_threads (int): Number of search threads, -1 uses all cores
+            category_filter (str or list, optional): Only return tickets of this category (or these categories)
+            resolved_first (bool): Search resolved tickets first, see find_similar_tickets
+        
+        Returns:
+            list: One list of results per query ticket, in input order, shaped like find_similar_tickets results.
+        """
+        if self.index is None:
+            raise ValueError("Index has not been built yet")
+        if self.ticket_store is None:
+            raise ValueError("Resolved tickets data has not been loaded yet")
+        
+        queries = tickets if isinstance(tickets, pd.DataFrame) else pd.DataFrame(list(tickets))
+        if queries.empty:
+            return []
+        
+        # Create ticket strings and generate all embeddings in one call
+        query_strings = build_ticket_strings(queries)
+        query_embeddings = self.encode_queries(query_strings)
+        
+        with self._reading():
+            if resolved_first:
+                return self._search_resolved_first(query_embeddings, k, similarity_threshold, num_threads, category_filter, query_strings)
             
-            # Only include results above similarity threshold
-            if similarity_score >= similarity_threshold:
-                ticket_id = self.ticket_ids[idx]
-                
-                # Get relevant info from original dataframe
-                ticket_row = self.resolved_tickets_data[self.resolved_tickets_data['Ticket ID'] == ticket_id].iloc[0]
-                
-                results.append({
-                    'ticket_id': ticket_id,
-                    'similarity_score': similarity_score,
-                    'issue': ticket_row.get('Issue', ''),
-                    'category': ticket_row.get('Category', ''),
-                    'description': ticket_row.get('Description', ''),
-                    'resolved': ticket_row.get('Resolved', False),
-                    'resolution': ticket_row.get('Resolution', ''),
-                })
-        
-        # Sort by 'resolved' status (True first) and then by similarity score
-        results.sort(key=lambda x: (-int(x['resolved']), -x['similarity_score']))
+            # Search for similar tickets of all queries at once
+            labels, distances = self._search(
+                query_embeddings, k, num_threads, category_filter, query_strings=query_strings, similarity_threshold=similarity_threshold,
+            )
+            
+            return [
+                self._prepare_results(query_labels, query_distances, similarity_threshold, fused=self.hybrid_search)
+                for query_labels, query_distances in zip(labels, distances)
+            ]
+    
+    def find_tickets_above_threshold(self, issue, category, description, similarity_threshold=0.8,
+                                     max_results=RANGE_SEARCH_MAX_RESULTS, category_filter=None):
+        """
+        Find all tickets at least similarity_threshold similar to a query ticket (range search)
+        
+        Args:
+            issue (str): Issue title
+            category (str): Ticket category
+            description (str): Ticket description
+            similarity_threshold (float): Minimum similarity score (default: 0.8)
+            max_results (int): Return at most this many tickets
+            category_filter (str or list, optional): Only return tickets of this category (or these categories)
+        
+        Returns:
+            list: Results shaped like find_similar_tickets results, most similar first.
+        """
+        return self.find_tickets_above_threshold_batch(
+            [{'Issue': issue, 'Category': category, 'Description': description}],
+            similarity_threshold, max_results, category_filter=category_filter,
+        )[0]
+    
+    def find_tickets_above_threshold_batch(self, tickets, similarity_threshold=0.8, max_results=RANGE_SEARCH_MAX_RESULTS,
+                                           num_threads=-1, category_filter=None):
+        """
+        Find all tickets at least similarity_threshold similar to each of many query tickets,
+        e.g. to detect duplicates.
+        
+        Every query starts with RANGE_SEARCH_INITIAL_K neighbours; queries whose farthest neighbour
+        still clears the threshold are searched again with twice as many, until one falls below the
+        threshold, max_results is reached or no tickets are left.
+        
+        Args:
+            tickets (pd.DataFrame or list): Query tickets, see find_similar_tickets_batch.
+            similarity_threshold (float): Minimum similarity score (default: 0.8)
+            max_results (int): Return at most this many tickets per query
+            num_threads (int): Number of search threads, -1 uses all cores
+            category_filter (str or list, optional): Only return tickets of this category (or these categories)
+        
+        Returns:
+            list: One list of results per query ticket, in input order, most similar first.
+        """
+        if self.index is None:
+            raise ValueError("Index has not been built yet")
+        if self.ticket_store is None:
+            raise ValueError("Resolved tickets data has not been loaded yet")
+        
+        queries = tickets if isinstance(tickets, pd.DataFrame) else pd.DataFrame(list(tickets))
+        if queries.empty:
+            return []
+        query_embeddings = self.encode_queries(build_ticket_strings(queries))
+        
+        with self._reading():
+            neighbours = [None] * len(query_embeddings)
+            pending = np.arange(len(query_embeddings))
+            k = min(RANGE_SEARCH_INITIAL_K, max_results)
+            while len(pending):
+                labels, distances = self._search(query_embeddings[pending], k, num_threads, category_filter)
+                # Fewer than k neighbours means every candidate was returned
+                exhausted = labels.shape[1] < k or k >= max_results
+                for i, query_labels, query_distances in zip(pending, labels, distances):
+                    neighbours[i] = (query_labels, query_distances)
+                if exhausted:
+                    break
+                pending = pending[1 - distances[:, -1] >= similarity_threshold]
+                k = min(2 * k, max_results)
+            
+            results = [self._prepare_results(query_labels, query_distances, similarity_threshold) for query_labels, query_distances in neighbours]
+        
+        capped = sum(len(query_labels) == max_results and 1 - query_distances[-1] >= similarity_threshold
+                     for query_labels, query_distances in neighbours)
+        if capped:
+            print(f"{capped} queries reached max_results={max_results} tickets above the threshold, there may be more")
+        
+        for query_results in results:
+            query_results.sort(key=lambda x: -x['similarity_score'])
+        return results
+    
+    def _reading(self):
+        """
+        The search lock held shared, so a search sees one consistent index and ticket store even
+        while compaction swaps them or tickets are added.
+        """
+        # The BM25 index loads under the update lock, which writers hold while waiting for the search lock
+        if self.hybrid_search and self.lexical_index is None:
+            raise ValueError("BM25 index could not be loaded without ticket data")
+        return self._search_lock.read()
+    
+    def _search_resolved_first(self, query_embeddings, k, similarity_threshold, num_threads=-1, category_filter=None, query_strings=None):
+        """
+        Results of every query among resolved tickets, topped up from the unresolved tickets only
+        for queries with fewer than k resolved tickets above the threshold.
+        """
+        fused = query_strings is not None and self.hybrid_search
+        labels, distances = self._search(
+            query_embeddings, k, num_threads, category_filter, resolved=True, query_strings=query_strings,
+            similarity_threshold=similarity_threshold,
+        )
+        results = [self._prepare_results(query_labels, query_distances, similarity_threshold, fused) for query_labels, query_distances in zip(labels, distances)]
+        short = [i for i, query_results in enumerate(results) if len(query_results) < k]
+        if short:
+            short_strings = [query_strings[i] for i in short] if query_strings is not None else None
+            labels, distances = self._search(
+                query_embeddings[short], k, num_threads, category_filter, resolved=False, query_strings=short_strings,
+                similarity_threshold=similarity_threshold,
+            )
+            for i, query_labels, query_distances in zip(short, labels, distances):
+                results[i] += self._prepare_results(query_labels, query_distances, similarity_threshold, fused)[:k - len(results[i])]
+        return results
+    
+    def _search(self, query_embeddings, k, num_threads=-1, category_filter=None, resolved=None, query_strings=None, similarity_threshold=None):
+        """
+        The k nearest live tickets of every query, optionally only among some categories or resolution status.
+        
+        Given the query strings, hybrid search fuses the dense neighbours with BM25 matches, keeping
+        the k best fused tickets that clear similarity_threshold.
+        """
+        if query_strings is not None and self.hybrid_search:
+            return self._hybrid_search(query_embeddings, query_strings, k, num_threads, category_filter, resolved, similarity_threshold)
+        filters = self._search_filters(category_filter, resolved)
+        if not filters:
+            k = min(k, self._live_count())
+            if k <= 0:
+                return np.empty((len(query_embeddings), 0), dtype=np.uint64), np.empty((len(query_embeddings), 0), dtype=np.float32)
+            return self._knn_query(query_embeddings, k, num_threads)
+        labels, allowed = self._partition(filters)
+        return self._knn_query_among(query_embeddings, k, labels, allowed, num_threads)
+    
+    def _search_filters(self, category_filter=None, resolved=None):
+        """Field -> allowed values of a filtered search, empty for an unfiltered one"""
+        filters = {}
+        if category_filter is not None:
+            filters['category'] = (category_filter,) if isinstance(category_filter, str) else tuple(category_filter)
+        if resolved is not None:
+            filters['resolved'] = (resolved,)
+        return filters
+    
+    def _hybrid_search(self, query_embeddings, query_strings, k, num_threads=-1, category_filter=None, resolved=None, similarity_threshold=None):
+        """
+        The k best live tickets of every query by reciprocal rank fusion of the dense and BM25 rankings.
+        
+        Candidates below similarity_threshold (dense similarity) are dropped before the top k are
+        taken, so hybrid search returns as many tickets above the threshold as dense search.
+        
+        Returns:
+            tuple: Per query, the fused labels (best first) and their cosine distances to the query.
+        """
+        n_candidates = max(k, HYBRID_CANDIDATES)
+        dense_labels, dense_distances = self._search(query_embeddings, n_candidates, num_threads, category_filter, resolved)
+        filters = self._search_filters(category_filter, resolved)
+        among = self._partition(filters)[0] if filters else None
+        
+        labels, distances = [], []
+        for query_embedding, query_string, query_labels, query_distances in zip(query_embeddings, query_strings, dense_labels, dense_distances):
+            lexical_labels, _ = self.lexical_index.search(query_string, n_candidates, among)
+            fused = {}
+            for ranking in (query_labels.tolist(), lexical_labels.tolist()):
+                for rank, label in enumerate(ranking):
+                    fused[label] = fused.get(label, 0.0) + 1 / (RRF_K + rank + 1)
+            ranked = sorted(fused, key=fused.get, reverse=True)
+            
+            # Tickets only BM25 found get their dense similarity from the stored (normalised) vectors
+            known = dict(zip(query_labels.tolist(), query_distances.tolist()))
+            missing = [label for label in ranked if label not in known]
+            if missing:
+                query = query_embedding / max(np.linalg.norm(query_embedding), 1e-12)
+                similarities = self.index.get_items(missing, return_type='numpy') @ query
+                known.update(zip(missing, (1 - similarities).tolist()))
+            if similarity_threshold is not None:
+                ranked = [label for label in ranked if 1 - known[label] >= similarity_threshold]
+            top = ranked[:k]
+            labels.append(np.asarray(top, dtype=np.uint64))
+            distances.append(np.asarray([known[label] for label in top], dtype=np.float32))
+        return labels, distances
+    
+    def _partition(self, filters):
+        """
+        Live labels of the tickets matching every field -> values filter, with their label set for
+        hnswlib filter callbacks, cached until the tickets change.
+        """
+        key = tuple(sorted(filters.items()))
+        cached = self._partitions.get(key)
+        if cached is None or cached[0] != self._version:
+            labels = None
+            for field, values in filters.items():
+                matching = self.ticket_store.labels_where(field, values)
+                labels = matching if labels is None else np.intersect1d(labels, matching)
+            labels = self._live(labels)
+            allowed = set(labels.tolist()) if len(labels) > FILTER_EXACT_MAX_CANDIDATES else None
+            cached = self._partitions[key] = (self._version, labels, allowed)
+        return cached[1], cached[2]
+    
+    def _live(self, labels):
+        """The labels that are not deleted"""
+        if not self.deleted_labels:
+            return labels
+        return labels[~np.isin(labels, list(self.deleted_labels))]
+    
+    def _knn_query_among(self, query_embeddings, k, labels, allowed=None, num_threads=-1):
+        """
+        The k nearest neighbours among the given live labels, without over-fetching.
+        
+        Few candidates are scanned exactly; otherwise the graph search only admits the candidates
+        (allowed is their label set, if already built).
+        """
+        k = min(k, len(labels))
+        if k <= 0:
+            return np.empty((len(query_embeddings), 0), dtype=np.uint64), np.empty((len(query_embeddings), 0), dtype=np.float32)
+        if len(labels) <= FILTER_EXACT_MAX_CANDIDATES:
+            positions, distances = exact_knn(query_embeddings, self.index.get_items(labels, return_type='numpy'), k)
+            return labels[positions], distances
+        allowed = allowed if allowed is not None else set(labels.tolist())
+        # Python filter callbacks hold the GIL, so more search threads would only contend for it
+        return self._knn_query(query_embeddings, k, num_threads=1, filter=allowed.__contains__)
+    
+    def _knn_query(self, query_embeddings, k, num_threads=-1, filter=None):
+        """Search the index, with the ef calibrated for k and recall_target when configured"""
+        index = self.index
+        if self.recall_target is not None and self.ef_calibration is not None:
+            ef = self.ef_calibration.ef_for(k, self.recall_target)
+        else:
+            ef = self.hnsw_ef
+        # ef is index-wide in hnswlib: queries with the same ef run concurrently, a query with another
+        # ef waits for them to finish before setting its own. The configured hnsw_ef, not index.ef, is
+        # what gets saved and copied to rebuilt indexes
+        with self._ef_lock.hold((index, ef), _set_index_ef):
+            return index.knn_query(query_embeddings, k=k, num_threads=num_threads, filter=filter)
+    
+    def calibrate_ef(self, query_strings=None, n_queries=500, k_values=DEFAULT_K_VALUES, ef_values=DEFAULT_EF_VALUES, save_path=None):
+        """
+        Measure recall@k of the HNSW index against exact search for a grid of k and ef, and use
+        the result for adaptive ef (see recall_target).
+        
+        Args:
+            query_strings (list, optional): Ticket strings to calibrate with; by default slightly perturbed
+                embeddings of n_queries indexed tickets.
+            n_queries (int): Number of sampled queries without query_strings.
+            k_values, ef_values (iterable): Grid to measure.
+            save_path (str, optional): Write the calibration table here as JSON.
+        
+        Returns:
+            EfCalibration: The measured recall table.
+        """
+        if self.index is None:
+            raise ValueError("Index has not been built yet")
+        if isinstance(self.index, ExactIndex):
+            raise ValueError("Exact search has nothing to calibrate")
+        if query_strings is not None:
+            queries = self.generate_embeddings(list(query_strings))
+        else:
+            rng = np.random.default_rng(0)
+            live_labels = np.setdiff1d(np.arange(self.index.get_current_count()), list(self.deleted_labels))
+            queries = self.index.get_items(rng.choice(live_labels, size=min(n_queries, len(live_labels)), replace=False), return_type='numpy')
+            queries = queries + 0.05 * rng.normal(size=queries.shape).astype(np.float32)
+        # Calibration sets many values of ef, so no search may run meanwhile
+        with self._ef_lock.hold((self.index, 'calibration')):
+            self.ef_calibration = calibrate_ef(self.index, queries, k_values, ef_values, self.deleted_labels)
+        if save_path:
+            self.ef_calibration.save(save_path)
+            print(f"ef calibration saved to {save_path}")
+        return self.ef_calibration
+    
+    def _prepare_results(self, labels, distances, similarity_threshold, fused=False):
+        """
+        Turn the neighbours of one query into result dicts, resolved tickets first.
+        
+        Within resolved and unresolved tickets, results are ordered by similarity score, or kept in
+        the given (reciprocal rank fusion) order for fused hybrid results.
+        """
+        # Only include results above similarity threshold
+        hits = [(idx, 1 - dist) for idx, dist in zip(labels, distances) if 1 - dist >= similarity_threshold]
+        
+        # Labels are row positions in the ticket store, so all hits are hydrated in one lookup
+        results = []
+        for ticket, (idx, similarity_score) in zip(self.ticket_store.get_many([idx for idx, _ in hits]), hits):
+            result = {
+                'ticket_id': ticket.pop('ticket_id'),
+                'similarity_score': similarity_score,
+            }
+            result.update(ticket)
+            results.append(result)
+        
+        # Sort by 'resolved' status (True first) and then by similarity score (the sort is stable for fused results)
+        if fused:
+            results.sort(key=lambda x: -int(x['resolved']))
+        else:
+            results.sort(key=lambda x: (-int(x['resolved']), -x['similarity_score']))
         
         return results
 
 def test_system_with_existing_index():
     # Initialize system with an existing index and base DataFrame
     system = TicketMatchingSystem(
-        index_path="ticket_index.bin",
+        index_path="ticket_index",
         resolved_tickets_data_path="data/combined_data.csv"
     )
 
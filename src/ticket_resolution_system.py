@@ -3,8 +3,6 @@ from typing import List, Dict, Any, Optional
 from huggingface_hub import InferenceClient
 import os
 
-from ticket_matching_system import TicketMatchingSystem
-
 HF_API_KEY = os.getenv("HUGGINGFACE_API_KEY")
 
 class TicketResolutionSystem:
@@ -128,8 +126,11 @@ class TicketResolutionSystem:
 
 # Example usage
 if __name__ == "__main__":
+    # Only needed for this example, importing it at module level would slow down every import
+    from ticket_matching_system import TicketMatchingSystem
+    
     # Initialize the TicketMatchingSystem
-    system = TicketMatchingSystem(index_path="ticket_index.bin", resolved_tickets_data_path="data/combined_data.csv")
+    system = TicketMatchingSystem(index_path="ticket_index", resolved_tickets_data_path="data/combined_data.csv")
     
     # Initialize the TicketResolutionSystem
     resolution_system = TicketResolutionSystem()
@@ -0,0 +1,579 @@
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+
+from ingestion import normalize_resolved
+
+# Result field -> source column, the value used when the column is missing, and how it is stored
+TICKET_FIELDS = {
+    'issue': ('Issue', '', 'text'),
+    'category': ('Category', '', 'category'),
+    'description': ('Description', '', 'text'),
+    'resolved': ('Resolved', False, 'bool'),
+    'resolution': ('Resolution', '', 'text'),
+}
+
+# Column type of every storage kind in SqliteTicketStore
+SQL_TYPES = {'text': 'TEXT', 'category': 'TEXT', 'bool': 'INTEGER'}
+
+
+def _append_rows(array, size, values):
+    """
+    Write values after the first size rows of array, reallocating it with doubled capacity
+    when full, so appending n rows one batch at a time costs O(n) copies overall.
+    """
+    needed = size + len(values)
+    if needed > len(array):
+        grown = np.empty(max(needed, 2 * len(array)), dtype=array.dtype)
+        grown[:size] = array[:size]
+        array = grown
+    array[size:needed] = values
+    return array
+
+
+def _encode_strings(values):
+    """UTF-8 bytes of every value, missing ones as empty strings"""
+    return [b'' if pd.isna(value) else str(value).encode('utf-8') for value in values]
+
+
+class PackedStrings:
+    """
+    Strings packed into one contiguous UTF-8 buffer with start/end offsets, instead of one
+    Python object per string.
+
+    Overwritten strings are appended to the buffer; the bytes they replace are only reclaimed
+    when the store is rebuilt, e.g. by compaction. The offset arrays keep spare capacity for
+    appended strings.
+    """
+
+    def __init__(self, buffer, starts, ends, size=None):
+        """
+        Args:
+            buffer (bytearray): UTF-8 bytes of all strings.
+            starts (np.ndarray): Start offset of every string in buffer.
+            ends (np.ndarray): End offset of every string in buffer.
+            size (int, optional): Number of strings, if the offset arrays have spare capacity.
+        """
+        self.buffer = buffer
+        self.starts = starts
+        self.ends = ends
+        self.size = len(starts) if size is None else size
+
+    @classmethod
+    def from_values(cls, values):
+        """Pack a sequence of values, missing ones as empty strings"""
+        return cls._from_encoded(_encode_strings(values))
+
+    @classmethod
+    def _from_encoded(cls, encoded):
+        lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+        ends = np.cumsum(lengths)
+        return cls(bytearray(b''.join(encoded)), ends - lengths, ends)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        return self.buffer[self.starts[i]:self.ends[i]].decode('utf-8')
+
+    def __setitem__(self, i, value):
+        encoded = b'' if pd.isna(value) else str(value).encode('utf-8')
+        self.starts[i] = len(self.buffer)
+        self.buffer += encoded
+        self.ends[i] = len(self.buffer)
+
+    def extend(self, values):
+        """Append values, missing ones as empty strings"""
+        encoded = _encode_strings(values)
+        lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+        ends = len(self.buffer) + np.cumsum(lengths)
+        self.starts = _append_rows(self.starts, self.size, ends - lengths)
+        self.ends = _append_rows(self.ends, self.size, ends)
+        self.buffer += b''.join(encoded)
+        self.size += len(encoded)
+
+    def take(self, rows):
+        """Repacked copy holding only the given rows, in order"""
+        buffer = memoryview(self.buffer)
+        return self._from_encoded([buffer[start:end] for start, end in zip(self.starts[rows], self.ends[rows])])
+
+    def values(self):
+        """All strings, in row order"""
+        return [self[i] for i in range(self.size)]
+
+class CategoryColumn:
+    """Low-cardinality strings stored as integer codes into a list of distinct values"""
+
+    def __init__(self, codes, categories, size=None):
+        """
+        Args:
+            codes (np.ndarray): Index into categories for every row.
+            categories (list): Distinct values.
+            size (int, optional): Number of rows, if codes has spare capacity.
+        """
+        self.codes = codes
+        self.categories = categories
+        self.size = len(codes) if size is None else size
+        self._codes_by_category = {category: code for code, category in enumerate(categories)}
+
+    @classmethod
+    def from_values(cls, values):
+        """Encode a sequence of values, missing ones as an empty string"""
+        codes, categories = pd.factorize(pd.Series(values, dtype=object).fillna('').astype(str))
+        return cls(codes.astype(np.int32), list(categories))
+
+    def _code(self, category):
+        """Code of a category, adding it if new"""
+        code = self._codes_by_category.get(category)
+        if code is None:
+            code = self._codes_by_category[category] = len(self.categories)
+            self.categories.append(category)
+        return code
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        return self.categories[self.codes[i]]
+
+    def __setitem__(self, i, value):
+        self.codes[i] = self._code('' if pd.isna(value) else str(value))
+
+    def extend(self, values):
+        """Append values, missing ones as an empty string"""
+        codes = np.array([self._code('' if pd.isna(value) else str(value)) for value in values], dtype=np.int32)
+        self.codes = _append_rows(self.codes, self.size, codes)
+        self.size += len(codes)
+
+    def take(self, rows):
+        """Copy holding only the given rows, in order"""
+        return CategoryColumn(self.codes[rows], list(self.categories))
+
+    def isin(self, values):
+        """Boolean mask of the rows holding any of the values"""
+        codes = [self._codes_by_category[value] for value in values if value in self._codes_by_category]
+        return np.isin(self.codes[:self.size], codes)
+
+    def used_categories(self, rows=None):
+        """Distinct values held by at least one row, or by at least one of the given rows (mask or positions)"""
+        codes = self.codes[:self.size]
+        used = np.flatnonzero(np.bincount(codes if rows is None else codes[rows], minlength=len(self.categories)))
+        return [self.categories[code] for code in used]
+
+    def values(self):
+        """All values, in row order"""
+        return [self.categories[code] for code in self.codes[:self.size]]
+
+def _make_column(kind, values):
+    """Typed storage of the values of one result field"""
+    if kind == 'bool':
+        return normalize_resolved(pd.Series(values, dtype=object)).fillna(False).to_numpy(dtype=bool)
+    if kind == 'category':
+        return CategoryColumn.from_values(values)
+    return PackedStrings.from_values(values)
+
+
+def _column_values(df, column, default):
+    """Values of a DataFrame column, or default for every row when it is missing"""
+    return df[column] if column in df.columns else [default] * len(df)
+
+
+class TicketStore:
+    """
+    Label-aligned columnar store of the ticket fields returned by searches.
+
+    Row i holds the ticket stored under hnsw label i, so hydrating a search hit is
+    plain array indexing instead of a scan over the ticket DataFrame. Only the returned
+    fields are kept, with text packed into contiguous buffers, Category as integer codes
+    and Resolved as a boolean array, plus a deleted flag per ticket. Arrays grow with
+    doubling capacity, so appending tickets does not copy the whole store every time.
+    """
+
+    def __init__(self, ticket_ids, columns, deleted=None):
+        """
+        Args:
+            ticket_ids (np.ndarray): Ticket ID per label.
+            columns (dict): Result field name -> typed column of values per label.
+            deleted (np.ndarray, optional): Deleted flag per label; none deleted by default.
+        """
+        self._ticket_ids = ticket_ids
+        self.columns = columns
+        self._deleted = deleted if deleted is not None else np.zeros(len(ticket_ids), dtype=bool)
+        self._size = len(ticket_ids)
+        self._labels_by_ticket_id = None  # built by the first labels_for call
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """Build the store from a ticket DataFrame whose row order matches the index labels"""
+        ticket_ids = df['Ticket ID'].to_numpy(dtype=object, copy=True)
+        columns = {}
+        for field, (column, default, kind) in TICKET_FIELDS.items():
+            # Tickets without a field get its default, e.g. no status counts as unresolved
+            columns[field] = _make_column(kind, _column_values(df, column, default))
+        return cls(ticket_ids, columns, _make_column('bool', _column_values(df, 'Deleted', False)))
+
+    @property
+    def ticket_ids(self):
+        """Ticket ID per label"""
+        return self._ticket_ids[:self._size]
+
+    def __len__(self):
+        return self._size
+
+    def get(self, label):
+        """Return the ticket ID and result fields stored under a label"""
+        ticket = {'ticket_id': self._ticket_ids[label]}
+        for field, values in self.columns.items():
+            ticket[field] = values[label]
+        ticket['resolved'] = bool(ticket['resolved'])
+        return ticket
+
+    def get_many(self, labels):
+        """Return the tickets stored under several labels"""
+        return [self.get(label) for label in labels]
+
+    def to_dataframe(self, labels=None):
+        """
+        The stored tickets as a DataFrame with the source column names (Ticket ID, Issue, ...).
+
+        Args:
+            labels (array-like, optional): Labels to return, in order; all tickets by default.
+        """
+        labels = np.arange(self._size) if labels is None else np.asarray(labels, dtype=np.int64)
+        data = {'Ticket ID': self._ticket_ids[labels]}
+        for field, (column, _, kind) in TICKET_FIELDS.items():
+            values = self.columns[field]
+            data[column] = values[labels] if isinstance(values, np.ndarray) else [values[label] for label in labels]
+        return pd.DataFrame(data)
+
+    def labels_for(self, ticket_ids):
+        """Ticket ID -> label of the given tickets that are stored (the first label of a repeated ID)"""
+        if self._labels_by_ticket_id is None:
+            # Built on first use, so processes that only search never hold it
+            self._labels_by_ticket_id = {}
+            for label, ticket_id in enumerate(self.ticket_ids.tolist()):
+                self._labels_by_ticket_id.setdefault(ticket_id, label)
+        labels_by_ticket_id = self._labels_by_ticket_id
+        return {ticket_id: labels_by_ticket_id[ticket_id] for ticket_id in ticket_ids if ticket_id in labels_by_ticket_id}
+
+    def _index_ticket_ids(self, labels):
+        """Add the tickets under labels to the labels_for lookup, once it is built"""
+        if self._labels_by_ticket_id is not None:
+            for label, ticket_id in zip(labels.tolist(), self._ticket_ids[labels].tolist()):
+                self._labels_by_ticket_id.setdefault(ticket_id, label)
+
+    def labels_where(self, field, values):
+        """Labels of the tickets whose category or resolved field is one of values"""
+        column = self.columns[field]
+        mask = column.isin(list(values)) if isinstance(column, CategoryColumn) else np.isin(column[:self._size], list(values))
+        return np.flatnonzero(mask)
+
+    def categories(self):
+        """Distinct non-empty categories of the live tickets, sorted"""
+        live = ~self._deleted[:self._size]
+        return sorted(category for category in self.columns['category'].used_categories(live) if category)
+
+    def deleted_labels(self):
+        """Labels of tickets marked deleted"""
+        return np.flatnonzero(self._deleted[:self._size]).tolist()
+
+    def set_many(self, labels, df):
+        """Overwrite the tickets stored under labels from the rows of a DataFrame, in order"""
+        labels = np.asarray(labels, dtype=np.int64)
+        self._ticket_ids[labels] = df['Ticket ID'].to_numpy(dtype=object)
+        for field, (column, default, kind) in TICKET_FIELDS.items():
+            values = _column_values(df, column, default)
+            if kind == 'bool':
+                self.columns[field][labels] = _make_column(kind, values)
+            else:
+                for label, value in zip(labels, values):
+                    self.columns[field][label] = value
+        self._deleted[labels] = _make_column('bool', _column_values(df, 'Deleted', False))
+        self._index_ticket_ids(labels)
+
+    def set_deleted(self, labels, deleted=True):
+        """Mark the tickets under labels deleted (or live again)"""
+        self._deleted[np.asarray(labels, dtype=np.int64)] = deleted
+
+    def append(self, df):
+        """Append tickets from a DataFrame; they take the next labels in row order"""
+        for field, (column, default, kind) in TICKET_FIELDS.items():
+            values = _column_values(df, column, default)
+            if kind == 'bool':
+                self.columns[field] = _append_rows(self.columns[field], self._size, _make_column(kind, values))
+            else:
+                self.columns[field].extend(values)
+        self._deleted = _append_rows(self._deleted, self._size, _make_column('bool', _column_values(df, 'Deleted', False)))
+        self._ticket_ids = _append_rows(self._ticket_ids, self._size, df['Ticket ID'].to_numpy(dtype=object))
+        self._size += len(df)
+        self._index_ticket_ids(np.arange(self._size - len(df), self._size))
+
+    def take(self, labels):
+        """
+        New store holding only the tickets under labels, renumbered to their positions,
+        e.g. after compaction. Text buffers are repacked without overwritten strings.
+        """
+        labels = np.asarray(labels, dtype=np.int64)
+        columns = {
+            field: values[labels] if isinstance(values, np.ndarray) else values.take(labels)
+            for field, values in self.columns.items()
+        }
+        return TicketStore(self._ticket_ids[labels], columns, self._deleted[labels])
+
+
+class SqliteTicketStore:
+    """
+    Label-aligned ticket store in an SQLite database, shared on disk by worker processes.
+
+    The database runs in WAL mode, so readers in other processes are not blocked by the
+    writer. Rows are keyed by (generation, index label): every rebuild of the label map, from
+    ticket data or by compaction, writes a new generation instead of renumbering rows other
+    processes still hydrate their search hits from. Updates and appended tickets are written
+    in place within a generation. The bundle versions table records the generation each saved
+    index bundle version belongs to, so processes loading a bundle skip reading the data file.
+    Updates should come from a single process; the others only read.
+
+    A store only sees the labels below its size, so rows appended by another process, which
+    its index does not hold, never show up in its searches.
+    """
+
+    # SQLite limits the number of parameters of one statement
+    QUERY_BATCH_SIZE = 500
+
+    # Generations of saved bundle versions kept in the database, so processes still on the
+    # previous one keep working
+    KEEP_GENERATIONS = 2
+
+    def __init__(self, path, generation=None, size=0):
+        """
+        Args:
+            path (str): Database file; created if missing.
+            generation (int, optional): Generation of rows to use; a new, empty one by default.
+            size (int): Number of labels of the generation this store sees.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._connection as connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            columns = [row[1] for row in connection.execute('PRAGMA table_info(tickets)')]
+            if columns and 'generation' not in columns:
+                # Database of a single unversioned label set, which no bundle version refers to
+                connection.execute('DROP TABLE tickets')
+                connection.execute('DROP TABLE IF EXISTS meta')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS tickets (generation INTEGER NOT NULL, label INTEGER NOT NULL, ticket_id NOT NULL, '
+                + ', '.join(f'{field} {SQL_TYPES[kind]}' for field, (_, _, kind) in TICKET_FIELDS.items())
+                + ', deleted INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (generation, label))'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS tickets_ticket_id ON tickets (generation, ticket_id)')
+            connection.execute('CREATE INDEX IF NOT EXISTS tickets_category ON tickets (generation, category)')
+            connection.execute('CREATE TABLE IF NOT EXISTS generations (generation INTEGER PRIMARY KEY)')
+            connection.execute('CREATE TABLE IF NOT EXISTS bundle_versions (version TEXT PRIMARY KEY, generation INTEGER NOT NULL)')
+            if generation is None:
+                generation = connection.execute('INSERT INTO generations DEFAULT VALUES').lastrowid
+        self.generation = generation
+        self._size = size
+
+    @classmethod
+    def from_dataframe(cls, path, df):
+        """Store a ticket DataFrame in label order as a new generation of the database at path"""
+        store = cls(path)
+        store.append(df)
+        return store
+
+    @classmethod
+    def open_version(cls, path, version, size):
+        """
+        The store of the generation an index bundle version was saved with.
+
+        Args:
+            path (str): Database file.
+            version (str): Version from the bundle manifest.
+            size (int): Number of labels of the bundle version.
+
+        Returns:
+            SqliteTicketStore: The store, or None if the database has no complete generation for the version.
+        """
+        store = cls(path, generation=-1)  # bound to the version's generation once found
+        with store._lock:
+            row = store._connection.execute('SELECT generation FROM bundle_versions WHERE version = ?', (version,)).fetchone()
+            if row is None:
+                return None
+            count = store._connection.execute(
+                'SELECT COUNT(*) FROM tickets WHERE generation = ? AND label < ?', (row[0], size)
+            ).fetchone()[0]
+        if count != size:
+            return None
+        store.generation, store._size = row[0], size
+        return store
+
+    def record_version(self, version):
+        """Record that an index bundle version was saved from this store's generation"""
+        with self._lock, self._connection as connection:
+            connection.execute('INSERT OR REPLACE INTO bundle_versions (version, generation) VALUES (?, ?)', (version, self.generation))
+        self._prune()
+
+    def _prune(self):
+        """
+        Drop the generations no process should still use. Kept are the generations of the newest
+        bundle versions (KEEP_GENERATIONS distinct ones), this store's, and newer generations
+        no version was saved from yet, e.g. of a compaction in progress.
+        """
+        with self._lock, self._connection as connection:
+            kept = [row[0] for row in connection.execute(
+                'SELECT generation FROM bundle_versions GROUP BY generation ORDER BY MAX(version) DESC LIMIT ?',
+                (self.KEEP_GENERATIONS,),
+            )]
+            if not kept:
+                return
+            dropped = [row[0] for row in connection.execute('SELECT generation FROM generations WHERE generation < ?', (max(kept),))
+                       if row[0] not in kept and row[0] != self.generation]
+            for generation in dropped:
+                for table in ('tickets', 'bundle_versions', 'generations'):
+                    connection.execute(f'DELETE FROM {table} WHERE generation = ?', (generation,))
+
+    def _insert(self, connection, labels, df):
+        """Upsert the rows of a DataFrame under the given labels"""
+        ticket_ids = df['Ticket ID'].to_numpy(dtype=object)
+        columns = [ticket_ids.tolist()]
+        for field, (column, default, kind) in TICKET_FIELDS.items():
+            values = df[column] if column in df.columns else [default] * len(df)
+            if kind == 'bool':
+                columns.append(_make_column(kind, values).tolist())
+            else:
+                columns.append(['' if pd.isna(value) else str(value) for value in values])
+        deleted = df['Deleted'] if 'Deleted' in df.columns else [False] * len(df)
+        columns.append(_make_column('bool', deleted).tolist())
+        placeholders = ', '.join('?' * (len(columns) + 2))
+        connection.executemany(
+            f"INSERT OR REPLACE INTO tickets (generation, label, ticket_id, {', '.join(TICKET_FIELDS)}, deleted) VALUES ({placeholders})",
+            zip([self.generation] * len(df), labels, *columns),
+        )
+
+    def _select(self, columns, where='', values=(), order=''):
+        """Rows of this store's generation and labels"""
+        query = f"SELECT {columns} FROM tickets WHERE generation = ? AND label < ?{where}{order}"
+        with self._lock:
+            return self._connection.execute(query, (self.generation, self._size, *values)).fetchall()
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def ticket_ids(self):
+        """Ticket ID per label"""
+        return np.array([row[0] for row in self._select('ticket_id', order=' ORDER BY label')], dtype=object)
+
+    def deleted_labels(self):
+        """Labels of tickets marked deleted"""
+        return [row[0] for row in self._select('label', ' AND deleted')]
+
+    def labels_for(self, ticket_ids):
+        """Ticket ID -> label of the given tickets that are stored (the first label of a repeated ID), using the Ticket ID index"""
+        labels = {}
+        ticket_ids = list(ticket_ids)
+        for start in range(0, len(ticket_ids), self.QUERY_BATCH_SIZE):
+            batch = ticket_ids[start:start + self.QUERY_BATCH_SIZE]
+            labels.update(self._select(
+                'ticket_id, MIN(label)', f" AND ticket_id IN ({', '.join('?' * len(batch))})", batch, ' GROUP BY ticket_id'
+            ))
+        return labels
+
+    def labels_where(self, field, values):
+        """Labels of the tickets whose category or resolved field is one of values"""
+        if field not in ('category', 'resolved'):
+            raise ValueError(f"Cannot select tickets by {field}")
+        values = [bool(value) if field == 'resolved' else value for value in values]
+        rows = self._select('label', f" AND {field} IN ({', '.join('?' * len(values))})", values, ' ORDER BY label')
+        return np.array([row[0] for row in rows], dtype=np.int64)
+
+    def categories(self):
+        """Distinct non-empty categories of the live tickets, sorted"""
+        return [row[0] for row in self._select('DISTINCT category', " AND deleted = 0 AND category != ''", order=' ORDER BY category')]
+
+    def get(self, label):
+        """Return the ticket ID and result fields stored under a label"""
+        return self.get_many([label])[0]
+
+    def get_many(self, labels):
+        """Return the tickets stored under several labels, with one IN (...) query per batch"""
+        labels = [int(label) for label in labels]
+        rows = {}
+        for start in range(0, len(labels), self.QUERY_BATCH_SIZE):
+            batch = labels[start:start + self.QUERY_BATCH_SIZE]
+            for row in self._select(f"label, ticket_id, {', '.join(TICKET_FIELDS)}", f" AND label IN ({', '.join('?' * len(batch))})", batch):
+                rows[row[0]] = row[1:]
+        tickets = []
+        for label in labels:
+            if label not in rows:
+                raise KeyError(f"No ticket under label {label} in generation {self.generation} of {self.path}; "
+                               "the generation was dropped after newer ones were written, load the index again")
+            ticket_id, *values = rows[label]
+            ticket = {'ticket_id': ticket_id, **dict(zip(TICKET_FIELDS, values))}
+            ticket['resolved'] = bool(ticket['resolved'])
+            tickets.append(ticket)
+        return tickets
+
+    def to_dataframe(self, labels=None):
+        """
+        The stored tickets as a DataFrame with the source column names (Ticket ID, Issue, ...).
+
+        Args:
+            labels (array-like, optional): Labels to return, in order; all tickets by default.
+        """
+        columns = ['Ticket ID'] + [column for column, _, _ in TICKET_FIELDS.values()]
+        if labels is None:
+            df = pd.DataFrame(self._select(f"ticket_id, {', '.join(TICKET_FIELDS)}", order=' ORDER BY label'), columns=columns)
+        else:
+            tickets = self.get_many(labels)
+            df = pd.DataFrame([[ticket['ticket_id']] + [ticket[field] for field in TICKET_FIELDS] for ticket in tickets], columns=columns)
+        df['Resolved'] = df['Resolved'].astype(bool)
+        return df
+
+    def set_many(self, labels, df):
+        """Overwrite the tickets stored under labels from the rows of a DataFrame, in order"""
+        with self._lock, self._connection as connection:
+            self._insert(connection, [int(label) for label in labels], df)
+
+    def set_deleted(self, labels, deleted=True):
+        """Mark the tickets under labels deleted (or live again)"""
+        labels = [int(label) for label in labels]
+        with self._lock, self._connection as connection:
+            for start in range(0, len(labels), self.QUERY_BATCH_SIZE):
+                batch = labels[start:start + self.QUERY_BATCH_SIZE]
+                connection.execute(
+                    f"UPDATE tickets SET deleted = ? WHERE generation = ? AND label IN ({', '.join('?' * len(batch))})",
+                    [int(deleted), self.generation] + batch,
+                )
+
+    def take(self, labels):
+        """
+        New store holding only the tickets under labels, renumbered to their positions, e.g. after
+        compaction. The rows are copied to a new generation; this store's generation is left as
+        it is for the processes still using it.
+        """
+        labels = [int(label) for label in labels]
+        store = SqliteTicketStore(self.path, size=len(labels))
+        with self._lock, self._connection as connection:
+            connection.execute('CREATE TEMP TABLE IF NOT EXISTS renumbering (old INTEGER PRIMARY KEY, new INTEGER NOT NULL)')
+            connection.execute('DELETE FROM renumbering')
+            connection.executemany('INSERT INTO renumbering (old, new) VALUES (?, ?)', zip(labels, range(len(labels))))
+            fields = ', '.join(TICKET_FIELDS)
+            connection.execute(
+                f"INSERT INTO tickets (generation, label, ticket_id, {fields}, deleted) "
+                f"SELECT ?, renumbering.new, ticket_id, {fields}, deleted FROM tickets "
+                f"JOIN renumbering ON tickets.label = renumbering.old WHERE tickets.generation = ?",
+                (store.generation, self.generation),
+            )
+            connection.execute('DELETE FROM renumbering')
+        return store
+
+    def append(self, df):
+        """Append tickets from a DataFrame; they take the next labels in row order"""
+        with self._lock, self._connection as connection:
+            # Replaces rows past this store's labels, left by a process that stopped before saving its index
+            self._insert(connection, range(self._size, self._size + len(df)), df)
+            self._size += len(df)
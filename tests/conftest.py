@@ -0,0 +1,96 @@
+import json
+import os
+import sys
+import zlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from ticket_matching_system import TicketMatchingSystem  # noqa: E402
+
+
+class HashingEncoder:
+    """Deterministic bag-of-words encoder standing in for a sentence transformer"""
+
+    def __init__(self, dim=64):
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in str(text).lower().split():
+                embeddings[i, zlib.crc32(word.encode()) % self.dim] += 1
+            norm = np.linalg.norm(embeddings[i])
+            if norm:
+                embeddings[i] /= norm
+            else:
+                embeddings[i, 0] = 1
+        return embeddings
+
+
+TICKETS = [
+    ('T1', 'Printer not printing', 'Hardware', 'Replaced toner', True, 'Printer shows toner error and stops printing'),
+    ('T2', 'VPN disconnects', 'Network', 'Updated VPN client', True, 'VPN drops every few minutes when working remotely'),
+    ('T3', 'Email not syncing', 'Software', 'Reconfigured account', False, 'Outlook does not sync emails on the phone'),
+    ('T4', 'Laptop overheating', 'Hardware', 'Cleaned fan', True, 'Laptop fan is loud and the laptop gets very hot'),
+    ('T5', 'Password reset', 'Account', 'Reset password', True, 'User locked out after too many password attempts'),
+    ('T6', 'Wifi slow', 'Network', 'Moved access point', False, 'Office wifi is slow in the meeting rooms'),
+]
+
+
+@pytest.fixture
+def tickets_csv(tmp_path):
+    """Small ticket CSV in a temporary directory"""
+    path = tmp_path / 'tickets.csv'
+    pd.DataFrame(TICKETS, columns=['Ticket ID', 'Issue', 'Category', 'Resolution', 'Resolved', 'Description']).to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.fixture
+def make_system(tmp_path, tickets_csv, monkeypatch):
+    """Factory of systems over tickets_csv with the hashing encoder, saving changes immediately"""
+    monkeypatch.chdir(tmp_path)
+
+    def make(**kwargs):
+        kwargs.setdefault('model', HashingEncoder())
+        kwargs.setdefault('save_delay', 0)
+        return TicketMatchingSystem(tickets_csv, **kwargs)
+
+    return make
+
+
+@pytest.fixture
+def onnx_model_dir(tmp_path):
+    """Tiny model in the layout export_onnx_model writes: word-level tokenizer and embedding lookup"""
+    onnx = pytest.importorskip('onnx')
+    pytest.importorskip('onnxruntime')
+    tokenizers = pytest.importorskip('tokenizers')
+    from onnx import TensorProto, helper, numpy_helper
+
+    model_dir = tmp_path / 'onnx_model'
+    model_dir.mkdir()
+    words = ['[PAD]', '[UNK]', 'printer', 'vpn', 'wifi', 'down', 'slow', 'not', 'printing']
+    tokenizer = tokenizers.Tokenizer(tokenizers.models.WordLevel({word: i for i, word in enumerate(words)}, unk_token='[UNK]'))
+    tokenizer.pre_tokenizer = tokenizers.pre_tokenizers.Whitespace()
+    tokenizer.save(str(model_dir / 'tokenizer.json'))
+
+    table = np.random.default_rng(0).normal(size=(len(words), 8)).astype(np.float32)
+    graph = helper.make_graph(
+        [helper.make_node('Gather', ['table', 'input_ids'], ['token_embeddings'])], 'lookup',
+        [helper.make_tensor_value_info('input_ids', TensorProto.INT64, ['batch', 'sequence'])],
+        [helper.make_tensor_value_info('token_embeddings', TensorProto.FLOAT, ['batch', 'sequence', 8])],
+        [numpy_helper.from_array(table, 'table')],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 17)])
+    model.ir_version = 8
+    onnx.save(model, str(model_dir / 'model.onnx'))
+    with open(model_dir / 'encoder_config.json', 'w') as f:
+        json.dump({'model_name': 'tiny', 'model_file': 'model.onnx', 'dim': 8, 'max_seq_length': 4,
+                   'pad_token_id': 0, 'pooling': 'mean', 'normalize': True}, f)
+    return str(model_dir)
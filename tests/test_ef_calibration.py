@@ -0,0 +1,86 @@
+import threading
+import time
+
+import pytest
+
+from ef_calibration import EfCalibration
+from read_write_lock import GroupLock
+
+CALIBRATION = EfCalibration({1: {10: 0.9, 40: 0.99}, 5: {10: 0.8, 40: 0.95, 100: 0.99}})
+
+
+def test_ef_is_the_smallest_reaching_the_recall_target():
+    assert CALIBRATION.ef_for(1, 0.95) == 40
+    assert CALIBRATION.ef_for(3, 0.95) == 40  # the next larger calibrated k
+    assert CALIBRATION.ef_for(5, 0.999) == 100  # unreachable targets get the largest ef
+    assert CALIBRATION.ef_for(10, 0.99) == 200  # scaled up beyond the largest calibrated k
+
+
+def test_group_lock_is_shared_within_a_group_only():
+    lock = GroupLock()
+    switches = []
+    active = {}
+    overlaps = []
+    guard = threading.Lock()
+
+    def hold(group):
+        with lock.hold(group, switches.append):
+            with guard:
+                active[group] = active.get(group, 0) + 1
+                overlaps.append(dict(active))
+            time.sleep(0.01)
+            with guard:
+                active[group] -= 1
+                if not active[group]:
+                    del active[group]
+
+    threads = [threading.Thread(target=hold, args=(group,)) for group in 'aabbaab' * 3]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(len(groups) == 1 for groups in overlaps)
+    assert any(count > 1 for groups in overlaps for count in groups.values())
+    assert set(switches) == {'a', 'b'}
+
+
+class EfCheckingIndex:
+    """Index wrapper failing a query whose ef changes while it runs"""
+
+    def __init__(self, index):
+        self.index = index
+        self.ef = None
+        self.errors = []
+
+    def set_ef(self, ef):
+        self.ef = ef
+        self.index.set_ef(ef)
+
+    def knn_query(self, *args, **kwargs):
+        ef = self.ef
+        time.sleep(0.005)
+        if self.ef != ef:
+            self.errors.append((ef, self.ef))
+        return self.index.knn_query(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.index, name)
+
+
+def test_concurrent_queries_keep_their_calibrated_ef(make_system):
+    pytest.importorskip('hnswlib')
+    system = make_system(index_backend='hnsw', recall_target=0.99, ef_calibration=CALIBRATION)
+    index = EfCheckingIndex(system.index)
+    system.index = index
+
+    def search(k):
+        for _ in range(5):
+            system.find_similar_tickets('Printer not printing', 'Hardware', 'toner error', k=k, similarity_threshold=0)
+
+    threads = [threading.Thread(target=search, args=(k,)) for k in (1, 5, 1, 5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not index.errors
+    assert index.ef in (40, 100)
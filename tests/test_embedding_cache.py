@@ -0,0 +1,98 @@
+import os
+
+import numpy as np
+import pytest
+
+import embedding_cache
+from embedding_cache import EmbeddingCache, QueryEmbeddingCache
+from encoders import encoder_signature
+
+TORCH = encoder_signature('model')
+ONNX = encoder_signature('model', 'onnx')
+
+
+class RecordingEncoder:
+    """encode_fn returning a distinct vector per string, recording what it was asked to encode"""
+
+    def __init__(self, offset=0.0):
+        self.offset = offset
+        self.calls = []
+
+    def __call__(self, strings):
+        self.calls.append(list(strings))
+        return np.array([[len(string) + self.offset, self.offset, 1, 0] for string in strings], dtype=np.float32)
+
+
+def test_cached_strings_are_not_encoded_again(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), TORCH, 4)
+    encode_fn = RecordingEncoder()
+    first = cache.encode(['printer', 'vpn', 'printer'], encode_fn)
+    assert len(encode_fn.calls) == 1 and sorted(encode_fn.calls[0]) == ['printer', 'vpn']
+
+    reopened = EmbeddingCache(str(tmp_path), TORCH, 4)
+    second = reopened.encode(['vpn', 'wifi', 'printer'], encode_fn)
+    assert encode_fn.calls[1:] == [['wifi']]
+    assert np.array_equal(second[[0, 2]], first[[1, 0]])
+    assert len(reopened) == 3
+
+
+def test_backends_do_not_share_embeddings(tmp_path):
+    EmbeddingCache(str(tmp_path), TORCH, 4).encode(['printer'], RecordingEncoder())
+    onnx_encoder = RecordingEncoder(offset=0.5)
+    embeddings = EmbeddingCache(str(tmp_path), ONNX, 4).encode(['printer'], onnx_encoder)
+    assert onnx_encoder.calls == [['printer']] and embeddings[0, 1] == 0.5
+
+
+def test_rows_of_an_interrupted_write_are_dropped(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), TORCH, 4)
+    cache.encode(['printer'], RecordingEncoder())
+    # A crash between writing vectors and keys leaves a vector row without a key
+    with open(cache.vectors_path, 'ab') as f:
+        np.ones(4, dtype=np.float32).tofile(f)
+
+    reopened = EmbeddingCache(str(tmp_path), TORCH, 4)
+    embeddings = reopened.encode(['vpn', 'printer'], RecordingEncoder())
+    assert os.path.getsize(cache.vectors_path) == 2 * 4 * 4
+    assert np.array_equal(EmbeddingCache(str(tmp_path), TORCH, 4).encode(['vpn', 'printer'], RecordingEncoder()), embeddings)
+
+
+def test_dimension_mismatch_is_rejected(tmp_path):
+    EmbeddingCache(str(tmp_path), TORCH, 4)
+    with pytest.raises(ValueError, match='dimension'):
+        EmbeddingCache(str(tmp_path), TORCH, 8)
+
+
+def test_query_cache_encodes_only_new_strings():
+    cache = QueryEmbeddingCache(max_size=10)
+    encode = RecordingEncoder()
+    first = cache.encode(['Printer  jam', 'VPN down'], encode)
+    again = cache.encode(['VPN down', ' Printer jam ', 'vpn down'], encode)
+    assert encode.calls == [['Printer  jam', 'VPN down'], ['vpn down']]
+    np.testing.assert_array_equal(again[:2], first[::-1])
+    assert cache.stats() == {'hits': 2, 'misses': 3, 'size': 3, 'max_size': 10}
+
+    # Cached embeddings are copies, unaffected by changes to the returned batch
+    first[:] = 0
+    assert cache.encode(['VPN down'], encode)[0, 0] == len('VPN down')
+
+
+def test_query_cache_ignores_case_only_for_uncased_models():
+    cache = QueryEmbeddingCache(lowercase=True)
+    encode = RecordingEncoder()
+    cache.encode(['VPN Down'], encode)
+    cache.encode(['vpn down'], encode)
+    assert encode.calls == [['VPN Down']]
+
+
+def test_query_cache_evicts_least_recently_used_and_expired(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(embedding_cache.time, 'monotonic', lambda: now[0])
+    cache = QueryEmbeddingCache(max_size=2, ttl_seconds=60)
+    cache.put('a', np.zeros(4))
+    cache.put('b', np.zeros(4))
+    assert cache.get('a') is not None
+    cache.put('c', np.zeros(4))
+    assert cache.get('b') is None and cache.get('a') is not None
+
+    now[0] = 61.0
+    assert cache.get('c') is None and cache.stats()['size'] == 1
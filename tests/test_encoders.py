@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+
+from encoders import encode_in_length_buckets, encoder_signature, load_encoder, plan_batches, truncate_embeddings
+
+
+def test_onnx_encoder_uses_the_given_thread_count(onnx_model_dir):
+    encoder = load_encoder('tiny', 'onnx', onnx_model_dir, num_threads=2)
+    assert encoder.session.get_session_options().intra_op_num_threads == 2
+
+
+def test_onnx_encoder_pools_and_normalizes(onnx_model_dir):
+    encoder = load_encoder('tiny', 'onnx', onnx_model_dir)
+    texts = ['printer not printing', 'vpn down', 'wifi slow today and every day']
+    embeddings = encoder.encode(texts, batch_size=2)
+    assert embeddings.shape == (3, 8) and embeddings.dtype == np.float32
+    assert np.allclose(np.linalg.norm(embeddings, axis=1), 1, atol=1e-5)
+    # Padding does not change a text's embedding
+    assert np.allclose(embeddings[1], encoder.encode(['vpn down'])[0], atol=1e-6)
+    assert encoder.token_lengths(texts).tolist() == [3, 2, 4]  # truncated to max_seq_length
+
+
+def test_load_encoder_validates_its_arguments(onnx_model_dir):
+    with pytest.raises(ValueError, match='onnx_model_dir'):
+        load_encoder('tiny', 'onnx')
+    with pytest.raises(ValueError, match='exported from tiny'):
+        load_encoder('other-model', 'onnx', onnx_model_dir)
+    with pytest.raises(ValueError, match='Unknown encoder backend'):
+        load_encoder('tiny', 'tensorflow')
+
+
+def test_system_loads_the_onnx_encoder_with_encode_threads(make_system, onnx_model_dir):
+    system = make_system(model=None, model_name='tiny', encoder_backend='onnx', onnx_model_dir=onnx_model_dir, encode_threads=1)
+    assert system.model.session.get_session_options().intra_op_num_threads == 1
+    assert system.dim == 8 and system.index.get_current_count() == 6
+
+
+class CountingEncoder:
+    """encode_fn embedding each text by its length, failing after fail_after batches"""
+
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+        self.encoded = []
+
+    def __call__(self, texts, batch_size=32):
+        if self.fail_after is not None and len(self.encoded) >= self.fail_after:
+            raise RuntimeError("interrupted")
+        self.encoded.append(list(texts))
+        return np.array([[len(text), 1] for text in texts], dtype=np.float32)
+
+
+TEXTS = ['a' * length for length in (5, 40, 1, 22, 9, 40, 3, 17)]
+
+
+def test_batches_respect_the_token_budget():
+    lengths = np.array([100, 60, 30, 10, 10, 5])
+    batches = plan_batches(lengths, max_batch_tokens=120, max_batch_size=3)
+    assert batches == [(0, 1), (1, 3), (3, 6)]
+    for start, end in batches:
+        assert lengths[start] * (end - start) <= 120 or end - start == 1
+
+
+def test_length_buckets_return_embeddings_in_input_order():
+    encode_fn = CountingEncoder()
+    embeddings = encode_in_length_buckets(encode_fn, TEXTS, 2, max_batch_tokens=45, report_every=0)
+    assert embeddings[:, 0].tolist() == [len(text) for text in TEXTS]
+    # Longest texts first, batches never over the token budget
+    assert len(encode_fn.encoded[0][0]) == 40
+    assert all(len(batch[0]) * len(batch) <= 45 or len(batch) == 1 for batch in encode_fn.encoded)
+
+
+def test_interrupted_encoding_resumes_from_its_checkpoint(tmp_path):
+    checkpoint_dir = str(tmp_path / 'checkpoint')
+    encoder = encoder_signature('model-a')
+    with pytest.raises(RuntimeError):
+        encode_in_length_buckets(CountingEncoder(fail_after=2), TEXTS, 2, max_batch_tokens=45,
+                                 checkpoint_dir=checkpoint_dir, report_every=0, encoder=encoder)
+
+    resumed = CountingEncoder()
+    embeddings = encode_in_length_buckets(resumed, TEXTS, 2, max_batch_tokens=45,
+                                          checkpoint_dir=checkpoint_dir, report_every=0, encoder=encoder)
+    assert embeddings[:, 0].tolist() == [len(text) for text in TEXTS]
+    assert 0 < sum(map(len, resumed.encoded)) < len(TEXTS)
+
+    # The same texts encoded by another model or backend start over
+    for other in (encoder_signature('model-b'), encoder_signature('model-a', 'onnx')):
+        restarted = CountingEncoder()
+        encode_in_length_buckets(restarted, TEXTS, 2, max_batch_tokens=45,
+                                 checkpoint_dir=checkpoint_dir, report_every=0, encoder=other)
+        assert sum(map(len, restarted.encoded)) == len(TEXTS)
+
+
+def test_encoder_signature_tells_onnx_exports_apart(onnx_model_dir):
+    assert encoder_signature('tiny', 'onnx', onnx_model_dir) == 'tiny|onnx|model.onnx'
+    assert encoder_signature('tiny', 'onnx', onnx_model_dir) != encoder_signature('tiny', 'torch')
+
+
+def test_truncated_embeddings_keep_the_leading_dimensions_normalized():
+    embeddings = np.random.default_rng(0).random((3, 8), dtype=np.float32)
+    truncated = truncate_embeddings(embeddings, 4)
+    assert truncated.shape == (3, 4)
+    np.testing.assert_allclose(np.linalg.norm(truncated, axis=1), 1, rtol=1e-6)
+    np.testing.assert_allclose(truncated * np.linalg.norm(embeddings[:, :4], axis=1, keepdims=True), embeddings[:, :4], rtol=1e-6)
+    assert truncate_embeddings(embeddings, 8) is embeddings
+    with pytest.raises(ValueError, match='16'):
+        truncate_embeddings(embeddings, 16)
+
+
+def test_index_dimension_comes_from_the_model_or_the_bundle(make_system):
+    assert make_system().index.dim == 64
+    system = make_system(embedding_dim=16)
+    assert system.index.dim == 16 and system.encode_queries(['Printer not printing']).shape == (1, 16)
+
+    reloaded = make_system(index_path='ticket_index')
+    assert reloaded.dim == 16 and reloaded.index.dim == 16
+    results = reloaded.find_similar_tickets('Printer not printing', 'Hardware', 'toner error', k=1, similarity_threshold=0)
+    assert results[0]['ticket_id'] == 'T1'
+    with pytest.raises(ValueError, match='dimension'):
+        make_system(index_path='ticket_index', embedding_dim=32)
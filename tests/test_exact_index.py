@@ -0,0 +1,71 @@
+import hnswlib
+import numpy as np
+import pytest
+
+import exact_index
+from exact_index import ExactIndex, exact_knn
+
+
+def random_vectors(n, dim=16, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+def make_index(vectors):
+    index = ExactIndex(space='cosine', dim=vectors.shape[1])
+    index.init_index(max_elements=len(vectors))
+    index.add_items(vectors, np.arange(len(vectors)))
+    return index
+
+
+def test_exact_knn_matches_sorting_all_similarities(monkeypatch):
+    monkeypatch.setattr(exact_index, 'QUERY_BATCH_SIZE', 4)  # several query batches
+    vectors, queries = random_vectors(50), random_vectors(10, seed=1)
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    positions, distances = exact_knn(queries, normalized, 5)
+    similarities = (queries / np.linalg.norm(queries, axis=1, keepdims=True)) @ normalized.T
+    np.testing.assert_array_equal(positions, np.argsort(-similarities, axis=1)[:, :5])
+    np.testing.assert_allclose(distances, 1 - np.sort(similarities, axis=1)[:, ::-1][:, :5], atol=1e-6)
+
+
+def test_exact_index_agrees_with_hnswlib():
+    vectors, queries = random_vectors(200), random_vectors(20, seed=1)
+    hnsw = hnswlib.Index(space='cosine', dim=16)
+    hnsw.init_index(max_elements=200, ef_construction=200, M=16)
+    hnsw.add_items(vectors, np.arange(200))
+    hnsw.set_ef(200)
+    labels, distances = make_index(vectors).knn_query(queries, k=5)
+    hnsw_labels, hnsw_distances = hnsw.knn_query(queries, k=5)
+    np.testing.assert_array_equal(labels, hnsw_labels)
+    np.testing.assert_allclose(distances, hnsw_distances, atol=1e-5)
+
+
+def test_deleted_and_filtered_labels_are_skipped(tmp_path):
+    vectors = random_vectors(6)
+    index = make_index(vectors)
+    index.mark_deleted(0)
+    labels, _ = index.knn_query(vectors[0], k=5)
+    assert 0 not in labels[0].tolist()
+    with pytest.raises(RuntimeError):
+        index.knn_query(vectors[0], k=6)
+    labels, _ = index.knn_query(vectors[0], k=2, filter=lambda label: label % 2 == 1)
+    assert len(labels[0]) == 2 and all(label % 2 == 1 for label in labels[0].tolist())
+
+    index.save_index(str(tmp_path / 'index.bin'))
+    loaded = ExactIndex(space='cosine', dim=16)
+    loaded.load_index(str(tmp_path / 'index.bin'), max_elements=10)
+    assert loaded.get_max_elements() == 10 and loaded.get_current_count() == 6
+    np.testing.assert_array_equal(loaded.knn_query(vectors[3], k=5)[0], index.knn_query(vectors[3], k=5)[0])
+
+
+def test_auto_backend_follows_the_corpus_size(make_system):
+    assert make_system().index.backend == 'exact'
+    assert not hasattr(make_system(exact_search_max_tickets=3).index, 'backend')
+    assert not hasattr(make_system(index_backend='hnsw').index, 'backend')
+
+    # An exact index that outgrows the limit switches to HNSW, keeping deletions
+    system = make_system(exact_search_max_tickets=6)
+    system.delete_tickets(['T2'])
+    system.add_tickets([{'Ticket ID': 'N1', 'Issue': 'Monitor flickering', 'Category': 'Hardware'}])
+    assert isinstance(system.index, hnswlib.Index)
+    results = system.find_similar_tickets('VPN disconnects', 'Network', '', k=6, similarity_threshold=-1)
+    assert 'T2' not in [result['ticket_id'] for result in results] and len(results) == 6
@@ -0,0 +1,142 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from exact_index import ExactIndex
+from index_bundle import (CURRENT_FILE, INDEX_FILE, LABELS_FILE, MANIFEST_FILE, UPDATE_LOG_FILE, append_bundle_updates,
+                          bundle_ticket_data_path, bundle_version_path, load_bundle, load_bundle_index, read_bundle_labels,
+                          read_bundle_text_hashes, save_bundle, text_hashes)
+
+MODEL = 'test-model'
+
+
+def make_index(n, dim=8):
+    index = ExactIndex(space='cosine', dim=dim)
+    index.init_index(max_elements=n)
+    index.add_items(np.random.default_rng(n).random((n, dim), dtype=np.float32), np.arange(n))
+    return index
+
+
+def save(path, n, ticket_data=None):
+    ticket_ids = [f'T{i}' for i in range(n)]
+    save_bundle(str(path), make_index(n), ticket_ids, MODEL, text_hashes(ticket_ids), ticket_data=ticket_data)
+    return ticket_ids
+
+
+def test_round_trip(tmp_path):
+    ticket_ids = save(tmp_path / 'bundle', 5)
+    index, loaded_ids, manifest = load_bundle(str(tmp_path / 'bundle'), MODEL, 8)
+    assert loaded_ids == ticket_ids
+    assert index.get_current_count() == 5 and manifest['row_count'] == 5
+
+
+@pytest.mark.parametrize('name', [LABELS_FILE, INDEX_FILE])
+def test_tampered_file_is_rejected(tmp_path, name):
+    save(tmp_path / 'bundle', 5)
+    with open(os.path.join(bundle_version_path(str(tmp_path / 'bundle')), name), 'ab') as f:
+        f.write(b' ')
+    with pytest.raises(ValueError, match='Checksum mismatch'):
+        load_bundle(str(tmp_path / 'bundle'), MODEL, 8)
+
+
+def test_mismatched_model_or_dimension_is_rejected(tmp_path):
+    save(tmp_path / 'bundle', 5)
+    with pytest.raises(ValueError, match='built with'):
+        read_bundle_labels(str(tmp_path / 'bundle'), 'other-model', None)
+    with pytest.raises(ValueError, match='dimension'):
+        read_bundle_labels(str(tmp_path / 'bundle'), MODEL, 16)
+
+
+def test_deferred_load_uses_the_version_its_labels_came_from(tmp_path):
+    path = str(tmp_path / 'bundle')
+    save(path, 5)
+    ticket_ids, manifest = read_bundle_labels(path, MODEL, None)
+    save(path, 7)
+    assert load_bundle_index(path, manifest).get_current_count() == len(ticket_ids) == 5
+    assert len(read_bundle_labels(path, MODEL, None)[0]) == 7
+
+
+def test_old_versions_are_pruned(tmp_path):
+    path = str(tmp_path / 'bundle')
+    for n in range(3, 7):
+        save(path, n)
+    versions = [name for name in os.listdir(path) if name != CURRENT_FILE]
+    assert len(versions) == 2
+    assert len(read_bundle_labels(path, MODEL, None)[0]) == 6
+
+
+def test_ticket_data_files_are_kept_while_a_version_names_them(tmp_path):
+    path = str(tmp_path / 'bundle')
+    os.makedirs(path)
+    for name in ('tickets-1.csv', 'tickets-1.delta.csv'):
+        open(os.path.join(path, name), 'w').close()
+    save(path, 3, ticket_data='tickets-1.csv')
+    open(os.path.join(path, 'tickets-2.csv'), 'w').close()
+    save(path, 4, ticket_data='tickets-2.csv')
+    assert sorted(name for name in os.listdir(path) if name.startswith('tickets-')) == ['tickets-1.csv', 'tickets-1.delta.csv', 'tickets-2.csv']
+    assert bundle_ticket_data_path(path, read_bundle_labels(path, MODEL, None)[1]) == os.path.join(path, 'tickets-2.csv')
+
+    save(path, 5, ticket_data='tickets-2.csv')
+    assert sorted(name for name in os.listdir(path) if name.startswith('tickets-')) == ['tickets-2.csv']
+    save(path, 6)
+    assert bundle_ticket_data_path(path, read_bundle_labels(path, MODEL, None)[1]) is None
+
+
+def test_updates_are_replayed_onto_the_checkpoint(tmp_path):
+    path = str(tmp_path / 'bundle')
+    save(path, 5)
+    _, manifest = read_bundle_labels(path, MODEL, None)
+    vectors = np.random.default_rng(0).random((2, 8), dtype=np.float32)
+    append_bundle_updates(path, manifest, [1, 5], ['T1', 'N5'], vectors, text_hashes(['new T1', 'N5']), deleted=[3])
+
+    ticket_ids, manifest = read_bundle_labels(path, MODEL, None)
+    assert ticket_ids == ['T0', 'T1', 'T2', 'T3', 'T4', 'N5']
+    index = load_bundle_index(path, manifest)
+    np.testing.assert_allclose(index.get_items([1, 5]), vectors / np.linalg.norm(vectors, axis=1, keepdims=True), rtol=1e-5)
+    labels, _ = index.knn_query(index.get_items([3]), k=5)
+    assert 3 not in labels[0].tolist()
+    hashes = read_bundle_text_hashes(path, manifest)
+    assert hashes.tolist() == text_hashes(['T0', 'new T1', 'T2', 'T3', 'T4', 'N5']).tolist()
+
+    # Updates appended after the labels were read are not replayed with them
+    append_bundle_updates(path, manifest, [6], ['N6'], vectors[:1], text_hashes(['N6']), revived=[3])
+    assert load_bundle_index(path, manifest).get_current_count() == 6
+    assert read_bundle_labels(path, MODEL, None)[0][-1] == 'N6'
+
+
+def test_interrupted_update_is_ignored(tmp_path):
+    path = str(tmp_path / 'bundle')
+    save(path, 3)
+    _, manifest = read_bundle_labels(path, MODEL, None)
+    vectors = np.ones((1, 8), dtype=np.float32)
+    append_bundle_updates(path, manifest, [3], ['N3'], vectors, text_hashes(['N3']))
+    with open(os.path.join(bundle_version_path(path), UPDATE_LOG_FILE), 'a') as f:
+        f.write('{"labels": [4], "ticket_ids": ["N4"]')
+    assert read_bundle_labels(path, MODEL, None)[0] == ['T0', 'T1', 'T2', 'N3']
+
+    append_bundle_updates(path, manifest, [4], ['N5'], vectors, text_hashes(['N5']))
+    ticket_ids, manifest = read_bundle_labels(path, MODEL, None)
+    assert ticket_ids == ['T0', 'T1', 'T2', 'N3', 'N5']
+    assert load_bundle_index(path, manifest).get_current_count() == 5
+
+
+def test_unversioned_bundle_loads_and_is_migrated(tmp_path):
+    path = str(tmp_path / 'bundle')
+    save(path, 5)
+    version_path = bundle_version_path(path)
+    for name in os.listdir(version_path):
+        os.rename(os.path.join(version_path, name), os.path.join(path, name))
+    os.rmdir(version_path)
+    os.remove(os.path.join(path, CURRENT_FILE))
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    del manifest['version']
+    with open(os.path.join(path, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f)
+
+    assert load_bundle(path, MODEL, 8)[0].get_current_count() == 5
+    save(path, 6)
+    assert not os.path.exists(os.path.join(path, MANIFEST_FILE))
+    assert load_bundle(path, MODEL, 8)[0].get_current_count() == 6
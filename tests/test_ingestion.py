@@ -0,0 +1,42 @@
+import pandas as pd
+import pytest
+
+from ingestion import ingest_ticket_files, iter_ticket_table, normalize_ticket_id
+
+
+@pytest.mark.parametrize('ticket_id', ['TCKT-1000', 'TKT1000', 'tckt 1000', ' TKT_1000 ', 'tkt-1000'])
+def test_ticket_ids_are_normalized(ticket_id):
+    assert normalize_ticket_id(ticket_id) == 'TCKT-1000'
+
+
+def test_other_ticket_ids_are_kept():
+    assert normalize_ticket_id('INC-7') == 'INC-7'
+    assert pd.isna(normalize_ticket_id(None))
+
+
+def test_dumps_are_merged_with_the_last_version_of_each_ticket(tmp_path):
+    pytest.importorskip('pyarrow')
+    pd.DataFrame({
+        'Ticket ID': ['TKT1', 'TKT2'], 'Issue': ['Printer jam', 'VPN down'], 'Resolved': ['yes', 'no'],
+    }).to_csv(tmp_path / 'a.csv', index=False)
+    pd.DataFrame({
+        ' Ticket ID ': ['tckt 2', 'TCKT-3'], 'Issue': ['VPN down again', 'Wifi slow'], 'Resolved': [True, False],
+    }).to_json(tmp_path / 'b.json')
+
+    output = str(tmp_path / 'tickets.parquet')
+    tickets = ingest_ticket_files([str(tmp_path)], output_path=output, num_workers=1)
+
+    assert tickets['Ticket ID'].tolist() == ['TCKT-1', 'TCKT-2', 'TCKT-3']
+    assert tickets['Issue'].tolist() == ['Printer jam', 'VPN down again', 'Wifi slow']
+    assert tickets['Resolved'].tolist() == [True, True, False]
+    chunks = list(iter_ticket_table(output, chunksize=2))
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert pd.concat(chunks)['Ticket ID'].tolist() == tickets['Ticket ID'].tolist()
+
+
+def test_system_normalizes_ids_of_changes(make_system):
+    system = make_system()
+    system.add_tickets([{'Ticket ID': 'tkt 7', 'Issue': 'Monitor flickering', 'Category': 'Hardware'}])
+    system.update_ticket('TKT7', {'Resolved': True})
+    assert system.ticket_store.get(system.ticket_ids.index('TCKT-7'))['resolved']
+    assert system.delete_tickets(['TCKT-7']) == 1
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from lexical_index import BM25Index
+
+
+def zipf_corpus(n_docs, seed=0, vocabulary_size=500):
+    """Documents with Zipf-distributed words, so frequent terms have long postings to prune"""
+    rng = np.random.default_rng(seed)
+    words = [f'w{i}' for i in range(vocabulary_size)]
+    probabilities = 1 / np.arange(1, vocabulary_size + 1)
+    probabilities /= probabilities.sum()
+    return [' '.join(rng.choice(words, size=rng.integers(3, 30), p=probabilities)) for _ in range(n_docs)]
+
+
+def assert_matches_exhaustive(index, queries, k, labels=None):
+    """Top k with MaxScore pruning equal the top k of scoring every matching document"""
+    for query in queries:
+        pruned_labels, pruned_scores = index.search(query, k, labels)
+        all_labels, all_scores = index.search(query, len(index._has_doc), labels)
+        exhaustive = dict(zip(all_labels.tolist(), all_scores.tolist()))
+        np.testing.assert_allclose(pruned_scores, all_scores[:k], rtol=1e-5)
+        for label, score in zip(pruned_labels.tolist(), pruned_scores.tolist()):
+            assert exhaustive[label] == pytest.approx(score, rel=1e-5)
+
+
+@pytest.fixture
+def corpus():
+    return zipf_corpus(2000)
+
+
+@pytest.fixture
+def queries():
+    rng = np.random.default_rng(1)
+    return [' '.join(f'w{i}' for i in rng.integers(0, 60, size=rng.integers(2, 8))) for _ in range(50)]
+
+
+@pytest.mark.parametrize('k', [1, 5, 20])
+def test_pruned_search_matches_exhaustive(corpus, queries, k):
+    index = BM25Index()
+    index.add(np.arange(len(corpus)), corpus)
+    assert_matches_exhaustive(index, queries, k)
+
+
+def test_pruned_search_with_delta_segment_deletions_and_filter(corpus, queries):
+    index = BM25Index()
+    index.add(np.arange(len(corpus)), corpus)
+    index.search('w0', 1)  # merge into the main segment
+    # Replaced and new documents land in the delta segment
+    extra = zipf_corpus(50, seed=2)
+    index.add(np.arange(1990, 2040), extra)
+    for label in range(0, 2040, 7):
+        index.mark_deleted(label)
+    assert_matches_exhaustive(index, queries, 10)
+    assert_matches_exhaustive(index, queries, 10, labels=np.arange(0, 2040, 3))
+
+    labels, _ = index.search(' '.join(['w0'] * 3), 2040)
+    assert not set(labels.tolist()) & set(range(0, 2040, 7))
+
+
+def test_renumbered_index_matches_a_rebuild_of_the_live_documents(corpus, queries):
+    index = BM25Index()
+    index.add(np.arange(len(corpus)), corpus)
+    live = np.arange(0, len(corpus), 2)
+    for label in range(1, len(corpus), 2):
+        index.mark_deleted(label)
+    renumbered = index.renumbered(live)
+    rebuilt = BM25Index()
+    rebuilt.add(np.arange(len(live)), [corpus[label] for label in live])
+    for query in queries:
+        labels, scores = renumbered.search(query, 10)
+        rebuilt_labels, rebuilt_scores = rebuilt.search(query, 10)
+        np.testing.assert_allclose(scores, rebuilt_scores, rtol=1e-5)
+
+        # Renumbered labels are positions in live, pointing at the same documents. Documents
+        # with equal scores may come in any order, so every matching document is compared per
+        # score tier
+        labels, scores = renumbered.search(query, len(live))
+        rebuilt_labels, rebuilt_scores = rebuilt.search(query, len(live))
+        np.testing.assert_allclose(scores, rebuilt_scores, rtol=1e-5)
+        tier_starts = np.flatnonzero(~np.isclose(rebuilt_scores[1:], rebuilt_scores[:-1], rtol=1e-5)) + 1
+        for tier, rebuilt_tier in zip(np.split(labels, tier_starts), np.split(rebuilt_labels, tier_starts)):
+            assert set(tier.tolist()) == set(rebuilt_tier.tolist())
@@ -0,0 +1,27 @@
+import numpy as np
+
+from encoders import load_encoder
+from parallel_build import ProcessEncoder
+
+TEXTS = [f"{word} {other}" for word in ('printer', 'vpn', 'wifi', 'down', 'slow') for other in ('not printing', 'down', 'slow')]
+
+
+def test_workers_encode_in_input_order(onnx_model_dir, tmp_path):
+    expected = load_encoder('tiny', 'onnx', onnx_model_dir).encode(TEXTS)
+    with ProcessEncoder('tiny', 8, num_workers=2, encoder_backend='onnx', onnx_model_dir=onnx_model_dir, threads_per_worker=1) as encoder:
+        with encoder.encode(TEXTS) as embeddings:
+            np.testing.assert_allclose(embeddings, expected, atol=1e-6)
+        # Checkpointed shards give the same embeddings, and a second call gets its own shared matrix
+        with encoder.encode(TEXTS[::-1], checkpoint_dir=str(tmp_path / 'checkpoints')) as embeddings:
+            np.testing.assert_allclose(embeddings, expected[::-1], atol=1e-6)
+        with encoder.encode([]) as embeddings:
+            assert embeddings.shape == (0, 8)
+
+
+def test_parallel_build_matches_a_single_process_build(make_system, onnx_model_dir):
+    kwargs = dict(model=None, model_name='tiny', encoder_backend='onnx', onnx_model_dir=onnx_model_dir)
+    system = make_system(**kwargs)
+    parallel = make_system(**kwargs)
+    parallel.build_index_from_csv(parallel.resolved_tickets_data_path, save_path='parallel_index', num_workers=2)
+    assert parallel.ticket_ids == system.ticket_ids
+    np.testing.assert_allclose(parallel.index.get_items(range(6)), system.index.get_items(range(6)), atol=1e-6)
@@ -0,0 +1,306 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ticket_matching_system import build_ticket_strings, iter_ticket_data, read_ticket_data, ticket_journal_path, ticket_string
+
+
+def search(system, issue, category='', description=''):
+    """Ticket ID of the best match"""
+    return system.find_similar_tickets(issue, category, description, k=1, similarity_threshold=0)[0]['ticket_id']
+
+
+def assert_aligned(system):
+    """Index, ticket store, label map and BM25 index agree on every label"""
+    store = system.ticket_store
+    assert list(store.ticket_ids) == list(system.ticket_ids)
+    assert system.index.get_current_count() == len(system.ticket_ids)
+    strings = build_ticket_strings(store.to_dataframe())
+    for label, string in enumerate(strings):
+        if label in system.deleted_labels:
+            continue
+        assert store.get(label)['ticket_id'] == system.ticket_ids[label]
+        if system.lexical_index is not None:
+            labels, _ = system.lexical_index.search(string, 1)
+            assert labels[0] == label
+
+
+def test_query_strings_match_index_strings():
+    df = pd.DataFrame({
+        'Issue': ['Printer', None, np.nan, ' padded', 1.5],
+        'Category': [None, 'Network', None, '', 2],
+        'Description': ['toner', None, np.nan, 'text ', None],
+    }, dtype=object)
+    assert build_ticket_strings(df) == [ticket_string(*row) for row in df.itertuples(index=False)]
+
+
+def test_journal_replays_in_order(tickets_csv):
+    pd.DataFrame([
+        {'Ticket ID': 'N1', 'Issue': 'Monitor flickering', 'Category': 'Hardware'},
+        {'Ticket ID': 'T2', 'Resolution': 'Reinstalled VPN client'},
+        {'Ticket ID': 'N2', 'Issue': 'Keyboard sticky', 'Category': 'Hardware'},
+        {'Ticket ID': 'T2', 'Resolved': False},
+        {'Ticket ID': 'N1', 'Issue': 'Monitor flickering badly'},
+    ]).to_csv(ticket_journal_path(tickets_csv), index=False)
+
+    data = read_ticket_data(tickets_csv)
+    assert data['Ticket ID'].tolist() == ['T1', 'T2', 'T3', 'T4', 'T5', 'T6', 'N1', 'N2']
+    t2 = data.iloc[1]
+    # Later journal rows win, empty fields keep the previous value
+    assert t2['Resolution'] == 'Reinstalled VPN client' and not t2['Resolved'] and t2['Issue'] == 'VPN disconnects'
+    n1 = data.iloc[6]
+    assert n1['Issue'] == 'Monitor flickering badly' and n1['Category'] == 'Hardware'
+
+    chunks = pd.concat(list(iter_ticket_data(tickets_csv, chunksize=4)), ignore_index=True)
+    assert chunks['Ticket ID'].tolist() == data['Ticket ID'].tolist()
+    assert chunks['Issue'].tolist() == data['Issue'].tolist()
+
+
+def test_changes_survive_reload_with_aligned_labels(make_system):
+    system = make_system(hybrid_search=True)
+    system.add_tickets([{'Ticket ID': 'N1', 'Issue': 'Monitor flickering', 'Category': 'Hardware', 'Description': 'screen flickers'}])
+    system.update_ticket('T2', {'Resolution': 'Reinstalled VPN client'})
+    system.update_ticket('T3', {'Issue': 'Calendar invites missing'})
+    system.delete_tickets(['T5'])
+    system.flush()
+
+    reloaded = make_system(index_path='ticket_index', hybrid_search=True)
+    for each in (system, reloaded):
+        assert each.ticket_ids == ['T1', 'T2', 'T3', 'T4', 'T5', 'T6', 'N1']
+        assert set(each.deleted_labels) == {4}
+        assert each.ticket_store.get(1)['resolution'] == 'Reinstalled VPN client'
+        assert each.ticket_store.get(2)['issue'] == 'Calendar invites missing'
+        assert search(each, 'Monitor flickering', 'Hardware', 'screen flickers') == 'N1'
+        assert search(each, 'Calendar invites missing', 'Software') == 'T3'
+        assert_aligned(each)
+    assert reloaded.read_ticket_data_in_label_order()['Ticket ID'].tolist() == reloaded.ticket_ids
+
+
+def test_updates_are_logged_until_a_checkpoint_is_due(make_system, monkeypatch):
+    monkeypatch.setattr('ticket_matching_system.CHECKPOINT_FRACTION', 0.3)
+    system = make_system(hybrid_search=True, tombstone_threshold=1.0)
+    checkpoint = system.index_manifest['version']
+    system.add_tickets([{'Ticket ID': 'N1', 'Issue': 'Monitor flickering', 'Category': 'Hardware'}])
+    system.update_ticket('T3', {'Issue': 'Calendar invites missing'})
+    system.delete_tickets(['T5'])
+    system.add_tickets([{'Ticket ID': 'T5', 'Issue': 'Password reset', 'Category': 'Account'}])
+    system.delete_tickets(['T6'])
+    assert system.index_manifest['version'] == checkpoint
+    assert os.path.exists(os.path.join('ticket_index', checkpoint, 'updates.jsonl'))
+
+    reloaded = make_system(index_path='ticket_index', hybrid_search=True)
+    assert reloaded.ticket_ids == system.ticket_ids and reloaded.deleted_labels == system.deleted_labels == {5}
+    assert_aligned(reloaded)
+    assert search(reloaded, 'Calendar invites missing', 'Software') == 'T3'
+    assert search(reloaded, 'Password reset', 'Account') == 'T5'
+    np.testing.assert_allclose(reloaded.index.get_items(range(7)), system.index.get_items(range(7)), atol=1e-6)
+
+    # Embeddings beyond CHECKPOINT_FRACTION of the index are saved as a new checkpoint
+    system.add_tickets([{'Ticket ID': 'N2', 'Issue': 'Keyboard sticky', 'Category': 'Hardware'}])
+    assert system.index_manifest['version'] != checkpoint
+    assert make_system(index_path='ticket_index').ticket_ids == system.ticket_ids
+
+
+def test_journal_rewrite_never_leaves_a_partial_journal(make_system, tickets_csv, monkeypatch):
+    system = make_system(tombstone_threshold=1.0)
+    system.update_ticket('T2', {'Resolution': 'Reinstalled VPN client'})
+    journal_path = ticket_journal_path(tickets_csv)
+    journal = open(journal_path).read()
+
+    def fail_midway(df, path, *args, **kwargs):
+        with open(path, 'w') as f:
+            f.write('Ticket ID,')
+        raise OSError('No space left on device')
+
+    # The Deleted column is new to the journal, so its header is rewritten
+    monkeypatch.setattr(pd.DataFrame, 'to_csv', fail_midway)
+    with pytest.raises(OSError):
+        system.delete_tickets(['T5'])
+    assert open(journal_path).read() == journal
+
+
+def test_readding_deleted_ticket_revives_its_label(make_system):
+    system = make_system()
+    system.delete_tickets(['T4'])
+    labels = system.add_tickets([{'Ticket ID': 'T4', 'Issue': 'Laptop overheating', 'Category': 'Hardware'}])
+    assert labels == [3]
+    assert 3 not in set(system.deleted_labels)
+    assert search(system, 'Laptop overheating', 'Hardware') == 'T4'
+
+
+def test_compaction_renumbers_index_store_and_bm25(make_system, tickets_csv):
+    original = open(tickets_csv).read()
+    system = make_system(hybrid_search=True)
+    system.update_ticket('T6', {'Issue': 'Wifi drops in meeting rooms'})
+    system.delete_tickets(['T1', 'T3'])
+    system.compact(save=True)
+
+    assert system.ticket_ids == ['T2', 'T4', 'T5', 'T6']
+    assert not len(system.deleted_labels)
+    assert_aligned(system)
+    assert search(system, 'Wifi drops in meeting rooms', 'Network') == 'T6'
+    labels, _ = system.lexical_index.search('Wifi drops in meeting rooms', 1)
+    assert system.ticket_ids[int(labels[0])] == 'T6'
+    # The compacted data goes to the bundle; the data file given to the system is left alone
+    assert open(tickets_csv).read() == original
+    data_files = [name for name in os.listdir('ticket_index') if name.startswith('tickets-')]
+    assert len(data_files) == 1
+    assert pd.read_csv(os.path.join('ticket_index', data_files[0]))['Ticket ID'].tolist() == system.ticket_ids
+
+    reloaded = make_system(index_path='ticket_index', hybrid_search=True)
+    assert reloaded.ticket_ids == system.ticket_ids
+    assert_aligned(reloaded)
+    # Later updates are journaled next to the bundle's data file
+    reloaded.update_ticket('T5', {'Resolution': 'Unlocked account'})
+    assert os.path.exists(ticket_journal_path(os.path.join('ticket_index', data_files[0])))
+    assert 'T5' not in pd.read_csv(ticket_journal_path(tickets_csv))['Ticket ID'].tolist()
+    np.testing.assert_allclose(
+        reloaded.index.get_items(range(4)), system.index.get_items(range(4)), atol=1e-6,
+    )
+
+
+def test_compaction_replays_changes_made_while_building(make_system, monkeypatch):
+    system = make_system(hybrid_search=True, tombstone_threshold=1.0)
+    system.delete_tickets(['T1', 'T3'])
+    create_index = system._create_index
+
+    def create_index_and_change_tickets(*args, **kwargs):
+        index = create_index(*args, **kwargs)
+        system.add_tickets([{'Ticket ID': 'T7', 'Issue': 'Monitor flickers', 'Category': 'Hardware'}])
+        system.update_ticket('T6', {'Issue': 'Wifi drops in meeting rooms'})
+        system.update_ticket('T5', {'Resolution': 'Unlocked account'})
+        system.delete_tickets(['T2'])
+        system.add_tickets([{'Ticket ID': 'T3', 'Issue': 'Email not syncing', 'Category': 'Software'}])
+        return index
+
+    monkeypatch.setattr(system, '_create_index', create_index_and_change_tickets)
+    system.compact(save=True)
+
+    assert system.ticket_ids == ['T2', 'T4', 'T5', 'T6', 'T3', 'T7']
+    assert system.deleted_labels == {0}
+    assert_aligned(system)
+    assert search(system, 'Wifi drops in meeting rooms', 'Network') == 'T6'
+    assert search(system, 'Monitor flickers', 'Hardware') == 'T7'
+    assert search(system, 'Email not syncing', 'Software') == 'T3'
+    assert system.ticket_store.get(2)['resolution'] == 'Unlocked account'
+    results = system.find_similar_tickets('Network connectivity', '', '', k=6, similarity_threshold=-1)
+    assert 'T2' not in [result['ticket_id'] for result in results]
+
+    reloaded = make_system(index_path='ticket_index', hybrid_search=True)
+    assert reloaded.ticket_ids == system.ticket_ids and reloaded.deleted_labels == {0}
+
+
+def test_category_filter_only_returns_those_categories(make_system):
+    system = make_system()
+    results = system.find_similar_tickets('Printer not printing', '', 'toner error', k=3, category_filter='Network', similarity_threshold=-1)
+    assert [result['ticket_id'] for result in results] and {result['category'] for result in results} == {'Network'}
+    results = system.find_similar_tickets('Printer not printing', '', 'toner error', k=6, category_filter=['Network', 'Account'], similarity_threshold=-1)
+    assert sorted(result['ticket_id'] for result in results) == ['T2', 'T5', 'T6']
+    system.delete_tickets(['T6'])
+    results = system.find_similar_tickets('Wifi slow', '', '', k=3, category_filter='Network', similarity_threshold=-1)
+    assert [result['ticket_id'] for result in results] == ['T2']
+
+
+def test_resolved_first_tops_up_with_unresolved_tickets(make_system):
+    system = make_system()
+    # The unresolved T6 is the best match, but resolved tickets fill k first
+    results = system.find_similar_tickets('Wifi slow', 'Network', '', k=2, similarity_threshold=-1, resolved_first=True)
+    assert len(results) == 2 and all(result['resolved'] for result in results)
+    results = system.find_similar_tickets('Wifi slow', 'Network', '', k=6, similarity_threshold=-1, resolved_first=True)
+    assert [result['resolved'] for result in results] == [True] * 4 + [False] * 2
+    assert results[4]['ticket_id'] == 'T6'
+
+    # Queries without k resolved tickets above the threshold keep their unresolved matches
+    query = {'Issue': 'Email not syncing', 'Category': 'Software', 'Description': 'Outlook does not sync emails on the phone'}
+    results = system.find_similar_tickets(query['Issue'], query['Category'], query['Description'], k=3, similarity_threshold=0.5, resolved_first=True)
+    assert [result['ticket_id'] for result in results] == ['T3']
+    batch = system.find_similar_tickets_batch([query, {'Issue': 'Wifi slow', 'Category': 'Network', 'Description': ''}],
+                                              k=2, similarity_threshold=0.5, resolved_first=True)
+    assert [result['ticket_id'] for result in batch[0]] == ['T3']
+    assert [result['ticket_id'] for result in batch[1]] == [result['ticket_id'] for result in system.find_similar_tickets(
+        'Wifi slow', 'Network', '', k=2, similarity_threshold=0.5, resolved_first=True)]
+
+
+def test_range_search_returns_every_ticket_above_the_threshold(make_system, monkeypatch, capsys):
+    import ticket_matching_system
+    monkeypatch.setattr(ticket_matching_system, 'RANGE_SEARCH_INITIAL_K', 1)  # k has to grow several times
+    system = make_system()
+    query = ('Wifi slow', 'Network', 'Office wifi is slow')
+    ranked = sorted(system.find_similar_tickets(*query, k=6, similarity_threshold=-1), key=lambda x: -x['similarity_score'])
+    expected = [result['ticket_id'] for result in ranked]
+
+    results = system.find_tickets_above_threshold(*query, similarity_threshold=-1)
+    assert [result['ticket_id'] for result in results] == expected
+    threshold = ranked[2]['similarity_score']
+    results = system.find_tickets_above_threshold(*query, similarity_threshold=threshold)
+    assert [result['ticket_id'] for result in results] == expected[:3]
+
+    capsys.readouterr()
+    assert [result['ticket_id'] for result in system.find_tickets_above_threshold(*query, similarity_threshold=-1, max_results=4)] == expected[:4]
+    assert 'max_results=4' in capsys.readouterr().out
+    results = system.find_tickets_above_threshold(*query, similarity_threshold=-1, category_filter='Hardware')
+    assert [result['ticket_id'] for result in results] == [ticket_id for ticket_id in expected if ticket_id in ('T1', 'T4')]
+
+
+def test_batch_search_matches_single_searches_with_one_encode_call(make_system, monkeypatch):
+    system = make_system(query_cache_size=0)
+    queries = [
+        {'Issue': 'Printer not printing', 'Category': 'Hardware', 'Description': 'toner error'},
+        {'Issue': 'Wifi slow', 'Category': 'Network', 'Description': ''},
+        {'Issue': 'Password reset', 'Category': 'Account', 'Description': 'locked out'},
+    ]
+    def summary(results):
+        return [[(result['ticket_id'], pytest.approx(result['similarity_score'], abs=1e-6)) for result in query_results]
+                for query_results in results]
+
+    single = [system.find_similar_tickets(q['Issue'], q['Category'], q['Description'], k=2, similarity_threshold=0) for q in queries]
+
+    calls = []
+    encode = system.model.encode
+    monkeypatch.setattr(system.model, 'encode', lambda texts, **kwargs: calls.append(len(texts)) or encode(texts, **kwargs))
+    assert summary(system.find_similar_tickets_batch(queries, k=2, similarity_threshold=0)) == summary(single)
+    assert calls == [3]
+    assert summary(system.find_similar_tickets_batch(pd.DataFrame(queries), k=2, similarity_threshold=0)) == summary(single)
+    assert system.find_similar_tickets_batch([]) == []
+
+
+def test_importing_does_not_load_the_encoder_libraries():
+    code = ("import sys, ticket_matching_system, ticket_resolution_system; "
+            "print([name for name in ('sentence_transformers', 'torch', 'onnxruntime') if name in sys.modules])")
+    src = os.path.join(os.path.dirname(__file__), '..', 'src')
+    output = subprocess.run([sys.executable, '-c', code], cwd=src, capture_output=True, text=True, check=True).stdout
+    assert output.strip() == '[]'
+
+
+def test_loading_a_bundle_defers_the_model_and_index(make_system, monkeypatch):
+    model = make_system().model
+    loaded = []
+    monkeypatch.setattr('ticket_matching_system.load_encoder', lambda *args, **kwargs: loaded.append(args) or model)
+    system = make_system(index_path='ticket_index', model=None)
+    assert system._model is None and system._index is None and not loaded
+    assert system.ticket_ids == ['T1', 'T2', 'T3', 'T4', 'T5', 'T6']
+
+    system.warmup()
+    assert len(loaded) == 1 and system._index is not None
+    assert search(system, 'Printer not printing', 'Hardware') == 'T1'
+
+
+def test_chunked_build_matches_a_full_build(make_system, tickets_csv, monkeypatch):
+    pd.DataFrame([{'Ticket ID': 'T2', 'Resolution': 'Reinstalled VPN client'}, {'Ticket ID': 'N1', 'Issue': 'Monitor flickering'}]) \
+        .to_csv(ticket_journal_path(tickets_csv), index=False)
+    system = make_system(hybrid_search=True)
+    batches = []
+    encode = system.model.encode
+    monkeypatch.setattr(system.model, 'encode', lambda texts, **kwargs: batches.append(len(texts)) or encode(texts, **kwargs))
+    chunked = make_system(model=system.model, hybrid_search=True, build_chunksize=2)
+
+    assert max(batches) <= 2 and sum(batches) == 7
+    assert chunked.ticket_ids == system.ticket_ids == ['T1', 'T2', 'T3', 'T4', 'T5', 'T6', 'N1']
+    pd.testing.assert_frame_equal(chunked.ticket_store.to_dataframe(), system.ticket_store.to_dataframe())
+    np.testing.assert_allclose(chunked.index.get_items(range(7)), system.index.get_items(range(7)), atol=1e-6)
+    assert_aligned(chunked)
+    assert make_system(index_path='ticket_index').ticket_ids == chunked.ticket_ids
@@ -0,0 +1,105 @@
+import pandas as pd
+import pytest
+
+from ticket_store import SqliteTicketStore, TicketStore
+
+TICKETS = pd.DataFrame({
+    'Ticket ID': ['T1', 'T2', 'T3', 'T4'],
+    'Issue': ['Printer jam', 'VPN down', 'Wifi slow', 'Mail bounce'],
+    'Category': ['Hardware', 'Network', 'Network', 'Software'],
+    'Resolved': [True, False, 'yes', None],
+    'Resolution': ['Cleared jam', None, 'Moved access point', None],
+})
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def make_store(request, tmp_path):
+    """Factory of ticket stores of either kind from a DataFrame"""
+    def make(df):
+        if request.param == 'memory':
+            return TicketStore.from_dataframe(df)
+        return SqliteTicketStore.from_dataframe(str(tmp_path / 'tickets.db'), df)
+    return make
+
+
+def test_categories_of_live_tickets(make_store):
+    store = make_store(TICKETS)
+    assert store.categories() == ['Hardware', 'Network', 'Software']
+    store.set_deleted([0, 3])
+    assert store.categories() == ['Network']
+    store.set_deleted([0], deleted=False)
+    assert store.categories() == ['Hardware', 'Network']
+
+
+def test_rows_are_stored_per_label(make_store):
+    store = make_store(TICKETS)
+    assert len(store) == 4 and list(store.ticket_ids) == ['T1', 'T2', 'T3', 'T4']
+    assert store.get(2) == {'ticket_id': 'T3', 'issue': 'Wifi slow', 'category': 'Network', 'description': '',
+                            'resolved': True, 'resolution': 'Moved access point'}
+    assert not store.get(3)['resolved']
+    assert store.labels_where('category', ('Network', 'Software')).tolist() == [1, 2, 3]
+    assert store.labels_where('resolved', (True,)).tolist() == [0, 2]
+
+
+def test_rows_are_overwritten_and_appended(make_store):
+    store = make_store(TICKETS)
+    store.set_many([1], pd.DataFrame([{'Ticket ID': 'T2', 'Issue': 'VPN down', 'Category': 'Network', 'Resolved': True, 'Resolution': 'New client'}]))
+    store.append(pd.DataFrame([{'Ticket ID': 'T5', 'Issue': 'Keyboard', 'Category': 'Peripherals'}]))
+    assert store.get(1)['resolution'] == 'New client' and store.get(1)['resolved']
+    assert store.get(4)['ticket_id'] == 'T5' and store.get(4)['category'] == 'Peripherals'
+    df = store.to_dataframe()
+    assert df['Ticket ID'].tolist() == ['T1', 'T2', 'T3', 'T4', 'T5']
+    assert df['Resolved'].tolist() == [True, True, True, False, False]
+    assert store.to_dataframe([4, 0])['Issue'].tolist() == ['Keyboard', 'Printer jam']
+
+
+def test_take_repacks_the_remaining_rows():
+    store = TicketStore.from_dataframe(TICKETS)
+    for _ in range(3):
+        store.set_many([0], TICKETS.iloc[[0]])  # overwritten strings stay in the buffer
+    taken = store.take([3, 0])
+    assert list(taken.ticket_ids) == ['T4', 'T1']
+    assert taken.get(1)['issue'] == 'Printer jam' and taken.categories() == ['Hardware', 'Software']
+    assert len(taken.columns['issue'].buffer) == len('Mail bounce') + len('Printer jam')
+
+
+def test_labels_for_maps_ticket_ids_to_labels(make_store):
+    store = make_store(TICKETS)
+    assert store.labels_for(['T3', 'T1', 'T9']) == {'T3': 2, 'T1': 0}
+    store.append(pd.DataFrame([{'Ticket ID': 'T5', 'Issue': 'Keyboard'}]))
+    assert store.labels_for(['T5']) == {'T5': 4}
+
+
+def test_sqlite_generations_leave_other_stores_untouched(tmp_path):
+    path = str(tmp_path / 'tickets.db')
+    store = SqliteTicketStore.from_dataframe(path, TICKETS)
+    store.record_version('v1')
+    reader = SqliteTicketStore.open_version(path, 'v1', len(TICKETS))
+    assert reader.generation == store.generation
+
+    # The writer compacts and appends; the reader keeps its labels and does not see new rows
+    taken = store.take([3, 0])
+    taken.append(pd.DataFrame([{'Ticket ID': 'T5', 'Issue': 'Keyboard'}]))
+    taken.record_version('v2')
+    assert list(taken.ticket_ids) == ['T4', 'T1', 'T5']
+    assert list(reader.ticket_ids) == ['T1', 'T2', 'T3', 'T4'] and reader.get(1)['ticket_id'] == 'T2'
+    reader.append(pd.DataFrame([{'Ticket ID': 'T6', 'Issue': 'Mouse'}]))
+    assert len(SqliteTicketStore.open_version(path, 'v1', len(TICKETS))) == 4
+
+    # A rebuild from data keeps the generations of the newest saved versions
+    rebuilt = SqliteTicketStore.from_dataframe(path, TICKETS)
+    rebuilt.record_version('v3')
+    assert SqliteTicketStore.open_version(path, 'v2', 3) is not None
+    assert SqliteTicketStore.open_version(path, 'v1', 4) is None
+    with pytest.raises(KeyError, match='load the index again'):
+        reader.get(0)
+
+
+def test_sqlite_store_is_reused_for_saved_versions(make_system, tmp_path):
+    db_path = str(tmp_path / 'tickets.db')
+    system = make_system(metadata_db_path=db_path)
+    loaded = make_system(index_path='ticket_index', metadata_db_path=db_path)
+    assert loaded.ticket_store.generation == system.ticket_store.generation
+    assert loaded.ticket_ids == system.ticket_ids
+    result = loaded.find_similar_tickets('Printer not printing', 'Hardware', 'toner error', k=1, similarity_threshold=0)[0]
+    assert result['ticket_id'] == 'T1' and result['resolution'] == system.ticket_store.get(0)['resolution']